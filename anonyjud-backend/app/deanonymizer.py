@@ -1,6 +1,67 @@
-from typing import Dict
+from typing import Dict, Iterator, Optional, Tuple
 import re
 
+from .pattern_cache import compiler
+
+_DIGIT = re.compile(r'\d')
+
+class TagReplacer:
+    """
+    Remplacement des balises d'un mapping en un seul passage : une regex unique
+    (balises les plus longues d'abord, limites de mots) compilée une fois par requête,
+    précédée d'un filtre bon marché qui écarte les textes ne pouvant contenir aucune balise.
+    Avec `ignorer_casse`, une balise dont la casse a été retouchée (nom1, Nom1) est aussi reconnue.
+    """
+    def __init__(self, mapping: Dict[str, str], ignorer_casse: bool = False):
+        self.mapping = mapping
+        tags = sorted((tag for tag in mapping if tag), key=len, reverse=True)
+        flags = re.IGNORECASE if ignorer_casse else 0
+        self._pattern = compiler(r'\b(?:' + '|'.join(map(re.escape, tags)) + r')\b', flags) if tags else None
+        self._valeurs = {tag.lower(): mapping[tag] for tag in tags} if ignorer_casse else mapping
+        self._cle = str.lower if ignorer_casse else None
+        # Les balises générées se terminent toutes par un numéro (NOM1, TEL2...)
+        self._needs_digit = bool(tags) and all(_DIGIT.search(tag) for tag in tags)
+        self._first_chars = frozenset(tag[0] for tag in tags)
+        if ignorer_casse:
+            self._first_chars |= frozenset(c.swapcase() for c in self._first_chars)
+
+    def _valeur(self, match: "re.Match") -> str:
+        tag = match.group(0)
+        return self._valeurs[self._cle(tag) if self._cle else tag]
+
+    def can_contain(self, text: str) -> bool:
+        """
+        Filtre rapide : False si le texte ne peut contenir aucune balise.
+        """
+        if self._pattern is None or self._first_chars.isdisjoint(text):
+            return False
+        return not self._needs_digit or _DIGIT.search(text) is not None
+
+    def has_match(self, text: str) -> bool:
+        return self.can_contain(text) and self._pattern.search(text) is not None
+
+    def finditer(self, text: str, limit: Optional[int] = None) -> Iterator[Tuple[int, int, str]]:
+        """
+        Positions des balises commençant avant `limit`.
+
+        Yields:
+            Tuples (début, fin, valeur d'origine)
+        """
+        if not self.can_contain(text):
+            return
+        for match in self._pattern.finditer(text, 0, len(text)):
+            if limit is not None and match.start() >= limit:
+                return
+            yield match.start(), match.end(), self._valeur(match)
+
+    def apply(self, text: str) -> str:
+        """
+        Remplace toutes les balises du texte par leurs valeurs d'origine.
+        """
+        if not self.can_contain(text):
+            return text
+        return self._pattern.sub(self._valeur, text)
+
 def deanonymize_text(anonymized_text: str, mapping: Dict[str, str]) -> str:
     """
     Dé-anonymise le texte en remplaçant les balises par les valeurs originales.
@@ -12,61 +73,5 @@ def deanonymize_text(anonymized_text: str, mapping: Dict[str, str]) -> str:
     Returns:
         Le texte dé-anonymisé
     """
-    # Fix 2024-01-XX: Correction problèmes d'indentation Railway
-    print(f"🔍 DEANONYMIZE_TEXT - Début du processus")
-    print(f"📝 Texte d'entrée (premiers 300 chars): {anonymized_text[:300]}...")
-    print(f"🗂️ Mapping reçu: {mapping}")
-    print(f"📊 Nombre de balises dans le mapping: {len(mapping)}")
-    
-    deanonymized = anonymized_text
-    
-    # Trier les balises par longueur décroissante pour éviter les remplacements partiels
-    sorted_tags = sorted(mapping.keys(), key=len, reverse=True)
-    print(f"🔢 Balises triées par longueur: {sorted_tags}")
-    
-    # Analyser quelles balises sont présentes dans le texte
-    found_tags = []
-    for tag in sorted_tags:
-        if tag in anonymized_text:
-            found_tags.append(tag)
-            print(f"✅ Balise '{tag}' trouvée dans le texte")
-        else:
-            print(f"❌ Balise '{tag}' NON trouvée dans le texte")
-    
-    print(f"📋 Résumé: {len(found_tags)}/{len(sorted_tags)} balises trouvées: {found_tags}")
-    
-    # Remplacer chaque balise par sa valeur originale
-    replacements_made = 0
-    for tag in sorted_tags:
-        if tag in deanonymized:
-            original = mapping[tag]
-            print(f"🔄 Tentative de remplacement: '{tag}' -> '{original}'")
-            
-            # Compter les occurrences avant remplacement
-            count_before = deanonymized.count(tag)
-            
-            # ✅ CORRECTION: Utiliser SEULEMENT l'expression régulière avec limites de mots
-            # Cela évite le problème de "PRENOM1" devenant "PREHuissoud1" quand on remplace "NOM1"
-            pattern = re.compile(r'\b' + re.escape(tag) + r'\b')
-            deanonymized_new = pattern.sub(original, deanonymized)
-            
-            # Compter les occurrences après remplacement
-            count_after = deanonymized_new.count(tag)
-            actual_replacements = count_before - count_after
-            
-            if actual_replacements > 0:
-                print(f"✅ Remplacement réussi: {actual_replacements} occurrence(s) de '{tag}' remplacée(s) par '{original}'")
-                replacements_made += actual_replacements
-                deanonymized = deanonymized_new
-            else:
-                print(f"⚠️ PROBLÈME: Balise '{tag}' présente mais aucun remplacement de mot entier effectué")
-                print(f"❌ DEBUG: La balise '{tag}' pourrait être une sous-chaîne d'une autre balise (ex: NOM dans PRENOM)")
-                # ✅ NE PLUS FAIRE DE FALLBACK avec replace() simple car cela cause le problème PRENOM
-                # Le fallback replace() sans limites de mots causait: PRENOM1 -> PREHuissoud1
-                print(f"🚫 Pas de remplacement fallback pour éviter les remplacements partiels dans d'autres balises")
-    
-    print(f"📈 Total des remplacements effectués: {replacements_made}")
-    print(f"📝 Texte de sortie (premiers 300 chars): {deanonymized[:300]}...")
-    print(f"🏁 DEANONYMIZE_TEXT - Fin du processus")
-    
-    return deanonymized 
\ No newline at end of file
+    # Même passage unique que les fichiers ; la regex des balises est servie par le cache partagé
+    return TagReplacer(mapping).apply(anonymized_text)
@@ -0,0 +1,251 @@
+"""
+Traitements propres à chaque format de fichier, chargés à la demande
+Les bibliothèques lourdes (PyMuPDF, reportlab, python-docx, odfpy) ne sont importées
+qu'au premier fichier du format concerné, ou dès le démarrage pour les formats listés
+dans ANONYJUD_PRELOAD_HANDLERS
+
+Le format d'un fichier est reconnu à sa signature (octets magiques), jamais à son nom ;
+chaque module de traitement expose la même interface :
+    iter_text_units(content) -> Iterator[Tuple[str, str]]  (localisation, texte)
+    apply_replacements(content, tiers=None, mapping=None, progress=None) -> (document, mapping)
+    write(document) -> bytes
+Les formats texte exposent en plus encodage_source(content) -> str, et apply_replacements
+accepte alors encodage= pour réécrire un fichier dans l'encodage de sa source
+"""
+import codecs
+import importlib
+import io
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .. import soffice
+from ..jobs import ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+# Modules de traitement disponibles
+HANDLERS = ("pdf", "word", "doc", "odt", "xlsx", "ods", "rtf", "html", "eml", "txt")
+
+# "none" (défaut) : chargement au premier usage ; liste séparée par des virgules ("pdf,word") :
+# formats utilisés par le déploiement, chargés et préchauffés au démarrage ; "all" : tous
+PRELOAD = os.getenv("ANONYJUD_PRELOAD_HANDLERS", "none")
+
+# Durée d'import de chaque module de traitement (millisecondes)
+durees_import_ms: Dict[str, float] = {}
+
+_lock = threading.Lock()
+
+def charger(nom: str) -> ModuleType:
+    """
+    Retourne le module de traitement `nom`, importé au premier appel.
+    """
+    module_name = f"{__name__}.{nom}"
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with _lock:
+        module = sys.modules.get(module_name)
+        if module is None:
+            debut = time.perf_counter()
+            module = importlib.import_module(module_name)
+            durees_import_ms[nom] = round((time.perf_counter() - debut) * 1000, 1)
+            logger.info(f"📦 Module de traitement '{nom}' chargé en {durees_import_ms[nom]} ms")
+    return module
+
+def a_precharger(preload: str = PRELOAD) -> Iterable[str]:
+    """
+    Modules à charger au démarrage d'après la configuration.
+    """
+    preload = preload.strip().lower()
+    if preload in ("", "none", "0"):
+        return ()
+    if preload == "all":
+        return HANDLERS
+    return tuple(nom.strip() for nom in preload.split(",") if nom.strip() in HANDLERS)
+
+def charges() -> Iterable[str]:
+    """
+    Modules de traitement déjà importés.
+    """
+    return tuple(nom for nom in HANDLERS if f"{__name__}.{nom}" in sys.modules)
+
+# Signatures des formats
+
+_ZIP = b"PK\x03\x04"
+# Les paquets OpenDocument commencent par l'entrée "mimetype" stockée sans compression
+_ODF_MIMETYPE = 30 + len("mimetype")
+
+def _est_pdf(content: bytes) -> bool:
+    # La norme tolère quelques octets parasites avant l'en-tête
+    return b"%PDF-" in content[:1024]
+
+def _zip_contient(content: bytes, nom: str) -> bool:
+    if not content.startswith(_ZIP):
+        return False
+    try:
+        # Seul le répertoire central (en fin d'archive) est lu
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            archive.getinfo(nom)
+        return True
+    except (KeyError, zipfile.BadZipFile):
+        return False
+
+def _est_docx(content: bytes) -> bool:
+    return _zip_contient(content, "word/document.xml")
+
+# Fichiers composés OLE (Word 97-2003) : en-tête puis flux "WordDocument" nommé en UTF-16
+_OLE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+_FLUX_WORD = "WordDocument".encode("utf-16-le")
+
+def _est_doc(content: bytes) -> bool:
+    return content.startswith(_OLE) and _FLUX_WORD in content
+
+def _est_odf(content: bytes, media_type: str) -> bool:
+    return (content.startswith(_ZIP) and content[30:_ODF_MIMETYPE] == b"mimetype"
+            and content[_ODF_MIMETYPE:].startswith(media_type.encode("ascii")))
+
+def _est_odt(content: bytes) -> bool:
+    return _est_odf(content, "application/vnd.oasis.opendocument.text")
+
+def _est_xlsx(content: bytes) -> bool:
+    return _zip_contient(content, "xl/workbook.xml")
+
+def _est_ods(content: bytes) -> bool:
+    return _est_odf(content, "application/vnd.oasis.opendocument.spreadsheet")
+
+def _est_rtf(content: bytes) -> bool:
+    return content[:64].lstrip().startswith(b"{\\rtf")
+
+# En-têtes dont la présence en tête de fichier signale un courriel
+_ENTETES_COURRIEL = frozenset((b"from", b"to", b"date", b"subject", b"received", b"message-id",
+                               b"mime-version", b"return-path", b"delivered-to"))
+_NOM_ENTETE = re.compile(rb"^([!-9;-~]+):")
+
+def _est_eml(content: bytes) -> bool:
+    head = content[:4096]
+    # Bloc d'en-têtes : jusqu'à la première ligne vide
+    bloc = re.split(rb"\r?\n\r?\n", head, maxsplit=1)[0]
+    lignes = bloc.splitlines()
+    if not lignes or not _NOM_ENTETE.match(lignes[0]):
+        return False
+    noms = {match.group(1).lower() for match in map(_NOM_ENTETE.match, lignes) if match}
+    return len(noms & _ENTETES_COURRIEL) >= 2
+
+def _est_html(content: bytes) -> bool:
+    head = content[:1024]
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    head = head.lstrip().lower()
+    return head.startswith(b"<") and any(marque in head for marque in (b"<!doctype html", b"<html", b"<head", b"<body"))
+
+def _est_texte(content: bytes) -> bool:
+    if content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return True
+    head = content[:8192]
+    if not head or b"\x00" in head:
+        return False
+    # Quelques caractères de contrôle sont tolérés (saut de page, échappements)
+    controles = sum(1 for octet in head if octet < 0x20 and octet not in b"\t\n\r\x0c\x1b")
+    return controles * 100 < len(head)
+
+class FormatHandler:
+    """
+    Format de fichier pris en charge : reconnaissance par signature (sans import lourd)
+    et traitement délégué au module chargé au premier usage.
+    """
+    def __init__(self, nom: str, module: str, extension: str, media_type: str,
+                 signature: Callable[[bytes], bool], suffixe: str = "",
+                 indisponible: Callable[[], Optional[str]] = lambda: None):
+        self.nom = nom
+        self.module_name = module
+        self.extension = extension
+        self.media_type = media_type
+        self.signature = signature
+        # Complément du suffixe des fichiers produits ("_ANONYM" + suffixe)
+        self.suffixe = suffixe
+        # Raison pour laquelle le format ne peut pas être traité sur ce serveur (outil absent), sinon None
+        self.indisponible = indisponible
+
+    def __repr__(self) -> str:
+        return f"FormatHandler({self.nom!r})"
+
+    @property
+    def module(self) -> ModuleType:
+        return charger(self.module_name)
+
+    def sniff(self, content: bytes) -> bool:
+        return self.signature(content)
+
+    def iter_text_units(self, content: bytes) -> Iterator[Tuple[str, str]]:
+        """
+        Unités de texte du document (pages, paragraphes...) dans l'ordre de lecture,
+        avec leur localisation ("page 3", "corps/tableau 1/paragraphe 2"...).
+        """
+        return self.module.iter_text_units(content)
+
+    def extract_text(self, content: bytes) -> str:
+        return "".join(texte + "\n" for _, texte in self.iter_text_units(content))
+
+    def encodage(self, content: bytes) -> Optional[str]:
+        """
+        Encodage du texte source pour les formats texte, None pour les autres.
+        """
+        detecter = getattr(self.module, "encodage_source", None)
+        return detecter(content) if detecter else None
+
+    def apply_replacements(self, content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                           mapping: Optional[Dict[str, str]] = None,
+                           progress: Optional[ProgressCallback] = None,
+                           encodage: Optional[str] = None) -> Tuple[Any, Dict[str, str]]:
+        """
+        Anonymise (tiers) ou dé-anonymise (mapping) le document en conservant sa mise en forme.
+        À l'anonymisation, `mapping` donne les balises déjà attribuées (ex: celles du projet) :
+        la détection basique poursuit leur numérotation. `encodage` (formats texte) : encodage
+        du fichier source, repris à la dé-anonymisation.
+
+        Returns:
+            Tuple (document modifié, à passer à write(), mapping utilisé)
+        """
+        options = {"encodage": encodage} if encodage and hasattr(self.module, "encodage_source") else {}
+        return self.module.apply_replacements(content, tiers=tiers, mapping=mapping, progress=progress, **options)
+
+    def write(self, document: Any) -> bytes:
+        return self.module.write(document)
+
+# Formats reconnus, testés dans l'ordre
+REGISTRE: List[FormatHandler] = []
+
+def enregistrer(handler: FormatHandler) -> FormatHandler:
+    REGISTRE.append(handler)
+    return handler
+
+enregistrer(FormatHandler("pdf", "pdf", ".pdf", "application/pdf", _est_pdf, suffixe="_SECURE"))
+enregistrer(FormatHandler("docx", "word", ".docx",
+                          "application/vnd.openxmlformats-officedocument.wordprocessingml.document", _est_docx))
+enregistrer(FormatHandler("doc", "doc", ".doc", "application/msword", _est_doc,
+                          indisponible=soffice.raison_indisponible))
+enregistrer(FormatHandler("odt", "odt", ".odt", "application/vnd.oasis.opendocument.text", _est_odt))
+enregistrer(FormatHandler("xlsx", "xlsx", ".xlsx",
+                          "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _est_xlsx))
+enregistrer(FormatHandler("ods", "ods", ".ods", "application/vnd.oasis.opendocument.spreadsheet", _est_ods))
+enregistrer(FormatHandler("rtf", "rtf", ".rtf", "application/rtf", _est_rtf))
+enregistrer(FormatHandler("eml", "eml", ".eml", "message/rfc822", _est_eml))
+enregistrer(FormatHandler("html", "html", ".html", "text/html", _est_html))
+# Texte brut en dernier : reconnu à l'absence d'octets binaires
+enregistrer(FormatHandler("txt", "txt", ".txt", "text/plain", _est_texte))
+
+def detecter(content: bytes) -> Optional[FormatHandler]:
+    """
+    Format du fichier d'après son contenu, ou None s'il n'est pas pris en charge.
+    """
+    for handler in REGISTRE:
+        if handler.sniff(content):
+            return handler
+    return None
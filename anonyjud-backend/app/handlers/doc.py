@@ -0,0 +1,32 @@
+"""
+Traitement des fichiers Word 97-2003 (.doc)
+Le document est converti en .docx par LibreOffice, traité par le module Word, puis
+reconverti en .doc
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .. import soffice
+from ..jobs import ProgressCallback
+from . import word
+
+def _docx(content: bytes) -> bytes:
+    # Mis en cache par empreinte : l'aperçu puis le téléchargement ne convertissent qu'une fois
+    return soffice.convertir(content, "doc", "docx")
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    return word.iter_text_units(_docx(content))
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un document .doc ; le document produit est à passer à write().
+    """
+    if progress:
+        progress("conversion", 0, 1)
+    docx = _docx(content)
+    if progress:
+        progress("conversion", 1, 1)
+    return word.apply_replacements(docx, tiers=tiers, mapping=mapping, progress=progress)
+
+def write(doc) -> bytes:
+    return soffice.convertir(word.write(doc), "docx", "doc", cache=False)
@@ -0,0 +1,136 @@
+"""
+Traitement des courriels (.eml)
+Les en-têtes de correspondants et d'objet, les parties texte et HTML et les noms des
+pièces jointes sont remplacés avec un même scanner, pour des balises cohérentes dans
+tout le message
+"""
+import email
+import logging
+from email import policy
+from email.message import EmailMessage
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..jobs import ProgressCallback
+from ..streaming import Scanner, creer_scanner, replace_text
+from .html import remplacer_html_texte, unites_texte
+
+logger = logging.getLogger(__name__)
+
+# En-têtes contenant des noms, adresses ou l'objet du message
+ENTETES_TEXTE = ("From", "Sender", "Reply-To", "To", "Cc", "Bcc", "Subject")
+
+def _lire(content: bytes) -> EmailMessage:
+    # Les fins de ligne du fichier source sont conservées à l'écriture
+    politique = policy.default.clone(linesep="\r\n") if b"\r\n" in content[:4096] else policy.default
+    return email.message_from_bytes(content, policy=politique)
+
+def _contenu_texte(part: EmailMessage) -> Optional[str]:
+    """
+    Contenu décodé d'une partie texte, None si elle n'est pas décodable.
+    """
+    if part.get_content_maintype() != "text":
+        return None
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeError):
+        return None
+
+def _feuilles(msg: EmailMessage) -> Iterator[EmailMessage]:
+    for part in msg.walk():
+        if not part.is_multipart():
+            yield part
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    En-têtes de correspondants et d'objet, puis texte de chaque partie.
+    """
+    msg = _lire(content)
+    for nom in ENTETES_TEXTE:
+        for valeur in msg.get_all(nom, []):
+            yield nom, str(valeur)
+    for numero, part in enumerate(_feuilles(msg), 1):
+        texte = _contenu_texte(part)
+        if texte is None:
+            continue
+        lignes = unites_texte((texte,)) if part.get_content_subtype() == "html" else texte.splitlines()
+        for ligne in lignes:
+            yield f"partie {numero}", ligne
+
+def _remplacer_entetes(msg: EmailMessage, scanner: Scanner) -> None:
+    for nom in ENTETES_TEXTE:
+        valeurs = [str(valeur) for valeur in msg.get_all(nom, [])]
+        remplacees = [replace_text(valeur, scanner) for valeur in valeurs]
+        if remplacees == valeurs:
+            continue
+        if len(valeurs) == 1:
+            # Remplacé sur place pour garder l'ordre des en-têtes
+            msg.replace_header(nom, remplacees[0])
+        else:
+            del msg[nom]
+            for valeur in remplacees:
+                msg[nom] = valeur
+
+def _remplacer_partie(part: EmailMessage, texte: str, scanner: Scanner, racine: bool) -> None:
+    sous_type = part.get_content_subtype()
+    if sous_type == "html":
+        remplace = remplacer_html_texte(texte, scanner)
+    else:
+        remplace = replace_text(texte, scanner)
+    nom_fichier = part.get_filename()
+    nom_remplace = replace_text(nom_fichier, scanner) if nom_fichier else None
+    if remplace == texte and nom_remplace == nom_fichier:
+        return
+    # set_content réécrit les en-têtes de contenu : disposition et nom de fichier sont reportés
+    part.set_content(remplace, subtype=sous_type, charset="utf-8",
+                     disposition=part.get_content_disposition(), filename=nom_remplace)
+    if not racine:
+        # Ajouté par set_content, inutile hors de l'en-tête du message
+        del part["MIME-Version"]
+
+def _retirer_pieces_non_textuelles(msg: EmailMessage) -> int:
+    """
+    Retire les pièces jointes qui ne sont pas du texte : leur contenu ne peut pas être anonymisé ici.
+    """
+    retirees = 0
+    for part in msg.walk():
+        if not part.is_multipart() or part.get_content_maintype() != "multipart":
+            continue
+        conservees = []
+        for sous_partie in part.get_payload():
+            if sous_partie.is_multipart() or _contenu_texte(sous_partie) is not None:
+                conservees.append(sous_partie)
+            else:
+                retirees += 1
+                logger.warning(f"⚠️ Pièce jointe non textuelle retirée: {sous_partie.get_filename() or sous_partie.get_content_type()}")
+        part.set_payload(conservees)
+    if not msg.is_multipart() and _contenu_texte(msg) is None:
+        retirees += 1
+        logger.warning(f"⚠️ Contenu non textuel retiré: {msg.get_content_type()}")
+        msg.set_content("")
+    return retirees
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un courriel ; le message produit est à passer à write().
+    À l'anonymisation, les pièces jointes non textuelles sont retirées.
+    """
+    scanner = creer_scanner(tiers, mapping)
+    msg = _lire(content)
+    if tiers is not None:
+        _retirer_pieces_non_textuelles(msg)
+
+    _remplacer_entetes(msg, scanner)
+    parties = list(_feuilles(msg))
+    for index, part in enumerate(parties):
+        if progress:
+            progress("parties", index + 1, len(parties))
+        texte = _contenu_texte(part)
+        if texte is not None:
+            _remplacer_partie(part, texte, scanner, part is msg)
+
+    print(f"📧 Courriel traité: {len(parties)} partie(s), {len(scanner.mapping)} balise(s)")
+    return msg, dict(scanner.mapping)
+
+def write(msg: EmailMessage) -> bytes:
+    return msg.as_bytes()
@@ -0,0 +1,328 @@
+"""
+Traitement des fichiers HTML
+Le texte entre les balises est décodé (entités), remplacé en flux puis réécrit ; les
+balises sont recopiées, seules les valeurs d'attributs textuels (title, alt...) sont
+remplacées. Dans les scripts, les chaînes littérales et les commentaires sont remplacés
+(données JSON-LD comprises) ; le contenu des feuilles de style n'est pas modifié
+"""
+import codecs
+import html
+import io
+import re
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..jobs import ProgressCallback
+from ..streaming import (Scanner, StreamReplacer, creer_scanner, detecter_encodage, encoder, iter_decoded,
+                         lire_spool, replace_text, spool, suivi_octets)
+
+# Attributs dont la valeur est du texte lisible
+ATTRIBUTS_TEXTE = frozenset(("title", "alt", "value", "content", "href", "placeholder",
+                             "aria-label", "label", "summary"))
+
+# Éléments dont le contenu est recopié sans analyse
+ELEMENTS_BRUTS = frozenset(("style",))
+# Éléments dont le contenu est du code : seules ses chaînes et commentaires sont remplacés
+ELEMENTS_SCRIPT = frozenset(("script",))
+
+# Octets examinés pour trouver la déclaration d'encodage
+_HEAD = 4096
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.I)
+_NOM_BALISE = re.compile(r"<([a-zA-Z][\w-]*)")
+_ATTRIBUT = re.compile(r"""(\s([\w:.-]+)\s*=\s*)("[^"]*"|'[^']*')""")
+# Entité coupée par la fin d'un bloc
+_ENTITE_PARTIELLE = re.compile(r"&[#\w]{0,32}$")
+# Chaîne littérale ou commentaire d'un script (JavaScript, JSON)
+_LITTERAL = re.compile(r""""(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`|//[^\n]*|/\*.*?\*/""", re.S)
+_ECHAPPEMENT = re.compile(r"\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)", re.S)
+_ECHAPPEMENTS = {"n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f", "v": "\v", "0": "\0"}
+# Types de script dont le contenu est du code ; les autres (gabarits) sont traités comme du texte
+_TYPES_CODE = re.compile(r"(?:text|application)/(?:javascript|ecmascript|(?:ld\+)?json)|module|[\w/.+-]*json", re.I)
+
+TEXTE, BALISE, COMMENTAIRE, BRUT, SCRIPT = "texte", "balise", "commentaire", "brut", "script"
+
+class LecteurHtml:
+    """
+    Découpe un flux de texte HTML en événements :
+    - (TEXTE, str) : texte entre les balises, entités décodées
+    - (BALISE, str) : balise ouvrante ou fermante, doctype
+    - (COMMENTAIRE, str) : commentaire complet
+    - (BRUT, str) : contenu d'une feuille de style
+    - (SCRIPT, str) : contenu d'un script
+    Les morceaux peuvent être coupés n'importe où : la fin incomplète est gardée pour le suivant.
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._fin_brut: Optional["re.Pattern"] = None
+        self._genre_brut = BRUT
+
+    def feed(self, chunk: str, final: bool = False) -> Iterator[Tuple[str, str]]:
+        buffer = self._buffer + chunk
+        position = 0
+        while position < len(buffer):
+            if self._fin_brut is not None:
+                match = self._fin_brut.search(buffer, position)
+                if match is None:
+                    # La fin gardée peut être le début de la balise fermante
+                    garde = len(buffer) if final else max(position, len(buffer) - 16)
+                    if garde > position:
+                        yield self._genre_brut, buffer[position:garde]
+                    position = garde
+                    break
+                if match.start() > position:
+                    yield self._genre_brut, buffer[position:match.start()]
+                position = match.start()
+                self._fin_brut = None
+                continue
+
+            debut = buffer.find("<", position)
+            if debut < 0:
+                debut = len(buffer)
+            if debut > position:
+                texte = buffer[position:debut]
+                if debut == len(buffer) and not final:
+                    partielle = _ENTITE_PARTIELLE.search(texte)
+                    if partielle:
+                        texte = texte[:partielle.start()]
+                        debut = position + partielle.start()
+                if texte:
+                    yield TEXTE, html.unescape(texte)
+                position = debut
+                if position >= len(buffer) or buffer[position] != "<":
+                    break
+                continue
+
+            if buffer.startswith("<!--", position):
+                fin = buffer.find("-->", position + 4)
+                if fin < 0:
+                    if final:
+                        yield COMMENTAIRE, buffer[position:]
+                        position = len(buffer)
+                    break
+                yield COMMENTAIRE, buffer[position:fin + 3]
+                position = fin + 3
+                continue
+            reste = buffer[position:position + 4]
+            if not final and len(reste) < 4 and "<!--".startswith(reste):
+                break
+            suivant = reste[1:2]
+            if suivant.isalpha() or (suivant and suivant in "/!?"):
+                fin = buffer.find(">", position)
+                if fin < 0:
+                    if final:
+                        yield BRUT, buffer[position:]
+                        position = len(buffer)
+                    break
+                balise = buffer[position:fin + 1]
+                yield BALISE, balise
+                nom = _NOM_BALISE.match(balise)
+                element = nom.group(1).lower() if nom else ""
+                if element in ELEMENTS_BRUTS | ELEMENTS_SCRIPT and not balise.endswith("/>"):
+                    self._fin_brut = re.compile("</" + re.escape(nom.group(1)), re.I)
+                    self._genre_brut = SCRIPT if element in ELEMENTS_SCRIPT else BRUT
+                position = fin + 1
+                continue
+            # "<" isolé : texte
+            yield TEXTE, "<"
+            position += 1
+        self._buffer = buffer[position:]
+
+    def close(self) -> Iterator[Tuple[str, str]]:
+        return self.feed("", final=True)
+
+def _balise(balise: str, scanner: Scanner) -> str:
+    """
+    Remplace les valeurs des attributs textuels d'une balise.
+    """
+    if balise.startswith("</"):
+        return balise
+
+    def attribut(match: "re.Match") -> str:
+        if match.group(2).lower() not in ATTRIBUTS_TEXTE:
+            return match.group(0)
+        guillemet = match.group(3)[0]
+        valeur = html.unescape(match.group(3)[1:-1])
+        remplacee = replace_text(valeur, scanner)
+        if remplacee == valeur:
+            return match.group(0)
+        return f"{match.group(1)}{guillemet}{html.escape(remplacee, quote=True)}{guillemet}"
+
+    return _ATTRIBUT.sub(attribut, balise)
+
+def _decoder_js(texte: str) -> str:
+    def echappement(match: "re.Match") -> str:
+        code = match.group(1)
+        if len(code) > 1:
+            return chr(int(code[1:], 16))
+        return _ECHAPPEMENTS.get(code, code)
+    return _ECHAPPEMENT.sub(echappement, texte)
+
+def _encoder_js(texte: str, guillemet: str) -> str:
+    texte = texte.replace("\\", "\\\\").replace(guillemet, "\\" + guillemet)
+    texte = texte.replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+    # Une valeur restituée ne doit pas fermer l'élément <script>
+    return texte.replace("</", "<\\/")
+
+def _script(code: str, type_script: str, scanner: Scanner) -> str:
+    """
+    Remplace les valeurs dans les chaînes littérales et commentaires d'un script.
+    """
+    if type_script and not _TYPES_CODE.fullmatch(type_script):
+        return replace_text(code, scanner)
+
+    def litteral(match: "re.Match") -> str:
+        jeton = match.group(0)
+        if jeton.startswith("/"):
+            return replace_text(jeton, scanner)
+        guillemet = jeton[0]
+        valeur = _decoder_js(jeton[1:-1])
+        remplacee = replace_text(valeur, scanner)
+        if remplacee == valeur:
+            return jeton
+        return guillemet + _encoder_js(remplacee, guillemet) + guillemet
+
+    return _LITTERAL.sub(litteral, code)
+
+def _type_script(balise: str) -> str:
+    for match in _ATTRIBUT.finditer(balise):
+        if match.group(2).lower() == "type":
+            return html.unescape(match.group(3)[1:-1]).strip()
+    return ""
+
+def remplacer_html(chunks: Iterable[str], scanner: Scanner) -> Iterator[str]:
+    """
+    Applique le scanner à un document HTML découpé en morceaux quelconques.
+    Une valeur coupée par une balise (<b>Jean</b> Dupont) n'est pas reconnue entière.
+    Le contenu d'un script est gardé entier le temps de le traiter.
+    """
+    lecteur = LecteurHtml()
+    replacer = StreamReplacer(scanner)
+    script: List[str] = []
+    type_script = ""
+
+    def evenements() -> Iterator[Tuple[str, str]]:
+        for chunk in chunks:
+            yield from lecteur.feed(chunk)
+        yield from lecteur.close()
+
+    en_cours = False
+    for genre, valeur in evenements():
+        if genre == TEXTE:
+            en_cours = True
+            sortie = replacer.feed(valeur)
+            if sortie:
+                yield html.escape(sortie, quote=False)
+            continue
+        if en_cours:
+            yield html.escape(replacer.flush(), quote=False)
+            en_cours = False
+        if genre == SCRIPT:
+            script.append(valeur)
+            continue
+        if script:
+            yield _script("".join(script), type_script, scanner)
+            script = []
+        if genre == BALISE:
+            nom = _NOM_BALISE.match(valeur)
+            if nom and nom.group(1).lower() in ELEMENTS_SCRIPT:
+                type_script = _type_script(valeur)
+            yield _balise(valeur, scanner)
+        elif genre == COMMENTAIRE:
+            yield replace_text(valeur, scanner)
+        else:
+            yield valeur
+    if en_cours:
+        yield html.escape(replacer.flush(), quote=False)
+    if script:
+        yield _script("".join(script), type_script, scanner)
+
+def remplacer_html_texte(texte: str, scanner: Scanner) -> str:
+    return "".join(remplacer_html((texte,), scanner))
+
+def detecter_charset(head: bytes) -> Tuple[str, bytes]:
+    """
+    Encodage d'un document HTML : BOM, sinon déclaration <meta charset>, sinon contenu.
+    """
+    encoding, bom = detecter_encodage(head)
+    if bom:
+        return encoding, bom
+    declaration = _META_CHARSET.search(head)
+    if declaration:
+        try:
+            return codecs.lookup(declaration.group(1).decode("ascii")).name, b""
+        except LookupError:
+            pass
+    return encoding, bom
+
+def _encoder(texte: str, encoding: str) -> bytes:
+    try:
+        return encoder(texte, encoding)
+    except UnicodeEncodeError:
+        # Valeur restituée hors de l'encodage du document : référence de caractère
+        return b"".join(_encoder_caractere(caractere, encoding) for caractere in texte)
+
+def _encoder_caractere(caractere: str, encoding: str) -> bytes:
+    try:
+        return encoder(caractere, encoding)
+    except UnicodeEncodeError:
+        return f"&#{ord(caractere)};".encode("ascii")
+
+def _morceaux(content: bytes, progress=None) -> Tuple[str, bytes, Iterator[str]]:
+    encoding, bom = detecter_charset(content[:_HEAD])
+    return encoding, bom, iter_decoded(io.BytesIO(content), encoding, len(bom), progress)
+
+def unites_texte(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Texte entre les balises, bloc par bloc (hors scripts, styles et commentaires).
+    """
+    lecteur = LecteurHtml()
+    texte: List[str] = []
+
+    def evenements() -> Iterator[Tuple[str, str]]:
+        for chunk in chunks:
+            yield from lecteur.feed(chunk)
+        yield from lecteur.close()
+
+    for genre, valeur in evenements():
+        if genre == TEXTE:
+            texte.append(valeur)
+        elif texte:
+            unite = "".join(texte).strip()
+            texte = []
+            if unite:
+                yield unite
+    unite = "".join(texte).strip()
+    if unite:
+        yield unite
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    _, _, chunks = _morceaux(content)
+    for numero, texte in enumerate(unites_texte(chunks), 1):
+        yield f"bloc {numero}", texte
+
+def remplacer_flux(content: bytes, output: IO[bytes], scanner: Scanner, progress=None) -> str:
+    """
+    Remplace les valeurs d'un document HTML bloc par bloc, à mémoire constante.
+
+    Returns:
+        L'encodage reconnu
+    """
+    encoding, bom, chunks = _morceaux(content, progress)
+    output.write(bom)
+    for texte in remplacer_html(chunks, scanner):
+        output.write(_encoder(texte, encoding))
+    return encoding
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un document HTML ; le fichier produit est à passer à write().
+    """
+    scanner = creer_scanner(tiers, mapping)
+    output = spool()
+    encoding = remplacer_flux(content, output, scanner, suivi_octets(progress, len(content)))
+    print(f"📄 HTML traité en flux ({encoding}), {len(scanner.mapping)} balise(s)")
+    return output, dict(scanner.mapping)
+
+def write(document: IO[bytes]) -> bytes:
+    return lire_spool(document)
@@ -0,0 +1,179 @@
+"""
+Traitement des classeurs OpenDocument (.ods)
+Le texte des cellules, des en-têtes et des métadonnées est remplacé directement dans le
+XML, chaque chaîne distincte n'étant analysée qu'une fois ; les autres parties du paquet
+(images) sont recopiées sans recompression
+Les feuilles et les plages nommées sont renommées, et les formules, adresses et réglages
+qui y renvoient suivent
+"""
+import logging
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..jobs import ProgressCallback
+from ..streaming import creer_scanner, replace_text
+from ..zip_package import RemplacementsMemo, iter_noeuds, lire_parties, nom_unique, reecrire, remplacer_noeuds
+
+logger = logging.getLogger(__name__)
+
+# Parties XML contenant du texte : cellules, en-têtes et pieds de page, métadonnées
+PARTIES_TEXTE = ("content.xml", "styles.xml", "meta.xml")
+
+# Nœud texte entre deux balises
+_NOEUD = re.compile(rb"(>)([^<>]+)(<)")
+# Valeur texte d'une cellule portée en attribut
+_STRING_VALUE = re.compile(rb'(office:string-value=")([^"]*)(")')
+_PARAGRAPHE = re.compile(rb"<text:(p|h)\b[^>]*>(.*?)</text:\1>", re.S)
+_ESPACES = re.compile(rb"<text:(?:s|tab|line-break)\b[^>]*/>")
+_BALISE = re.compile(rb"<[^>]+>")
+# Nom d'une feuille, d'une plage ou d'une expression nommée
+_NOM_FEUILLE = re.compile(rb'(<table:table\s[^>]*?\btable:name=")([^"]*)(")')
+_NOM_PLAGE = re.compile(rb'(<table:named-(?:range|expression)\s[^>]*?\btable:name=")([^"]*)(")')
+# Formules, conditions et adresses de plages (cellules, validations, graphiques, zones d'impression)
+_FORMULE = re.compile(rb'(\s[\w-]+:(?:[\w-]*address(?:es)?|formula|condition|expression|print-ranges)=")([^"]*)(")')
+# Réglages de la vue enregistrés par feuille, et feuille active
+_REGLAGE_FEUILLE = re.compile(rb'(<config:config-item-map-entry\s[^>]*?\bconfig:name=")([^"]*)(")')
+_FEUILLE_ACTIVE = re.compile(rb'(<config:config-item\s[^>]*?\bconfig:name="ActiveTable"[^>]*>)([^<]*)(</config:config-item>)')
+_REGLAGES = "settings.xml"
+
+# Jetons d'une formule : chaîne littérale, feuille entre apostrophes, ou reste de la formule
+_JETON = re.compile(r""""(?:[^"]|"")*"|'(?:[^']|'')*'(?=\.)|[^"']+|.""", re.S)
+# Nom de feuille utilisable sans apostrophes dans une adresse
+_FEUILLE_NUE = re.compile(r"[^\W\d]\w*")
+_INTERDITS_FEUILLE = re.compile(r"[\[\]:*?/\\]")
+# Nom de plage qui se lirait comme une référence de cellule (A1, NOM1...)
+_REFERENCE = re.compile(r"[A-Za-z]{1,3}\d+")
+
+def _selection(nom: str) -> bool:
+    # Les graphiques incorporés (Object 1/content.xml) renvoient aux plages des feuilles
+    return nom in PARTIES_TEXTE or nom == _REGLAGES or nom.endswith("/content.xml")
+
+def _nom_de_plage(nom: str) -> str:
+    nom = re.sub(r"\W", "_", nom)
+    if not re.match(r"[^\W\d]", nom) or _REFERENCE.fullmatch(nom):
+        nom = "_" + nom
+    return nom
+
+def _citer(feuille: str) -> str:
+    return "'" + feuille.replace("'", "''") + "'"
+
+class _Renommage:
+    """
+    Nouveaux noms des feuilles et des plages nommées (clés sans casse), et leur report
+    dans les formules et adresses.
+    """
+    def __init__(self, remplacer: Callable[[str], str], feuilles: Dict[str, str], plages: Dict[str, str]):
+        self._remplacer = remplacer
+        self.feuilles = feuilles
+        self.plages = plages
+        nues = [nom for nom in feuilles if _FEUILLE_NUE.fullmatch(nom)]
+        self._feuille_nue = self._alternative(nues, r"(?<![\w.'])(", r")(?=\.)")
+        self._plage = self._alternative(list(plages), r"(?<![\w.$'])(", r")(?![\w.(])")
+
+    @staticmethod
+    def _alternative(noms: List[str], avant: str, apres: str) -> Optional["re.Pattern"]:
+        if not noms:
+            return None
+        return re.compile(avant + "|".join(re.escape(nom) for nom in sorted(noms, key=len, reverse=True)) + apres,
+                          re.IGNORECASE)
+
+    @classmethod
+    def depuis(cls, content: bytes, remplacer: Callable[[str], str]) -> "_Renommage":
+        feuilles: Dict[str, str] = {}
+        plages: Dict[str, str] = {}
+        for _, xml in lire_parties(content, lambda nom: nom == "content.xml"):
+            anciens = list(iter_noeuds(xml, _NOM_FEUILLE))
+            pris = {ancien.lower() for ancien in anciens if remplacer(ancien) == ancien}
+            for ancien in anciens:
+                nouveau = remplacer(ancien)
+                if nouveau != ancien:
+                    nouveau = _INTERDITS_FEUILLE.sub("_", nouveau).strip("'") or "Feuille"
+                    feuilles[ancien.lower()] = nom_unique(nouveau, pris)
+            anciens = list(iter_noeuds(xml, _NOM_PLAGE))
+            pris = {ancien.lower() for ancien in anciens if remplacer(ancien) == ancien}
+            for ancien in anciens:
+                nouveau = remplacer(ancien)
+                if nouveau != ancien and ancien.lower() not in plages:
+                    plages[ancien.lower()] = nom_unique(_nom_de_plage(nouveau), pris, suffixe="_{}")
+        return cls(remplacer, feuilles, plages)
+
+    def feuille(self, nom: str) -> str:
+        return self.feuilles.get(nom.lower(), nom)
+
+    def plage(self, nom: str) -> str:
+        return self.plages.get(nom.lower(), nom)
+
+    def formule(self, texte: str) -> str:
+        """
+        Formule ou adresse avec les feuilles et plages renommées ; le texte des chaînes
+        littérales passe par le remplacement commun.
+        """
+        morceaux = []
+        for jeton in _JETON.findall(texte):
+            if len(jeton) > 1 and jeton[0] == jeton[-1] == '"':
+                litteral = jeton[1:-1].replace('""', '"')
+                jeton = '"' + self._remplacer(litteral).replace('"', '""') + '"'
+            elif len(jeton) > 1 and jeton[0] == jeton[-1] == "'":
+                feuille = jeton[1:-1].replace("''", "'")
+                if feuille.lower() in self.feuilles:
+                    jeton = _citer(self.feuilles[feuille.lower()])
+            else:
+                if self._plage:
+                    jeton = self._plage.sub(lambda match: self.plages[match.group(1).lower()], jeton)
+                if self._feuille_nue:
+                    jeton = self._feuille_nue.sub(lambda match: _citer(self.feuilles[match.group(1).lower()]), jeton)
+            morceaux.append(jeton)
+        return "".join(morceaux)
+
+    def motifs(self, nom: str) -> List[Tuple["re.Pattern", Callable[[str], str]]]:
+        """
+        Motifs des noms et des formules dans une partie, avec le remplacement de chacun.
+        """
+        if not (self.feuilles or self.plages):
+            # Seules les chaînes littérales des formules restent à traiter
+            return [(_FORMULE, self.formule)] if nom != _REGLAGES else []
+        if nom == _REGLAGES:
+            return [(_REGLAGE_FEUILLE, self.feuille), (_FEUILLE_ACTIVE, self.feuille)]
+        return [(_NOM_FEUILLE, self.feuille), (_NOM_PLAGE, self.plage), (_FORMULE, self.formule)]
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Noms des feuilles, puis paragraphes des cellules dans l'ordre des feuilles.
+    """
+    for _, xml in lire_parties(content, lambda nom: nom == "content.xml"):
+        for nom in iter_noeuds(xml, _NOM_FEUILLE):
+            yield "feuille", nom
+        for numero, paragraphe in enumerate(_PARAGRAPHE.finditer(xml), 1):
+            texte = _BALISE.sub(b"", _ESPACES.sub(b" ", paragraphe.group(2)))
+            for unite in iter_noeuds(b">" + texte + b"<", _NOEUD):
+                yield f"paragraphe {numero}", unite
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un classeur ; le classeur produit est à passer à write().
+    """
+    scanner = creer_scanner(tiers, mapping)
+    remplacer = RemplacementsMemo(lambda texte: replace_text(texte, scanner))
+    renommage = _Renommage.depuis(content, remplacer)
+    modifiees = []
+
+    def traiter(nom: str, xml: bytes) -> Optional[bytes]:
+        resultat = None
+        motifs = [] if nom == _REGLAGES else [(_NOEUD, remplacer), (_STRING_VALUE, remplacer)]
+        for motif, fonction in motifs + renommage.motifs(nom):
+            nouveau = remplacer_noeuds(resultat or xml, motif, fonction)
+            if nouveau is not None:
+                resultat = nouveau
+        if resultat is not None:
+            modifiees.append(nom)
+        return resultat
+
+    suivi = (lambda courant, total: progress("parties", courant, total)) if progress else None
+    document = reecrire(content, traiter, _selection, suivi)
+    logger.info(f"📊 Classeur traité: {remplacer.analyses} chaîne(s) distincte(s) analysée(s), "
+                f"{len(renommage.feuilles)} feuille(s) renommée(s), parties modifiées: {modifiees}")
+    return document, dict(scanner.mapping)
+
+def write(document: bytes) -> bytes:
+    return document
@@ -0,0 +1,238 @@
+"""
+Traitement des fichiers ODT (odfpy)
+Anonymisation et dé-anonymisation paragraphe par paragraphe, document chargé en mémoire :
+corps, titres, tableaux, en-têtes et pieds de page, notes et commentaires
+"""
+import io
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from odf import teletype
+from odf.namespaces import OFFICENS, STYLENS, TABLENS, TEXTNS
+from odf.opendocument import load
+
+from ..anonymizer import anonymize_units
+from ..deanonymizer import deanonymize_text
+from ..jobs import ProgressCallback
+
+_PARAGRAPHE = (TEXTNS, "p")
+_TITRE = (TEXTNS, "h")
+
+# Éléments qui délimitent une zone du document, nommée dans la localisation
+ZONES = {
+    (TABLENS, "table"): "tableau",
+    (TEXTNS, "note"): "note",
+    (OFFICENS, "annotation"): "commentaire",
+    (STYLENS, "header"): "en-tête",
+    (STYLENS, "header-left"): "en-tête de page paire",
+    (STYLENS, "header-first"): "en-tête de première page",
+    (STYLENS, "footer"): "pied de page",
+    (STYLENS, "footer-left"): "pied de page de page paire",
+    (STYLENS, "footer-first"): "pied de page de première page",
+}
+
+def _elements(noeud):
+    return (enfant for enfant in noeud.childNodes if enfant.nodeType == enfant.ELEMENT_NODE)
+
+def _parcourir(noeud, lieu: str, compteurs: Dict[str, int]) -> Iterator[Tuple[str, Any]]:
+    for enfant in _elements(noeud):
+        if enfant.qname in (_PARAGRAPHE, _TITRE):
+            nom = "titre" if enfant.qname == _TITRE else "paragraphe"
+            cle = f"{lieu}/{nom}"
+            compteurs[cle] = compteurs.get(cle, 0) + 1
+            yield f"{cle} {compteurs[cle]}", enfant
+            # Notes et commentaires sont portés par le paragraphe qui les cite
+            yield from _parcourir(enfant, lieu, compteurs)
+            continue
+        zone = ZONES.get(enfant.qname)
+        if zone:
+            cle = f"{lieu}/{zone}"
+            compteurs[cle] = compteurs.get(cle, 0) + 1
+            yield from _parcourir(enfant, f"{cle} {compteurs[cle]}", compteurs)
+        else:
+            yield from _parcourir(enfant, lieu, compteurs)
+
+def iter_paragraphes(doc) -> Iterator[Tuple[str, Any]]:
+    """
+    Paragraphes et titres du document avec leur localisation : corps (tableaux, notes et
+    commentaires compris), puis en-têtes et pieds de page des pages maîtres.
+    """
+    compteurs: Dict[str, int] = {}
+    yield from _parcourir(doc.text, "corps", compteurs)
+    yield from _parcourir(doc.masterstyles, "mise en page", compteurs)
+
+def _a_sous_paragraphes(paragraphe) -> bool:
+    """
+    Vrai si le paragraphe contient d'autres paragraphes (note, commentaire, cadre).
+    """
+    for enfant in _elements(paragraphe):
+        if enfant.qname in (_PARAGRAPHE, _TITRE) or _a_sous_paragraphes(enfant):
+            return True
+    return False
+
+def _noeuds_texte(noeud) -> Iterator[Any]:
+    """
+    Nœuds texte propres au paragraphe, sans ceux des paragraphes imbriqués.
+    """
+    for enfant in noeud.childNodes:
+        if enfant.nodeType == enfant.TEXT_NODE:
+            yield enfant
+        elif enfant.qname not in (_PARAGRAPHE, _TITRE) and enfant.qname not in ZONES:
+            yield from _noeuds_texte(enfant)
+
+def _remplacer_paragraphe(paragraphe, texte: str) -> None:
+    # Vider le paragraphe puis ajouter le nouveau texte
+    paragraphe.childNodes = []
+    paragraphe.addText(texte)
+
+def _modifier_noeud(noeud, texte: str) -> None:
+    noeud.data = texte
+
+def _cibles(doc) -> List[Tuple[str, str, Callable[[str], None]]]:
+    """
+    Textes à traiter : (localisation, texte, fonction d'écriture du nouveau texte).
+    Un paragraphe contenant une note ou un commentaire est traité nœud par nœud pour
+    ne pas effacer le contenu imbriqué, qui est traité à part.
+    """
+    cibles = []
+    for lieu, paragraphe in iter_paragraphes(doc):
+        if _a_sous_paragraphes(paragraphe):
+            for noeud in _noeuds_texte(paragraphe):
+                cibles.append((lieu, noeud.data, lambda texte, noeud=noeud: _modifier_noeud(noeud, texte)))
+        else:
+            cibles.append((lieu, teletype.extractText(paragraphe),
+                           lambda texte, paragraphe=paragraphe: _remplacer_paragraphe(paragraphe, texte)))
+    return cibles
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Texte de chaque paragraphe et titre du document, avec sa localisation.
+    """
+    doc = load(io.BytesIO(content))
+    for lieu, paragraphe in iter_paragraphes(doc):
+        if _a_sous_paragraphes(paragraphe):
+            yield lieu, "".join(noeud.data for noeud in _noeuds_texte(paragraphe))
+        else:
+            yield lieu, teletype.extractText(paragraphe)
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un document ODT ; le document produit est à passer à write().
+    """
+    if tiers is not None:
+        return _anonymiser(content, tiers, progress, known=mapping)
+    return _desanonymiser(content, mapping or {}, progress), mapping or {}
+
+def write(doc) -> bytes:
+    output = io.BytesIO()
+    doc.write(output)
+    return output.getvalue()
+
+def anonymize_odt_file(content: bytes, tiers: List[Dict[str, Any]], progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise un fichier ODT et retourne son contenu et le mapping.
+    """
+    doc, mapping = _anonymiser(content, tiers, progress)
+    return write(doc), mapping
+
+def deanonymize_odt_file(content: bytes, mapping: Dict[str, str], progress: Optional[ProgressCallback] = None):
+    """
+    Dé-anonymise un fichier ODT et retourne son contenu.
+    """
+    return write(_desanonymiser(content, mapping, progress))
+
+def _anonymiser(content: bytes, tiers: List[Dict[str, Any]], progress: Optional[ProgressCallback] = None,
+                known: Optional[Dict[str, str]] = None):
+    """
+    Anonymise directement un document ODT en modifiant son contenu.
+    Retourne le document modifié et le mapping d'anonymisation.
+    """
+    try:
+        print(f"🚀 DEBUG: Début anonymize_odt_file avec {len(tiers)} tiers")
+        
+        # Charger le document ODT en mémoire
+        doc = load(io.BytesIO(content))
+        
+        cibles = _cibles(doc)
+        print(f"📝 DEBUG: {len(cibles)} textes lus (corps, titres, tableaux, en-têtes, notes)")
+        
+        # Anonymiser les textes au fil de l'eau : une même valeur garde sa balise dans tout le document
+        mapping = {}
+        paragraphs_processed = 0
+        unites = ((lieu, texte) for lieu, texte, _ in cibles)
+        for index, ((_, anonymized_text), (_, paragraph_text, ecrire)) in enumerate(
+                zip(anonymize_units(unites, tiers, mapping=mapping, known=known), cibles)):
+            if progress:
+                progress("paragraphes", index + 1, len(cibles))
+            if paragraph_text.strip() and anonymized_text != paragraph_text:
+                try:
+                    ecrire(anonymized_text)
+                    paragraphs_processed += 1
+                except Exception as e:
+                    print(f"⚠️ DEBUG: Erreur lors du traitement du paragraphe: {str(e)}")
+                    # Continuer avec le paragraphe suivant
+                    continue
+        
+        print(f"🗂️ DEBUG: Mapping généré: {mapping}")
+        print(f"📊 DEBUG: Traitement terminé - {paragraphs_processed} paragraphes")
+        return doc, mapping
+        
+    except Exception as e:
+        print(f"❌ DEBUG: Erreur dans anonymize_odt_file: {str(e)}")
+        raise Exception(f"Erreur lors de l'anonymisation du fichier ODT: {str(e)}")
+
+def _desanonymiser(content: bytes, mapping: Dict[str, str], progress: Optional[ProgressCallback] = None):
+    """
+    Dé-anonymise directement un document ODT en utilisant le mapping fourni.
+    Retourne le document modifié.
+    """
+    try:
+        print(f"🚀 DEBUG: Début deanonymize_odt_file")
+        print(f"🗂️ DEBUG: Mapping reçu: {mapping}")
+        print(f"📊 DEBUG: Nombre de balises dans le mapping: {len(mapping)}")
+        
+        # Charger le document ODT en mémoire
+        doc = load(io.BytesIO(content))
+        
+        # Extraire tout le texte du document pour analyse
+        cibles = _cibles(doc)
+        full_text = "".join(texte + "\n" for _, texte, _ in cibles)
+        
+        print(f"📝 DEBUG: Texte extrait (premiers 300 chars): {full_text[:300]}...")
+        
+        # Analyser quelles balises sont présentes dans le texte
+        found_tags = []
+        for tag in mapping.keys():
+            if tag in full_text:
+                found_tags.append(tag)
+                print(f"✅ DEBUG: Balise '{tag}' trouvée dans le document")
+            else:
+                print(f"❌ DEBUG: Balise '{tag}' NON trouvée dans le document")
+        
+        print(f"📋 DEBUG: Résumé: {len(found_tags)}/{len(mapping)} balises trouvées: {found_tags}")
+        
+        # Appliquer la dé-anonymisation au document ODT
+        paragraphs_processed = 0
+        for index, (_, paragraph_text, ecrire) in enumerate(cibles):
+            if progress:
+                progress("paragraphes", index + 1, len(cibles))
+            if paragraph_text.strip():
+                # Dé-anonymiser le texte du paragraphe
+                deanonymized_paragraph = deanonymize_text(paragraph_text, mapping)
+                
+                # Si le texte a changé, le remplacer
+                if deanonymized_paragraph != paragraph_text:
+                    try:
+                        ecrire(deanonymized_paragraph)
+                        paragraphs_processed += 1
+                    except Exception as e:
+                        print(f"⚠️ DEBUG: Erreur lors du traitement du paragraphe: {str(e)}")
+                        # Continuer avec le paragraphe suivant
+                        continue
+        
+        print(f"📊 DEBUG: Traitement terminé - {paragraphs_processed} paragraphes modifiés")
+        return doc
+        
+    except Exception as e:
+        print(f"❌ DEBUG: Erreur dans deanonymize_odt_file: {str(e)}")
+        raise Exception(f"Erreur lors de la dé-anonymisation du fichier ODT: {str(e)}")
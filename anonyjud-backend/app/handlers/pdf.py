@@ -0,0 +1,513 @@
+"""
+Traitement des fichiers PDF (PyMuPDF, reportlab)
+Extraction, anonymisation sécurisée avec reconstitution et dé-anonymisation
+"""
+import io
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF pour les PDF
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+from ..anonymizer import anonymize_text, create_anonymizer
+from ..deanonymizer import deanonymize_text, TagReplacer
+from ..jobs import ProgressCallback
+from ..memoire import BudgetMemoire
+from ..ocr import ocr_pages, pages_sans_texte, zones_a_masquer
+from ..pdf_fonts import DocumentFonts
+from ..pdf_rebuild import LotsReconstitues, rebuild_pdf, assemble_pdf, write_pdf
+from ..pdf_spans import SpanStore
+from ..pdf_utils import safe_extract_text_from_pdf
+
+# Recopie à l'identique des pages PDF sans donnée à anonymiser (0 pour tout reconstituer)
+PDF_SKIP_CLEAN_PAGES = os.getenv("ANONYJUD_PDF_SKIP_CLEAN_PAGES", "1") != "0"
+# Pages reconstituées par lots de cette taille au plus : les éléments extraits (texte, images,
+# dessins) d'un lot sont libérés avant le suivant (0 pour tout extraire d'un coup)
+PDF_WINDOW_PAGES = int(os.getenv("ANONYJUD_PDF_WINDOW_PAGES", "32"))
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Texte de chaque page, localisé par son numéro ; une page illisible est ignorée sans interrompre l'extraction.
+    """
+    with fitz.open(stream=content, filetype="pdf") as pdf:
+        for page in pdf:
+            try:
+                yield f"page {page.number + 1}", page.get_text()
+            except Exception as e:
+                print(f"⚠️ Erreur get_text page {page.number + 1}: {str(e)}")
+
+@lru_cache(maxsize=1)
+def styles_pdf_texte():
+    """
+    Styles du PDF généré à partir de texte : (titre, texte normal).
+    """
+    styles = getSampleStyleSheet()
+    
+    # Style pour le titre
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Title'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1  # Centré
+    )
+    
+    # Style pour le texte normal
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=11,
+        leading=14,  # Espacement entre les lignes
+        spaceAfter=12,
+        alignment=0  # Justifié à gauche
+    )
+    return title_style, normal_style
+
+def create_pdf_from_text(text: str, filename: str) -> bytes:
+    """
+    Crée un nouveau PDF à partir du texte fourni en utilisant reportlab.
+    Préserve les sauts de ligne et la mise en forme basique.
+    """
+    try:
+        print(f"🚀 CREATE_PDF_FROM_TEXT - Début de la génération PDF")
+        print(f"📄 Nom du fichier: {filename}")
+        print(f"📝 Longueur du texte: {len(text)} caractères")
+        
+        # Créer un buffer en mémoire pour le PDF
+        buffer = io.BytesIO()
+        
+        # Créer le document PDF
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=A4,
+            rightMargin=72,  # 1 inch
+            leftMargin=72,   # 1 inch
+            topMargin=72,    # 1 inch
+            bottomMargin=72  # 1 inch
+        )
+        
+        # Styles construits une seule fois (préchauffés au démarrage)
+        title_style, normal_style = styles_pdf_texte()
+        
+        # Construire le contenu du PDF
+        story = []
+        
+        # Ajouter le titre
+        title = f"Document traité - {filename}"
+        story.append(Paragraph(title, title_style))
+        story.append(Spacer(1, 20))
+        
+        # Diviser le texte en paragraphes
+        paragraphs = text.split('\n')
+        
+        paragraph_count = 0
+        for para_text in paragraphs:
+            para_text = para_text.strip()
+            if para_text:  # Ignorer les lignes vides
+                # Échapper les caractères spéciaux pour reportlab
+                para_text = para_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                
+                # Ajouter le paragraphe
+                story.append(Paragraph(para_text, normal_style))
+                paragraph_count += 1
+            else:
+                # Ajouter un espacement pour les lignes vides
+                story.append(Spacer(1, 6))
+        
+        print(f"📊 Nombre de paragraphes traités: {paragraph_count}")
+        
+        # Générer le PDF
+        doc.build(story)
+        
+        # Récupérer les bytes du PDF
+        buffer.seek(0)
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        
+        print(f"✅ PDF généré avec succès, taille: {len(pdf_bytes)} bytes")
+        return pdf_bytes
+        
+    except Exception as e:
+        print(f"❌ Erreur lors de la génération du PDF: {str(e)}")
+        raise Exception(f"Erreur lors de la génération du PDF: {str(e)}")
+
+def anonymize_pdf_file(content: bytes, tiers: List[Dict[str, Any]]):
+    """
+    Anonymise un fichier PDF en extrayant le texte, l'anonymisant, 
+    puis générant un nouveau PDF avec le texte anonymisé.
+    """
+    try:
+        print(f"🚀 ANONYMIZE_PDF_FILE - Début du traitement")
+        print(f"👥 Nombre de tiers: {len(tiers)}")
+        
+        # Extraire le texte du PDF original de manière sécurisée
+        text, extraction_success = safe_extract_text_from_pdf(content)
+        
+        if not extraction_success:
+            print(f"⚠️ Extraction partielle ou échec - tentative avec méthode de fallback")
+            # Fallback: essayer l'ancienne méthode pour compatibilité
+            try:
+                with fitz.open(stream=content, filetype="pdf") as pdf:
+                    text = ""
+                    page_count = 0
+                    for page_num in range(pdf.page_count):
+                        try:
+                            page = pdf[page_num]
+                            if page is not None:
+                                try:
+                                    page_text = page.get_text()
+                                    text += page_text
+                                    page_count += 1
+                                except Exception as page_error:
+                                    print(f"⚠️ Erreur get_text page {page_num + 1}: {str(page_error)}")
+                                    # Essayer avec get_text("text")
+                                    try:
+                                        page_text = page.get_text("text")
+                                        text += page_text
+                                        page_count += 1
+                                    except Exception as page_error2:
+                                        print(f"⚠️ Erreur get_text('text') page {page_num + 1}: {str(page_error2)}")
+                                        # Passer à la page suivante sans arrêter le processus
+                                        continue
+                        except Exception as e:
+                            print(f"⚠️ Erreur traitement page {page_num + 1}: {str(e)}")
+                            continue
+                            
+                print(f"📝 Fallback: {len(text)} caractères extraits de {page_count} pages")
+            except Exception as fallback_error:
+                print(f"❌ Fallback aussi en échec: {str(fallback_error)}")
+                if not text:  # Si aucun texte n'a été extrait
+                    raise Exception(f"Impossible d'extraire le texte du PDF: {str(fallback_error)}")
+        else:
+            # Compter les pages pour les logs
+            try:
+                with fitz.open(stream=content, filetype="pdf") as pdf:
+                    page_count = pdf.page_count
+            except:
+                page_count = "inconnu"
+        
+        if not text or len(text.strip()) == 0:
+            print(f"⚠️ Aucun texte extrait du PDF")
+            return b"", {}
+        
+        print(f"📄 Texte extrait de {page_count} pages")
+        print(f"📝 Longueur du texte extrait: {len(text)} caractères")
+        
+        # Anonymiser le texte
+        anonymized_text, mapping = anonymize_text(text, tiers)
+        
+        print(f"🔒 Texte anonymisé, {len(mapping)} remplacements")
+        
+        # Générer le nouveau PDF avec le texte anonymisé
+        pdf_bytes = create_pdf_from_text(anonymized_text, "document_anonymise.pdf")
+        
+        print(f"✅ PDF anonymisé généré avec succès")
+        return pdf_bytes, mapping
+        
+    except Exception as e:
+        print(f"❌ Erreur dans anonymize_pdf_file: {str(e)}")
+        raise Exception(f"Erreur lors de l'anonymisation du fichier PDF: {str(e)}")
+
+def deanonymize_pdf_file(content: bytes, mapping: Dict[str, str]):
+    """
+    Dé-anonymise un fichier PDF en extrayant le texte, le dé-anonymisant,
+    puis générant un nouveau PDF avec le texte dé-anonymisé.
+    """
+    try:
+        print(f"🚀 DEANONYMIZE_PDF_FILE - Début du traitement")
+        print(f"🗂️ Mapping reçu: {mapping}")
+        print(f"📊 Nombre de balises dans le mapping: {len(mapping)}")
+        
+        # Extraire le texte du PDF anonymisé
+        with fitz.open(stream=content, filetype="pdf") as pdf:
+            text = ""
+            page_count = 0
+            for page in pdf:
+                text += page.get_text()
+                page_count += 1
+        
+        print(f"📄 Texte extrait de {page_count} pages")
+        print(f"📝 Longueur du texte extrait: {len(text)} caractères")
+        
+        # Dé-anonymiser le texte
+        deanonymized_text = deanonymize_text(text, mapping)
+        
+        print(f"🔓 Texte dé-anonymisé")
+        
+        # Générer le nouveau PDF avec le texte dé-anonymisé
+        pdf_bytes = create_pdf_from_text(deanonymized_text, "document_desanonymise.pdf")
+        
+        print(f"✅ PDF dé-anonymisé généré avec succès")
+        return pdf_bytes
+        
+    except Exception as e:
+        print(f"❌ Erreur dans deanonymize_pdf_file: {str(e)}")
+        raise Exception(f"Erreur lors de la dé-anonymisation du fichier PDF: {str(e)}") 
+
+def extract_pdf_elements(doc, pages: Optional[List[int]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Extrait tous les éléments du PDF : texte (SpanStore), images, graphiques avec leurs positions.
+    Si `pages` est fourni, seules ces pages (numéros à partir de 0) sont extraites.
+    """
+    pdf_elements = []
+    pages = list(range(doc.page_count)) if pages is None else pages
+    
+    for index, page_num in enumerate(pages):
+        if progress:
+            progress("extraction", index + 1, len(pages))
+        page = doc[page_num]
+        page_elements = {
+            "page_number": page_num,
+            "page_size": (page.rect.width, page.rect.height),
+            "spans": SpanStore(),
+            "images": [],
+            "drawings": []
+        }
+        
+        # Extraire le texte avec positions exactes (sans le contenu des images, extraites à part)
+        text_dict = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+        spans = page_elements["spans"]
+        for block in text_dict.get("blocks", []):
+            if "lines" in block:  # Bloc de texte
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        spans.ajouter(span)
+        del text_dict
+        
+        # Extraire les images
+        image_list = page.get_images(full=True)
+        for img_index, img in enumerate(image_list):
+            try:
+                xref = img[0]
+                pix = fitz.Pixmap(doc, xref)
+                if pix.n < 5:  # GRAY or RGB
+                    img_data = pix.tobytes("png")
+                else:  # CMYK: convert first
+                    pix1 = fitz.Pixmap(fitz.csRGB, pix)
+                    img_data = pix1.tobytes("png")
+                    pix1 = None
+                
+                # Obtenir la position de l'image sur la page
+                img_rect = page.get_image_bbox(img)
+                
+                image_element = {
+                    "data": img_data,
+                    "bbox": img_rect,
+                    "xref": xref
+                }
+                page_elements["images"].append(image_element)
+                pix = None
+            except Exception as e:
+                print(f"⚠️ Erreur lors de l'extraction d'image: {e}")
+        
+        # Extraire les dessins/graphiques vectoriels
+        try:
+            drawings = page.get_drawings()
+            for drawing in drawings:
+                page_elements["drawings"].append(drawing)
+        except Exception as e:
+            print(f"⚠️ Erreur lors de l'extraction des dessins: {e}")
+        
+        pdf_elements.append(page_elements)
+    
+    return pdf_elements
+
+def _decaler(progress: Optional[ProgressCallback], debut: int, total: int) -> Optional[ProgressCallback]:
+    # Avancement d'un lot rapporté à l'ensemble des pages
+    if not progress:
+        return None
+    return lambda etape, courant, _total: progress(etape, debut + courant, total)
+
+def reconstituer_pages(doc, pages: List[int], apply: Callable[[str], str], fonts: DocumentFonts,
+                       progress: Optional[ProgressCallback] = None) -> Tuple[Optional[LotsReconstitues], int]:
+    """
+    Extrait, remplace et reconstitue les pages `pages` par lots (fenêtre glissante) :
+    seuls les éléments du lot en cours sont en mémoire, chaque lot reconstitué est
+    aussitôt écrit sur disque. La taille des lots suit le budget mémoire.
+
+    Returns:
+        Tuple (lots des pages reconstituées dans l'ordre de `pages`, nombre de spans modifiés)
+    """
+    if not pages:
+        return None, 0
+    rebuilt = LotsReconstitues()
+    try:
+        spans_modifies = _reconstituer_lots(doc, pages, apply, fonts, rebuilt, progress)
+    except BaseException:
+        rebuilt.close()
+        raise
+    return rebuilt, spans_modifies
+
+def _reconstituer_lots(doc, pages: List[int], apply: Callable[[str], str], fonts: DocumentFonts,
+                       rebuilt: LotsReconstitues, progress: Optional[ProgressCallback]) -> int:
+    budget = BudgetMemoire(PDF_WINDOW_PAGES or len(pages))
+    spans_modifies = 0
+    lots = 0
+    debut = 0
+    while debut < len(pages):
+        lot = pages[debut:debut + budget.lot]
+        pdf_elements = extract_pdf_elements(doc, lot, _decaler(progress, debut, len(pages)))
+        for page_data in pdf_elements:
+            # Remplacer DÉFINITIVEMENT le texte (un seul passage du matcher compilé par texte distinct)
+            spans_modifies += page_data["spans"].remplacer(apply)
+        pdf_lot = rebuild_pdf(pdf_elements, fonts, _decaler(progress, debut, len(pages)))
+        del pdf_elements
+        rebuilt.ajouter(pdf_lot, len(lot))
+        del pdf_lot
+        debut += len(lot)
+        lots += 1
+        if debut < len(pages):
+            # Pages et images décodées gardées en cache par MuPDF
+            fitz.TOOLS.store_shrink(100)
+            budget.verifier()
+    budget.mesurer()
+    print(f"🧮 {len(pages)} page(s) reconstituée(s) en {lots} lot(s), mémoire prise max {budget.pic // (1024 * 1024)} Mo")
+    return spans_modifies
+
+def apply_replacements(content: bytes, tiers: Optional[List[Any]] = None, mapping: Optional[Dict[str, str]] = None,
+                       progress: Optional[ProgressCallback] = None) -> Tuple[fitz.Document, Dict[str, str]]:
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un PDF ; le document produit est à passer à write().
+    """
+    if tiers is not None:
+        return _anonymiser(content, tiers, progress, known=mapping)
+    return _desanonymiser(content, mapping or {}, progress), mapping or {}
+
+def write(document: fitz.Document) -> bytes:
+    return write_pdf(document)
+
+def anonymize_pdf_secure_with_graphics(pdf_content: bytes, tiers: List[Any],
+                                        progress: Optional[ProgressCallback] = None) -> tuple[bytes, Dict[str, str]]:
+    """
+    Anonymise un PDF et retourne son contenu et le mapping.
+    """
+    document, mapping = _anonymiser(pdf_content, tiers, progress)
+    return write(document), mapping
+
+def deanonymize_pdf_secure_with_graphics(pdf_content: bytes, mapping: Dict[str, str],
+                                          progress: Optional[ProgressCallback] = None) -> bytes:
+    """
+    Dé-anonymise un PDF et retourne son contenu.
+    """
+    return write(_desanonymiser(pdf_content, mapping, progress))
+
+def _anonymiser(pdf_content: bytes, tiers: List[Any], progress: Optional[ProgressCallback] = None,
+                known: Optional[Dict[str, str]] = None) -> Tuple[fitz.Document, Dict[str, str]]:
+    """
+    Anonymise un PDF de manière sécurisée en remplaçant RÉELLEMENT le texte
+    tout en préservant images, graphiques et mise en page exacte.
+    
+    Méthode sécurisée :
+    1. Repère les pages contenant des données à remplacer (les autres sont recopiées)
+    2. Extrait tous les éléments de ces pages (texte, images, graphiques)
+    3. Remplace le texte de manière irréversible
+    4. Reconstitue ces pages avec reportlab en préservant la mise en page
+    """
+    try:
+        print(f"🔒 ANONYMIZE_PDF_SECURE_WITH_GRAPHICS - Début du traitement sécurisé")
+        
+        # Ouvrir le PDF original
+        doc = fitz.open(stream=pdf_content, filetype="pdf")
+        
+        print(f"📄 PDF ouvert: {doc.page_count} pages")
+        
+        # Même remplaceur que anonymize_text : tiers compilés, ou détection basique sans tiers
+        # dont la numérotation poursuit les balises déjà attribuées (`known`, mapping du projet)
+        matcher = create_anonymizer(tiers, known=known)
+        print(f"🔄 {len(matcher.mapping)} valeur(s) de tiers à rechercher")
+        
+        # Repérer les pages contenant au moins une donnée à remplacer :
+        # les autres sont recopiées telles quelles
+        if PDF_SKIP_CLEAN_PAGES:
+            pages_a_traiter = []
+            for page in doc:
+                if progress:
+                    progress("analyse", page.number + 1, doc.page_count)
+                if matcher.has_match(page.get_text()):
+                    pages_a_traiter.append(page.number)
+        else:
+            pages_a_traiter = list(range(doc.page_count))
+        print(f"📑 {len(pages_a_traiter)} page(s) à reconstituer, {doc.page_count - len(pages_a_traiter)} recopiée(s)")
+        
+        # Pages scannées (sans couche texte) : OCR puis caviardage des mots reconnus
+        zones_ocr = {}
+        for page_num, words in ocr_pages(doc, pages_sans_texte(doc)).items():
+            zones_ocr[page_num] = zones_a_masquer(words, matcher)
+        if zones_ocr:
+            print(f"🔎 {sum(len(z) for z in zones_ocr.values())} mot(s) caviardé(s) sur {len(zones_ocr)} page(s) scannée(s)")
+        
+        # Polices embarquées des pages concernées
+        fonts = DocumentFonts.from_document(doc, pages_a_traiter)
+        
+        # Extraire, anonymiser et reconstituer les pages par lots avec reportlab (polices
+        # d'origine préservées) puis les réinsérer parmi les pages recopiées ; métadonnées,
+        # signets, annotations, champs et fichiers joints passent par le même matcher
+        rebuilt, _ = reconstituer_pages(doc, pages_a_traiter, matcher.apply, fonts, progress)
+        output = assemble_pdf(doc, rebuilt, pages_a_traiter, matcher.apply, zones_ocr)
+        doc.close()  # Fermer le document original
+        
+        mapping = dict(matcher.mapping)
+        print(f"✅ PDF anonymisé sécurisé avec graphiques préservés généré")
+        print(f"🗂️ Mapping créé avec {len(mapping)} entrées")
+        
+        return output, mapping
+        
+    except Exception as e:
+        print(f"❌ Erreur dans anonymize_pdf_secure_with_graphics: {str(e)}")
+        raise Exception(f"Erreur lors de l'anonymisation sécurisée du PDF: {str(e)}")
+
+def _desanonymiser(pdf_content: bytes, mapping: Dict[str, str],
+                   progress: Optional[ProgressCallback] = None) -> fitz.Document:
+    """
+    Dé-anonymise un PDF en restaurant le texte original de manière sécurisée
+    tout en préservant les images et graphiques.
+    """
+    try:
+        print(f"🔒 DEANONYMIZE_PDF_SECURE_WITH_GRAPHICS - Début du traitement")
+        print(f"📊 DEBUG - Mapping reçu: {mapping}")
+        print(f"📊 DEBUG - Nombre de balises dans le mapping: {len(mapping)}")
+        
+        # Analyser le mapping pour identifier le problème de casse
+        for tag, original in mapping.items():
+            if tag.islower():
+                print(f"❌ DEBUG - PROBLÈME DE CASSE DÉTECTÉ: balise '{tag}' en minuscules (devrait être en majuscules)")
+            else:
+                print(f"✅ DEBUG - Balise correcte: '{tag}' en majuscules")
+        
+        # Compiler les balises une seule fois pour tout le document
+        replacer = TagReplacer(mapping)
+        
+        # Même processus que l'anonymisation mais avec les remplacements inversés
+        doc = fitz.open(stream=pdf_content, filetype="pdf")
+        
+        # Seules les pages contenant une balise sont reconstituées
+        if PDF_SKIP_CLEAN_PAGES:
+            pages_a_traiter = []
+            for page in doc:
+                if progress:
+                    progress("analyse", page.number + 1, doc.page_count)
+                if replacer.has_match(page.get_text()):
+                    pages_a_traiter.append(page.number)
+        else:
+            pages_a_traiter = list(range(doc.page_count))
+        print(f"📑 {len(pages_a_traiter)} page(s) à reconstituer, {doc.page_count - len(pages_a_traiter)} recopiée(s)")
+        
+        # Polices embarquées des pages concernées
+        fonts = DocumentFonts.from_document(doc, pages_a_traiter)
+        
+        # Dé-anonymiser le texte (les spans sans balise possible sont écartés par le filtre)
+        # et reconstituer les pages par lots (même logique que l'anonymisation)
+        rebuilt, spans_restaures = reconstituer_pages(doc, pages_a_traiter, replacer.apply, fonts, progress)
+        print(f"✅ {spans_restaures} span(s) restauré(s)")
+        output = assemble_pdf(doc, rebuilt, pages_a_traiter, replacer.apply, anonymisation=False)
+        doc.close()
+        
+        print(f"✅ PDF dé-anonymisé sécurisé généré")
+        return output
+        
+    except Exception as e:
+        print(f"❌ Erreur dans deanonymize_pdf_secure_with_graphics: {str(e)}")
+        raise Exception(f"Erreur lors de la dé-anonymisation sécurisée: {str(e)}")
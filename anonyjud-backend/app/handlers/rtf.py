@@ -0,0 +1,284 @@
+"""
+Traitement des fichiers RTF
+Lecture en flux des mots de contrôle : seul le texte visible (caractères \\'hh et \\uN
+compris) passe par le remplacement, la mise en forme et les données binaires sont
+recopiées telles quelles
+"""
+import io
+import re
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from ..jobs import ProgressCallback
+from ..streaming import STREAM_READ_SIZE, Scanner, StreamReplacer, creer_scanner, lire_spool, spool, suivi_octets
+
+# Destinations dont le contenu n'est pas du texte du document (tables, images, métadonnées techniques)
+DESTINATIONS_IGNOREES = frozenset((
+    "fonttbl", "colortbl", "stylesheet", "listtable", "listoverridetable", "pict", "objdata",
+    "themedata", "colorschememapping", "datastore", "latentstyles", "rsidtbl", "generator",
+    "xmlnstbl", "mmathPr", "panose", "blipuid", "bliptag", "fchars", "lchars", "pgdsctbl",
+    "filetbl", "revtbl", "passwordhash", "wgrffmtfilter",
+))
+
+# Mots de contrôle qui terminent un paragraphe (pour l'extraction du texte)
+FINS_DE_PARAGRAPHE = frozenset(("par", "line", "cell", "row", "sect", "page"))
+
+_TOKEN = re.compile(
+    rb"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"   # mot de contrôle et son délimiteur
+    rb"|\\'([0-9a-fA-F]{2})"                # caractère de la page de code
+    rb"|\\(.)"                              # symbole de contrôle (\\ \{ \} \~ \* ...)
+    rb"|([{}])"                             # groupe
+    rb"|([\r\n]+)"                          # fins de ligne (sans signification en RTF)
+    rb"|([^\\{}\r\n]+)",                    # texte
+    re.S,
+)
+
+# Longueur maximale d'un jeton de contrôle : une fin de bloc plus proche d'un "\\" est relue avec la suite
+_TOKEN_MAX = 48
+
+TEXTE, BRUT, SAUT = "texte", "brut", "saut"
+
+class _Groupe:
+    __slots__ = ("ignore", "uc", "debut")
+
+    def __init__(self, ignore: bool = False, uc: int = 1):
+        self.ignore = ignore
+        self.uc = uc
+        # Vrai tant que le premier mot de contrôle du groupe (destination) n'est pas lu
+        self.debut = True
+
+class LecteurRtf:
+    """
+    Découpe un flux RTF en événements :
+    - (TEXTE, str, None) : texte visible décodé
+    - (BRUT, bytes, mot) : octets à recopier tels quels, avec le mot de contrôle éventuel
+    - (SAUT, bytes, None) : fins de ligne du fichier source
+    """
+    def __init__(self, source: IO[bytes], progress=None):
+        self._source = source
+        self._progress = progress
+        self._pile: List[_Groupe] = [_Groupe()]
+        self._codepage = "cp1252"
+        # Caractères de repli à ignorer après un \uN
+        self._repli = 0
+        # Mot de contrôle recopié sans délimiteur : le texte suivant doit en être séparé
+        self.mot_ouvert = False
+
+    @property
+    def uc(self) -> int:
+        return self._pile[-1].uc
+
+    @property
+    def codepage(self) -> str:
+        return self._codepage
+
+    def __iter__(self) -> Iterator[Tuple[str, Any, Optional[str]]]:
+        buffer = b""
+        lus = 0
+        fin = False
+        while not fin:
+            data = self._source.read(STREAM_READ_SIZE)
+            lus += len(data)
+            fin = not data
+            buffer += data
+            if fin:
+                limite = len(buffer)
+            else:
+                # Un jeton de contrôle coupé par la fin du bloc est relu avec le bloc suivant
+                limite = buffer.rfind(b"\\", max(0, len(buffer) - _TOKEN_MAX))
+                if limite < 0:
+                    limite = len(buffer)
+            position = 0
+            while position < limite:
+                match = _TOKEN.match(buffer, position)
+                if match is None:
+                    # "\" isolé en toute fin de fichier
+                    yield BRUT, buffer[position:], None
+                    position = len(buffer)
+                    break
+                if match.group(1) == b"bin" and not fin:
+                    taille = int(match.group(2) or 0)
+                    if match.end() + taille > len(buffer):
+                        # Données binaires incomplètes : attendre la suite du fichier
+                        break
+                position = yield from self._jeton(buffer, match)
+            buffer = buffer[position:]
+            if self._progress and data:
+                self._progress(lus)
+
+    def _jeton(self, buffer: bytes, match: "re.Match") -> Iterator[Tuple[str, Any, Optional[str]]]:
+        groupe = self._pile[-1]
+        mot, parametre, hexa, symbole, accolade, saut, texte = match.groups()
+
+        if texte is not None:
+            groupe.debut = False
+            yield from self._texte(texte.decode("latin-1"))
+        elif hexa is not None:
+            groupe.debut = False
+            caractere = bytes((int(hexa, 16),)).decode(self._codepage, "replace")
+            if not groupe.ignore:
+                yield from self._texte(caractere, brut=match.group(0))
+            else:
+                yield BRUT, match.group(0), None
+        elif mot is not None:
+            nom = mot.decode("ascii")
+            if groupe.debut and nom in DESTINATIONS_IGNOREES:
+                groupe.ignore = True
+            groupe.debut = False
+            if nom == "uc" and parametre is not None:
+                groupe.uc = max(0, int(parametre))
+            elif nom == "ansicpg" and parametre is not None:
+                self._codepage = _codepage(int(parametre))
+            elif nom == "u" and parametre is not None and not groupe.ignore:
+                code = int(parametre)
+                if code < 0:
+                    code += 65536
+                self._repli = 0
+                yield from self._texte(chr(code))
+                self._repli = groupe.uc
+                return match.end()
+            elif nom == "bin" and parametre is not None:
+                fin = match.end() + int(parametre)
+                self.mot_ouvert = False
+                yield BRUT, buffer[match.start():fin], nom
+                return fin
+            self._repli = 0
+            self.mot_ouvert = not match.group(0).endswith(b" ")
+            yield BRUT, match.group(0), nom
+        elif symbole is not None:
+            caractere = symbole.decode("latin-1")
+            if caractere in "\\{}" and not groupe.ignore:
+                groupe.debut = False
+                yield from self._texte(caractere, brut=match.group(0))
+            else:
+                # \* laisse le groupe au stade de la destination
+                if caractere != "*":
+                    groupe.debut = False
+                self._repli = 0
+                self.mot_ouvert = False
+                yield BRUT, match.group(0), None
+        elif accolade is not None:
+            self._repli = 0
+            self.mot_ouvert = False
+            if accolade == b"{":
+                self._pile.append(_Groupe(groupe.ignore, groupe.uc))
+            elif len(self._pile) > 1:
+                self._pile.pop()
+            yield BRUT, accolade, None
+        else:
+            yield SAUT, saut, None
+        return match.end()
+
+    def _texte(self, texte: str, brut: Optional[bytes] = None) -> Iterator[Tuple[str, Any, Optional[str]]]:
+        if self._repli:
+            # Caractères de repli d'un \uN : remplacés à la réécriture
+            ignores = min(self._repli, len(texte) if brut is None else 1)
+            self._repli -= ignores
+            texte = "" if brut is not None else texte[ignores:]
+            if not texte:
+                return
+        if self._pile[-1].ignore:
+            yield BRUT, texte.encode("latin-1") if brut is None else brut, None
+        else:
+            yield TEXTE, texte, None
+
+def _codepage(numero: int) -> str:
+    nom = f"cp{numero}"
+    try:
+        "".encode(nom)
+        return nom
+    except LookupError:
+        return "cp1252"
+
+def encoder_texte(texte: str, codepage: str, uc: int) -> bytes:
+    """
+    Réécrit du texte en RTF : caractères spéciaux échappés, \\'hh pour la page de code,
+    \\uN suivi de caractères de repli au-delà.
+    """
+    pieces = []
+    for caractere in texte:
+        if caractere in "\\{}":
+            pieces.append("\\" + caractere)
+        elif " " <= caractere < "\x7f":
+            pieces.append(caractere)
+        else:
+            try:
+                octets = caractere.encode(codepage)
+            except UnicodeEncodeError:
+                octets = b""
+            if len(octets) == 1:
+                pieces.append(f"\\'{octets[0]:02x}")
+            else:
+                for unite in _utf16(caractere):
+                    pieces.append(f"\\u{unite if unite < 32768 else unite - 65536}" + "?" * uc)
+    return "".join(pieces).encode("ascii")
+
+def _utf16(caractere: str) -> List[int]:
+    data = caractere.encode("utf-16-le")
+    return [int.from_bytes(data[i:i + 2], "little") for i in range(0, len(data), 2)]
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Texte visible, paragraphe par paragraphe.
+    """
+    paragraphe: List[str] = []
+    numero = 0
+    for genre, valeur, mot in LecteurRtf(io.BytesIO(content)):
+        if genre == TEXTE:
+            paragraphe.append(valeur)
+        elif mot in FINS_DE_PARAGRAPHE:
+            numero += 1
+            yield f"paragraphe {numero}", "".join(paragraphe)
+            paragraphe = []
+    if paragraphe:
+        yield f"paragraphe {numero + 1}", "".join(paragraphe)
+
+def remplacer_flux(source: IO[bytes], output: IO[bytes], scanner: Scanner, progress=None) -> None:
+    """
+    Remplace les valeurs dans le texte visible d'un fichier RTF, à mémoire constante.
+    Une valeur coupée par un changement de mise en forme n'est pas reconnue.
+    """
+    lecteur = LecteurRtf(source, progress)
+    replacer = StreamReplacer(scanner)
+    en_cours = False
+    separer = False
+
+    def ecrire(texte: str) -> None:
+        nonlocal separer
+        if not texte:
+            return
+        if separer:
+            # Délimiteur du mot de contrôle précédent, pour que le texte n'y soit pas accolé
+            output.write(b" ")
+            separer = False
+        output.write(encoder_texte(texte, lecteur.codepage, lecteur.uc))
+
+    for genre, valeur, _ in lecteur:
+        if genre == TEXTE:
+            if not en_cours:
+                en_cours = True
+                separer = lecteur.mot_ouvert
+            ecrire(replacer.feed(valeur))
+        elif genre == SAUT and en_cours:
+            # Fins de ligne internes au texte : sans effet en RTF, elles ne le coupent pas
+            continue
+        else:
+            if en_cours:
+                ecrire(replacer.flush())
+                en_cours = False
+            output.write(valeur)
+    if en_cours:
+        ecrire(replacer.flush())
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un fichier RTF ; le fichier produit est à passer à write().
+    """
+    scanner = creer_scanner(tiers, mapping)
+    output = spool()
+    remplacer_flux(io.BytesIO(content), output, scanner, suivi_octets(progress, len(content)))
+    print(f"📄 RTF traité en flux, {len(scanner.mapping)} balise(s)")
+    return output, dict(scanner.mapping)
+
+def write(document: IO[bytes]) -> bytes:
+    return lire_spool(document)
@@ -0,0 +1,67 @@
+"""
+Traitement des fichiers texte brut (.txt)
+Décodage par blocs, remplacement en flux et réencodage dans l'encodage d'origine (BOM compris)
+"""
+import io
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from ..jobs import ProgressCallback
+from ..streaming import (Scanner, creer_scanner, detecter_encodage, encoder, iter_decoded,
+                         lire_spool, replace_chunks, spool, suivi_octets)
+
+# Octets examinés pour reconnaître l'encodage
+_HEAD = 64 * 1024
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Lignes du fichier, sans leur fin de ligne, localisées par leur numéro.
+    """
+    encoding, bom = detecter_encodage(content[:_HEAD])
+    reste = ""
+    numero = 0
+    for chunk in iter_decoded(io.BytesIO(content), encoding, len(bom)):
+        lines = (reste + chunk).split("\n")
+        reste = lines.pop()
+        for line in lines:
+            numero += 1
+            yield f"ligne {numero}", line.rstrip("\r")
+    if reste:
+        yield f"ligne {numero + 1}", reste
+
+def encodage_source(content: bytes) -> str:
+    """
+    Encodage du fichier, à reprendre à la dé-anonymisation (voir detecter_encodage).
+    """
+    return detecter_encodage(content[:_HEAD])[0]
+
+def remplacer_flux(source: IO[bytes], output: IO[bytes], scanner: Scanner,
+                   progress=None, origine: Optional[str] = None) -> str:
+    """
+    Remplace les valeurs d'un fichier texte bloc par bloc, à mémoire constante.
+
+    Returns:
+        L'encodage reconnu
+    """
+    head = source.read(_HEAD)
+    source.seek(0)
+    encoding, bom = detecter_encodage(head, origine=origine)
+    output.write(bom)
+    for text in replace_chunks(iter_decoded(source, encoding, len(bom), progress), scanner):
+        output.write(encoder(text, encoding))
+    return encoding
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None,
+                       encodage: Optional[str] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un fichier texte ; le fichier produit est à passer à write().
+    `encodage` : encodage du fichier source (encodage_source), repris pour un fichier anonymisé pur ASCII.
+    """
+    scanner = creer_scanner(tiers, mapping)
+    output = spool()
+    encoding = remplacer_flux(io.BytesIO(content), output, scanner, suivi_octets(progress, len(content)), encodage)
+    print(f"📄 Texte traité en flux ({encoding}), {len(scanner.mapping)} balise(s)")
+    return output, dict(scanner.mapping)
+
+def write(document: IO[bytes]) -> bytes:
+    return lire_spool(document)
@@ -0,0 +1,319 @@
+"""
+Traitement des fichiers Word (python-docx)
+Anonymisation et dé-anonymisation run par run en préservant le formatage, dans tout le
+document : corps, tableaux, en-têtes et pieds de page, notes et commentaires
+"""
+import io
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from docx import Document  # python-docx pour les fichiers Word
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.part import XmlPart
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.text.hyperlink import Hyperlink
+from docx.text.paragraph import Paragraph
+
+from ..anonymizer import create_anonymizer
+from ..deanonymizer import TagReplacer
+from ..jobs import ProgressCallback
+
+# En-têtes et pieds de page d'une section : (attribut python-docx, localisation)
+EN_TETES_PIEDS = (
+    ("header", "en-tête"),
+    ("first_page_header", "en-tête de première page"),
+    ("even_page_header", "en-tête de page paire"),
+    ("footer", "pied de page"),
+    ("first_page_footer", "pied de page de première page"),
+    ("even_page_footer", "pied de page de page paire"),
+)
+
+# Parties annexes : (relation, élément de chaque entrée, localisation)
+PARTIES_ANNEXES = (
+    (RT.FOOTNOTES, "w:footnote", "note de bas de page"),
+    (RT.ENDNOTES, "w:endnote", "note de fin"),
+    (RT.COMMENTS, "w:comment", "commentaire"),
+)
+
+# Notes techniques (séparateurs) présentes dans toute partie de notes
+_NOTES_TECHNIQUES = ("separator", "continuationSeparator", "continuationNotice")
+
+class _PartieAnnexe:
+    """
+    Notes ou commentaires du document. python-docx ne lit pas les parties de notes :
+    leur XML est analysé ici et réécrit dans la partie par enregistrer().
+    """
+    def __init__(self, part, entree: str, lieu: str):
+        self.part = part
+        self.entree = entree
+        self.lieu = lieu
+        self.element = part.element if isinstance(part, XmlPart) else parse_xml(part.blob)
+
+    def paragraphes(self) -> Iterator[Tuple[str, Paragraph]]:
+        for element in self.element.iterchildren(qn(self.entree)):
+            if element.get(qn("w:type")) in _NOTES_TECHNIQUES:
+                continue
+            lieu = f"{self.lieu} {element.get(qn('w:id'))}"
+            for numero, p in enumerate(element.iter(qn("w:p")), 1):
+                yield f"{lieu}/paragraphe {numero}", Paragraph(p, None)
+
+    def enregistrer(self) -> None:
+        if not isinstance(self.part, XmlPart):
+            self.part._blob = serialize_part_xml(self.element)
+
+def parties_annexes(doc) -> List[_PartieAnnexe]:
+    """
+    Parties de notes et de commentaires présentes dans le document.
+    """
+    parties = []
+    for reltype, entree, lieu in PARTIES_ANNEXES:
+        for rel in doc.part.rels.values():
+            if rel.reltype == reltype and not rel.is_external:
+                parties.append(_PartieAnnexe(rel.target_part, entree, lieu))
+    return parties
+
+def _blocs(conteneur, lieu: str) -> Iterator[Tuple[str, Paragraph]]:
+    """
+    Paragraphes d'un conteneur (corps, cellule, en-tête...) dans l'ordre, tableaux compris.
+    """
+    numero_paragraphe = 0
+    numero_tableau = 0
+    for bloc in conteneur.iter_inner_content():
+        if isinstance(bloc, Paragraph):
+            numero_paragraphe += 1
+            yield f"{lieu}/paragraphe {numero_paragraphe}", bloc
+        else:
+            numero_tableau += 1
+            yield from _tableau(bloc, f"{lieu}/tableau {numero_tableau}")
+
+def _tableau(table, lieu: str) -> Iterator[Tuple[str, Paragraph]]:
+    vues = set()
+    for numero_ligne, row in enumerate(table.rows, 1):
+        for numero_cellule, cell in enumerate(row.cells, 1):
+            # Une cellule fusionnée est retournée pour chaque colonne et ligne qu'elle couvre
+            if cell._tc in vues:
+                continue
+            vues.add(cell._tc)
+            yield from _blocs(cell, f"{lieu}/ligne {numero_ligne}/cellule {numero_cellule}")
+
+def iter_paragraphes(doc, annexes: List[_PartieAnnexe]) -> Iterator[Tuple[str, Paragraph]]:
+    """
+    Tous les paragraphes du document avec leur localisation : corps et tableaux, puis
+    en-têtes et pieds de page de chaque section, puis notes et commentaires.
+    """
+    yield from _blocs(doc, "corps")
+    vus = set()
+    for numero, section in enumerate(doc.sections, 1):
+        for attribut, nom in EN_TETES_PIEDS:
+            en_tete = getattr(section, attribut)
+            # Lié à la section précédente : même contenu, déjà parcouru
+            if en_tete.is_linked_to_previous or en_tete.part.partname in vus:
+                continue
+            vus.add(en_tete.part.partname)
+            yield from _blocs(en_tete, f"section {numero}/{nom}")
+    for annexe in annexes:
+        yield from annexe.paragraphes()
+
+def _runs(para: Paragraph):
+    """
+    Runs du paragraphe, y compris ceux des liens hypertextes.
+    """
+    for item in para.iter_inner_content():
+        if isinstance(item, Hyperlink):
+            yield from item.runs
+        else:
+            yield item
+
+def remplacer_dans_runs(textes: List[str], remplacements: List[Tuple[int, int, str]]) -> List[str]:
+    """
+    Applique des remplacements (début, fin, texte) repérés sur le texte des runs mis bout à bout.
+    Le remplacement est écrit dans le run où commence la valeur (sa mise en forme est gardée),
+    la suite de la valeur est retirée des runs suivants.
+    """
+    debuts = []
+    position = 0
+    for texte in textes:
+        debuts.append(position)
+        position += len(texte)
+    nouveaux = list(textes)
+    # En partant de la fin, les positions des remplacements restants ne bougent pas
+    for debut, fin, remplacement in reversed(remplacements):
+        premier = True
+        for index, texte in enumerate(textes):
+            debut_run, fin_run = debuts[index], debuts[index] + len(texte)
+            if fin_run <= debut or debut_run >= fin or not texte:
+                continue
+            gauche, droite = max(debut, debut_run) - debut_run, min(fin, fin_run) - debut_run
+            milieu = remplacement if premier else ""
+            nouveaux[index] = nouveaux[index][:gauche] + milieu + nouveaux[index][droite:]
+            premier = False
+    return nouveaux
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Texte de chaque paragraphe du document, avec sa localisation.
+    """
+    doc = Document(io.BytesIO(content))
+    for lieu, para in iter_paragraphes(doc, parties_annexes(doc)):
+        yield lieu, para.text
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un document Word ; le document produit est à passer à write().
+    """
+    if tiers is not None:
+        return _anonymiser(content, tiers, progress, known=mapping)
+    return _desanonymiser(content, mapping or {}, progress), mapping or {}
+
+def write(doc) -> bytes:
+    output = io.BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+def anonymize_docx_file(content: bytes, tiers: List[Dict[str, Any]], progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise un fichier Word et retourne son contenu et le mapping.
+    """
+    doc, mapping = _anonymiser(content, tiers, progress)
+    return write(doc), mapping
+
+def deanonymize_docx_file(content: bytes, mapping: Dict[str, str], progress: Optional[ProgressCallback] = None):
+    """
+    Dé-anonymise un fichier Word et retourne son contenu.
+    """
+    return write(_desanonymiser(content, mapping, progress))
+
+def _anonymiser(content: bytes, tiers: List[Dict[str, Any]], progress: Optional[ProgressCallback] = None,
+                known: Optional[Dict[str, str]] = None):
+    """
+    Anonymise directement un fichier Word en modifiant son contenu.
+    Préserve le formatage (police, style, majuscules/minuscules, mise en page).
+    Retourne le document modifié et le mapping d'anonymisation.
+    """
+    try:
+        print(f"DEBUG: Début anonymize_docx_file avec {len(tiers)} tiers")
+        
+        # Ouvrir le document Word depuis les bytes
+        doc = Document(io.BytesIO(content))
+        
+        annexes = parties_annexes(doc)
+        paragraphs = list(iter_paragraphes(doc, annexes))
+        print(f"DEBUG: {len(paragraphs)} paragraphes lus (corps, tableaux, en-têtes, notes)")
+        
+        # Même remplaceur que l'aperçu (anonymize_text) : valeurs repérées sur le texte replié
+        # (accents, casse, blancs) et téléphones quel que soit leur format
+        anonymizer = create_anonymizer(tiers, known=known)
+        
+        # Appliquer les anonymisations directement dans les runs en préservant le formatage ;
+        # une valeur répartie sur plusieurs runs est reconnue sur le texte du paragraphe
+        paragraphs_processed = 0
+        runs_modified = 0
+        for index, (_, para) in enumerate(paragraphs):
+            if progress:
+                progress("paragraphes", index + 1, len(paragraphs))
+            runs = list(_runs(para))
+            textes = [run.text for run in runs]
+            remplacements = list(anonymizer.finditer("".join(textes)))
+            if not remplacements:
+                continue
+            for run, avant, apres in zip(runs, textes, remplacer_dans_runs(textes, remplacements)):
+                if apres != avant:
+                    run.text = apres
+                    runs_modified += 1
+            paragraphs_processed += 1
+        mapping = dict(anonymizer.mapping)
+        print(f"DEBUG: Mapping généré: {mapping}")
+        for annexe in annexes:
+            annexe.enregistrer()
+        
+        print(f"DEBUG: Traitement terminé - {paragraphs_processed} paragraphes, {runs_modified} runs")
+        
+        print(f"DEBUG: Document anonymisé avec succès")
+        return doc, mapping
+        
+    except Exception as e:
+        print(f"DEBUG: Erreur dans anonymize_docx_file: {str(e)}")
+        raise Exception(f"Erreur lors de l'anonymisation du fichier Word: {str(e)}")
+
+def _desanonymiser(content: bytes, mapping: Dict[str, str], progress: Optional[ProgressCallback] = None):
+    """
+    Dé-anonymise directement un fichier Word en utilisant le mapping fourni.
+    Préserve le formatage (police, style, majuscules/minuscules, mise en page).
+    Retourne le document modifié.
+    """
+    try:
+        print(f"🔍 DEANONYMIZE_DOCX_FILE - Début du processus")
+        print(f"🗂️ Mapping reçu: {mapping}")
+        print(f"📊 Nombre de balises dans le mapping: {len(mapping)}")
+        
+        # Ouvrir le document Word depuis les bytes
+        doc = Document(io.BytesIO(content))
+        
+        # Extraire tout le texte du document pour analyse
+        annexes = parties_annexes(doc)
+        paragraphs = list(iter_paragraphes(doc, annexes))
+        full_text = "".join(para.text + "\n" for _, para in paragraphs)
+        
+        print(f"📝 Texte extrait du document (premiers 300 chars): {full_text[:300]}...")
+        
+        # Analyser quelles balises sont présentes dans le texte
+        found_tags = []
+        for tag in mapping.keys():
+            if tag in full_text:
+                found_tags.append(tag)
+                print(f"✅ Balise '{tag}' trouvée dans le document")
+            else:
+                print(f"❌ Balise '{tag}' NON trouvée dans le document")
+        
+        print(f"📋 Résumé: {len(found_tags)}/{len(mapping)} balises trouvées: {found_tags}")
+        
+        # Le mapping est déjà dans le bon sens (balise -> valeur_originale)
+        # Pas besoin d'inverser car generate_mapping_from_tiers() crée déjà le mapping correct
+        print(f"🔄 Mapping reçu (balise -> valeur): {mapping}")
+        
+        # Vérifier si le mapping est dans le bon sens
+        sample_key = list(mapping.keys())[0] if mapping else ""
+        if sample_key and not sample_key.isupper():
+            # Le mapping semble être dans le mauvais sens (valeur -> balise), l'inverser
+            reverse_mapping = {v: k for k, v in mapping.items()}
+            print(f"🔄 Mapping inversé car dans le mauvais sens: {reverse_mapping}")
+        else:
+            # Le mapping est dans le bon sens (balise -> valeur)
+            reverse_mapping = mapping
+            print(f"🔄 Mapping utilisé tel quel: {reverse_mapping}")
+        
+        # Une seule regex pour toutes les balises, y compris celles dont la casse a été retouchée
+        # (prenom1, Prenom1) ; une balise répartie sur plusieurs runs est reconnue sur le texte
+        # du paragraphe, comme à l'anonymisation
+        replacer = TagReplacer(reverse_mapping, ignorer_casse=True)
+        
+        paragraphs_modified = 0
+        runs_modified = 0
+        
+        # Appliquer les dé-anonymisations dans tous les paragraphes (corps, tableaux, en-têtes, notes)
+        for i, (_, para) in enumerate(paragraphs):
+            if progress:
+                progress("paragraphes", i + 1, len(paragraphs))
+            runs = list(_runs(para))
+            textes = [run.text for run in runs]
+            remplacements = list(replacer.finditer("".join(textes)))
+            if not remplacements:
+                continue
+            for run, avant, apres in zip(runs, textes, remplacer_dans_runs(textes, remplacements)):
+                if apres != avant:
+                    run.text = apres
+                    runs_modified += 1
+            paragraphs_modified += 1
+        for annexe in annexes:
+            annexe.enregistrer()
+        
+        print(f"📈 Résultats: {paragraphs_modified} paragraphes, {runs_modified} runs modifiés")
+        
+        print(f"🏁 DEANONYMIZE_DOCX_FILE - Document modifié avec succès")
+        return doc
+        
+    except Exception as e:
+        print(f"❌ Erreur dans deanonymize_docx_file: {str(e)}")
+        raise Exception(f"Erreur lors de la dé-anonymisation du fichier Word: {str(e)}")
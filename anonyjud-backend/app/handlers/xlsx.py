@@ -0,0 +1,291 @@
+"""
+Traitement des classeurs Excel (.xlsx)
+Les chaînes des cellules sont réunies dans la table partagée (xl/sharedStrings.xml) :
+chaque chaîne distincte n'est analysée qu'une fois, quel que soit le nombre de cellules
+qui y renvoient. Les feuilles sans texte propre sont recopiées sans recompression
+Les copies des valeurs gardées ailleurs dans le paquet (caches des tableaux croisés et
+des graphiques, noms de colonnes des tableaux) passent par le même remplacement
+Les noms des feuilles et les noms définis sont renommés dans xl/workbook.xml, et les
+formules, liens et sources qui y renvoient suivent
+"""
+import logging
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..jobs import ProgressCallback
+from ..streaming import creer_scanner, replace_text
+from ..zip_package import RemplacementsMemo, iter_noeuds, lire_parties, nom_unique, reecrire, remplacer_noeuds
+
+logger = logging.getLogger(__name__)
+
+# Texte d'une chaîne partagée, d'un commentaire ou d'une chaîne en ligne
+_T = re.compile(rb"(<t(?:\s[^>]*)?>)([^<]*)(</t>)")
+# Résultat mis en cache d'une formule texte
+_V_STR = re.compile(rb'(<c\b[^>]*\bt="str"[^>]*>(?:<f\b[^>]*/>|<f\b[^>]*>[^<]*</f>)?<v>)([^<]*)(</v>)')
+# En-têtes et pieds de page d'impression
+_ENTETE = re.compile(rb"(<(?:odd|even|first)(?:Header|Footer)>)([^<]*)(</(?:odd|even|first)(?:Header|Footer)>)")
+# Commentaires modernes (fils de discussion)
+_TEXT = re.compile(rb"(<text>)([^<]*)(</text>)")
+# Propriétés du document (auteur, titre...)
+_NOEUD = re.compile(rb"(>)([^<>]+)(<)")
+# Propriétés de l'application (société, responsable)
+_SOCIETE = re.compile(rb"(<(?:Company|Manager)>)([^<]*)(</(?:Company|Manager)>)")
+# Valeur texte d'un cache de tableau croisé, et nom du champ (en-tête de la colonne source)
+_S_V = re.compile(rb'(<s\s[^>]*?\bv=")([^"]*)(")')
+_CHAMP = re.compile(rb'(<cacheField\s[^>]*?\bname=")([^"]*)(")')
+# Valeurs mises en cache d'un graphique (séries, catégories) et texte des titres
+_C_V = re.compile(rb"(<c:v>)([^<]*)(</c:v>)")
+_A_T = re.compile(rb"(<a:t>)([^<]*)(</a:t>)")
+# Nom de colonne d'un tableau, copie de la cellule d'en-tête
+_COLONNE = re.compile(rb'(<tableColumn\s[^>]*?\bname=")([^"]*)(")')
+_SI = re.compile(rb"<si>(.*?)</si>", re.S)
+# Noms des feuilles et noms définis du classeur, et formule d'un nom défini
+_NOM_FEUILLE = re.compile(rb'(<sheet\s[^>]*?\bname=")([^"]*)(")')
+_NOM_DEFINI = re.compile(rb'(<definedName\s[^>]*?\bname=")([^"]*)(")')
+_DEFINITION = re.compile(rb"(<definedName\b[^>]*>)([^<]*)(</definedName>)")
+# Formules des cellules, des validations et mises en forme conditionnelles, des séries de graphiques
+_F = re.compile(rb"(<f\b[^>]*>)([^<]*)(</f>)")
+_VALIDATION = re.compile(rb"(<formula[12]?>)([^<]*)(</formula[12]?>)")
+_C_F = re.compile(rb"(<c:f>)([^<]*)(</c:f>)")
+# Lien interne vers une cellule, feuille ou nom source d'un tableau croisé
+_LIEN = re.compile(rb'(<hyperlink\s[^>]*?\blocation=")([^"]*)(")')
+_SOURCE_FEUILLE = re.compile(rb'(<worksheetSource\s[^>]*?\bsheet=")([^"]*)(")')
+_SOURCE_NOM = re.compile(rb'(<worksheetSource\s[^>]*?\bname=")([^"]*)(")')
+# Titres des parties (feuilles et plages nommées) dans les propriétés de l'application
+_TITRE = re.compile(rb"(<vt:lpstr>)([^<]*)(</vt:lpstr>)")
+
+# Jetons d'une formule : chaîne littérale, feuille entre apostrophes, référence structurée
+# entre crochets, ou reste de la formule
+_JETON = re.compile(r""""(?:[^"]|"")*"|'(?:[^']|'')*'!|\[[^\[\]"']*\]|[^"'\[]+|.""", re.S)
+# Nom de feuille utilisable sans apostrophes dans une formule
+_FEUILLE_NUE = re.compile(r"[^\W\d][\w.]*")
+# Caractères interdits dans un nom de feuille, longueur maximale imposée par Excel
+_INTERDITS_FEUILLE = re.compile(r"[\[\]:*?/\\]")
+FEUILLE_LONGUEUR_MAX = 31
+# Nom défini qui se lirait comme une référence de cellule (A1, NOM1, R1C1...)
+_REFERENCE = re.compile(r"[A-Za-z]{1,3}\d+|[RrCc]|[Rr]\d*[Cc]\d*")
+
+_SHARED_STRINGS = "xl/sharedStrings.xml"
+_FEUILLE = re.compile(r"xl/worksheets/sheet\d+\.xml$")
+_COMMENTAIRES = re.compile(r"xl/comments\d*\.xml$")
+_FILS = re.compile(r"xl/threadedComments/[^/]+\.xml$")
+_PROPRIETES = "docProps/core.xml"
+_APPLICATION = "docProps/app.xml"
+_PIVOT = re.compile(r"xl/pivotCache/pivotCache(?:Definition|Records)\d+\.xml$")
+_GRAPHIQUE = re.compile(r"xl/charts/chart\d+\.xml$")
+_DESSIN = re.compile(r"xl/drawings/drawing\d+\.xml$")
+_TABLEAU = re.compile(r"xl/tables/table\d+\.xml$")
+_CLASSEUR = "xl/workbook.xml"
+
+def _nom_de_feuille(nom: str) -> str:
+    return _INTERDITS_FEUILLE.sub("_", nom).strip("'") or "Feuille"
+
+def _nom_defini(nom: str) -> str:
+    nom = re.sub(r"[^\w.\\]", "_", nom)
+    if not re.match(r"[^\W\d]|\\", nom) or _REFERENCE.fullmatch(nom):
+        nom = "_" + nom
+    return nom
+
+def _citer(feuille: str) -> str:
+    return "'" + feuille.replace("'", "''") + "'!"
+
+class _Renommage:
+    """
+    Nouveaux noms des feuilles, des noms définis et des colonnes de tableaux (clés sans
+    casse, comme Excel), et leur report dans les formules du classeur.
+    """
+    def __init__(self, remplacer: Callable[[str], str], feuilles: Dict[str, str],
+                 noms: Dict[str, str], colonnes: Dict[str, str]):
+        self._remplacer = remplacer
+        self.feuilles = feuilles
+        self.noms = noms
+        self.colonnes = colonnes
+        self._feuille_nue = self._alternative(
+            [nom for nom in feuilles if _FEUILLE_NUE.fullmatch(nom)], r"(?<![\w.])(", r")!")
+        self._nom = self._alternative(list(noms), r"(?<![\w.@\\])(", r")(?![\w.(!\\])")
+
+    @staticmethod
+    def _alternative(noms: List[str], avant: str, apres: str) -> Optional["re.Pattern"]:
+        if not noms:
+            return None
+        return re.compile(avant + "|".join(re.escape(nom) for nom in sorted(noms, key=len, reverse=True)) + apres,
+                          re.IGNORECASE)
+
+    @classmethod
+    def depuis(cls, content: bytes, remplacer: Callable[[str], str]) -> "_Renommage":
+        feuilles: Dict[str, str] = {}
+        noms: Dict[str, str] = {}
+        colonnes: Dict[str, str] = {}
+        for nom, xml in lire_parties(content, lambda nom: nom == _CLASSEUR or bool(_TABLEAU.match(nom))):
+            if nom == _CLASSEUR:
+                anciens = list(iter_noeuds(xml, _NOM_FEUILLE))
+                pris = {ancien.lower() for ancien in anciens if remplacer(ancien) == ancien}
+                for ancien in anciens:
+                    nouveau = remplacer(ancien)
+                    if nouveau != ancien:
+                        feuilles[ancien.lower()] = nom_unique(_nom_de_feuille(nouveau), pris, FEUILLE_LONGUEUR_MAX)
+                # Les noms réservés (_xlnm.Print_Area...) gardent le leur
+                anciens = [ancien for ancien in iter_noeuds(xml, _NOM_DEFINI) if not ancien.startswith("_xlnm.")]
+                pris = {ancien.lower() for ancien in anciens if remplacer(ancien) == ancien}
+                for ancien in anciens:
+                    nouveau = remplacer(ancien)
+                    if nouveau != ancien and ancien.lower() not in noms:
+                        noms[ancien.lower()] = nom_unique(_nom_defini(nouveau), pris, suffixe="_{}")
+            else:
+                for ancien in iter_noeuds(xml, _COLONNE):
+                    nouveau = remplacer(ancien)
+                    if nouveau != ancien:
+                        colonnes[ancien.lower()] = nouveau
+        return cls(remplacer, feuilles, noms, colonnes)
+
+    def feuille(self, nom: str) -> str:
+        return self.feuilles.get(nom.lower(), nom)
+
+    def nom_defini(self, nom: str) -> str:
+        return self.noms.get(nom.lower(), nom)
+
+    def titre(self, texte: str) -> str:
+        cle = texte.lower()
+        if cle in self.feuilles:
+            return self.feuilles[cle]
+        if cle in self.noms:
+            return self.noms[cle]
+        return self.formule(texte)
+
+    def formule(self, texte: str) -> str:
+        """
+        Formule avec les feuilles, noms et colonnes renommés ; le texte des chaînes
+        littérales passe par le remplacement commun.
+        """
+        morceaux = []
+        for jeton in _JETON.findall(texte):
+            if len(jeton) > 1 and jeton[0] == jeton[-1] == '"':
+                litteral = jeton[1:-1].replace('""', '"')
+                jeton = '"' + self._remplacer(litteral).replace('"', '""') + '"'
+            elif jeton.startswith("'") and jeton.endswith("'!"):
+                feuille = jeton[1:-2].replace("''", "'")
+                if feuille.lower() in self.feuilles:
+                    jeton = _citer(self.feuilles[feuille.lower()])
+            elif len(jeton) > 1 and jeton[0] == "[" and jeton[-1] == "]":
+                arobase = "@" if jeton[1:2] == "@" else ""
+                colonne = jeton[1 + len(arobase):-1]
+                if colonne.lower() in self.colonnes:
+                    jeton = "[" + arobase + self.colonnes[colonne.lower()] + "]"
+            else:
+                if self._nom:
+                    jeton = self._nom.sub(lambda match: self.noms[match.group(1).lower()], jeton)
+                if self._feuille_nue:
+                    jeton = self._feuille_nue.sub(lambda match: _citer(self.feuilles[match.group(1).lower()]), jeton)
+            morceaux.append(jeton)
+        return "".join(morceaux)
+
+    def motifs(self, nom: str, xml: bytes) -> List[Tuple["re.Pattern", Callable[[str], str]]]:
+        """
+        Motifs des noms et des formules dans une partie, avec le remplacement de chacun.
+        """
+        if nom == _CLASSEUR:
+            return [(_NOM_FEUILLE, self.feuille), (_NOM_DEFINI, self.nom_defini), (_DEFINITION, self.formule)]
+        if nom == _APPLICATION:
+            return [(_TITRE, self.titre)]
+        if _PIVOT.match(nom):
+            return [(_SOURCE_FEUILLE, self.feuille), (_SOURCE_NOM, self.nom_defini)]
+        if _GRAPHIQUE.match(nom):
+            return [(_C_F, self.formule)]
+        if _FEUILLE.match(nom):
+            motifs = []
+            if b"</f>" in xml:
+                motifs.append((_F, self.formule))
+            if b"<formula" in xml:
+                motifs.append((_VALIDATION, self.formule))
+            if b"location=" in xml:
+                motifs.append((_LIEN, self.formule))
+            return motifs
+        return []
+
+def _motifs(nom: str, xml: bytes) -> List["re.Pattern"]:
+    """
+    Motifs de texte à traiter dans une partie du classeur.
+    """
+    if nom == _SHARED_STRINGS or _COMMENTAIRES.match(nom):
+        return [_T]
+    if _FILS.match(nom):
+        return [_TEXT]
+    if nom == _PROPRIETES:
+        return [_NOEUD]
+    if nom == _APPLICATION:
+        return [_SOCIETE]
+    if _PIVOT.match(nom):
+        return [_S_V, _CHAMP]
+    if _GRAPHIQUE.match(nom):
+        return [_C_V, _A_T]
+    if _DESSIN.match(nom):
+        # Zones de texte et formes posées sur les feuilles
+        return [_A_T]
+    if _TABLEAU.match(nom):
+        return [_COLONNE]
+    if _FEUILLE.match(nom):
+        # La plupart des feuilles ne contiennent que des nombres et des renvois à la table partagée
+        motifs = []
+        if b'"inlineStr"' in xml:
+            motifs.append(_T)
+        if b't="str"' in xml:
+            motifs.append(_V_STR)
+        if b"Header>" in xml or b"Footer>" in xml:
+            motifs.append(_ENTETE)
+        return motifs
+    return []
+
+def _selection(nom: str) -> bool:
+    return (nom in (_SHARED_STRINGS, _PROPRIETES, _APPLICATION, _CLASSEUR)
+            or any(partie.match(nom) for partie in (_FEUILLE, _COMMENTAIRES, _FILS, _PIVOT, _GRAPHIQUE, _DESSIN, _TABLEAU)))
+
+def iter_text_units(content: bytes) -> Iterator[Tuple[str, str]]:
+    """
+    Chaînes partagées, puis texte propre aux feuilles, commentaires, caches et tableaux, localisés par partie.
+    """
+    for nom, xml in lire_parties(content, _selection):
+        if nom == _SHARED_STRINGS:
+            for numero, si in enumerate(_SI.finditer(xml)):
+                # Une chaîne mise en forme est répartie sur plusieurs <t>
+                texte = "".join(iter_noeuds(si.group(1), _T))
+                if texte.strip():
+                    yield f"chaîne partagée {numero}", texte
+            continue
+        if nom == _CLASSEUR:
+            for motif in (_NOM_FEUILLE, _NOM_DEFINI):
+                for texte in iter_noeuds(xml, motif):
+                    yield nom, texte
+            continue
+        for motif in _motifs(nom, xml):
+            for texte in iter_noeuds(xml, motif):
+                yield nom, texte
+
+def apply_replacements(content: bytes, tiers: Optional[List[Dict[str, Any]]] = None,
+                       mapping: Optional[Dict[str, str]] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Anonymise (tiers) ou dé-anonymise (mapping) un classeur ; le classeur produit est à passer à write().
+    """
+    scanner = creer_scanner(tiers, mapping)
+    remplacer = RemplacementsMemo(lambda texte: replace_text(texte, scanner))
+    renommage = _Renommage.depuis(content, remplacer)
+    modifiees = []
+
+    def traiter(nom: str, xml: bytes) -> Optional[bytes]:
+        resultat = None
+        motifs = [(motif, remplacer) for motif in _motifs(nom, xml)] + renommage.motifs(nom, xml)
+        for motif, fonction in motifs:
+            nouveau = remplacer_noeuds(resultat or xml, motif, fonction)
+            if nouveau is not None:
+                resultat = nouveau
+        if resultat is not None:
+            modifiees.append(nom)
+        return resultat
+
+    suivi = (lambda courant, total: progress("parties", courant, total)) if progress else None
+    document = reecrire(content, traiter, _selection, suivi)
+    logger.info(f"📊 Classeur traité: {remplacer.analyses} chaîne(s) distincte(s) analysée(s), "
+                f"{len(renommage.feuilles)} feuille(s) renommée(s), parties modifiées: {modifiees}")
+    return document, dict(scanner.mapping)
+
+def write(document: bytes) -> bytes:
+    return document
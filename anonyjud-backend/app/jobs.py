@@ -0,0 +1,153 @@
+"""
+Traitements de documents en tâche de fond
+File de travail locale à concurrence bornée : la requête HTTP reçoit un identifiant
+immédiatement, l'avancement et le résultat sont consultés ensuite
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Nombre de documents traités simultanément
+JOB_WORKERS = int(os.getenv("ANONYJUD_JOB_WORKERS", "2"))
+# Durée de conservation d'un résultat après la fin du traitement (secondes)
+JOB_TTL = int(os.getenv("ANONYJUD_JOB_TTL", "3600"))
+
+# Signature des fonctions de rappel d'avancement : (étape, élément courant, total)
+ProgressCallback = Callable[[str, int, int], None]
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINE = "termine"
+ERREUR = "erreur"
+
+class JobIntrouvable(KeyError):
+    """La tâche demandée n'existe pas ou a expiré."""
+
+class Job:
+    """
+    Une tâche de traitement et son avancement.
+    """
+    def __init__(self, operation: str, fichier: str):
+        self.id = uuid.uuid4().hex
+        self.operation = operation
+        self.fichier = fichier
+        self.statut = EN_ATTENTE
+        self.etape: Optional[str] = None
+        self.courant = 0
+        self.total = 0
+        self.resultat: Any = None
+        self.erreur: Optional[str] = None
+        self.cree_le = time.time()
+        self.debut_etape = self.cree_le
+        self.termine_le: Optional[float] = None
+        # Incrémenté à chaque changement d'état (suivi par le flux d'événements)
+        self.version = 0
+
+    def progression(self, etape: str, courant: int, total: int) -> None:
+        """
+        Fonction de rappel transmise au traitement (pages, paragraphes...).
+        """
+        if etape != self.etape:
+            self.debut_etape = time.time()
+        self.etape = etape
+        self.courant = courant
+        self.total = total
+        self.version += 1
+
+    @property
+    def termine(self) -> bool:
+        return self.statut in (TERMINE, ERREUR)
+
+    def eta(self) -> Optional[float]:
+        """
+        Temps restant estimé pour l'étape en cours (secondes), d'après le rythme observé.
+        """
+        if self.statut != EN_COURS or self.courant <= 0 or self.total <= 0:
+            return None
+        ecoule = time.time() - self.debut_etape
+        return round(ecoule / self.courant * (self.total - self.courant), 1)
+
+    def resume(self) -> Dict[str, Any]:
+        """
+        Représentation publique de l'état de la tâche (sans le résultat).
+        """
+        return {
+            "job_id": self.id,
+            "operation": self.operation,
+            "fichier": self.fichier,
+            "statut": self.statut,
+            "etape": self.etape,
+            "courant": self.courant,
+            "total": self.total,
+            "eta_secondes": self.eta(),
+            "erreur": self.erreur,
+        }
+
+class JobManager:
+    """
+    Exécute les tâches dans un pool de threads borné et expire les résultats.
+    """
+    def __init__(self, workers: int = 2, ttl: int = 3600):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="anonyjud-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _purger(self) -> None:
+        limite = time.time() - self.ttl
+        with self._lock:
+            expires = [job_id for job_id, job in self._jobs.items()
+                       if job.termine_le is not None and job.termine_le < limite]
+            for job_id in expires:
+                del self._jobs[job_id]
+        if expires:
+            logger.info(f"🧹 {len(expires)} tâche(s) expirée(s) supprimée(s)")
+
+    def _executer(self, job: Job, fonction: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        job.statut = EN_COURS
+        job.version += 1
+        debut = time.time()
+        try:
+            job.resultat = fonction(*args, progress=job.progression, **kwargs)
+            job.statut = TERMINE
+            logger.info(f"✅ Tâche {job.id} terminée en {time.time() - debut:.2f}s")
+        except Exception as e:
+            job.erreur = getattr(e, "detail", None) or str(e)
+            job.statut = ERREUR
+            logger.error(f"❌ Tâche {job.id} en erreur: {job.erreur}")
+        finally:
+            job.termine_le = time.time()
+            job.version += 1
+
+    def soumettre(self, operation: str, fichier: str, fonction: Callable[..., Any], *args: Any, **kwargs: Any) -> Job:
+        """
+        Met en file un traitement ; `fonction` reçoit en plus un argument nommé `progress`.
+        """
+        self._purger()
+        job = Job(operation, fichier)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._executer, job, fonction, args, kwargs)
+        return job
+
+    def obtenir(self, job_id: str) -> Job:
+        """
+        Retourne une tâche.
+
+        Raises:
+            JobIntrouvable: si la tâche n'existe pas ou a expiré
+        """
+        self._purger()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise JobIntrouvable(job_id)
+        return job
+
+job_manager = JobManager(JOB_WORKERS, JOB_TTL)
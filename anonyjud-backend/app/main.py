@@ -1,31 +1,54 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body
+import time
+_debut_imports = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
+import asyncio
+import codecs
 import json
 import os
-import tempfile
-from pathlib import Path
-import fitz  # PyMuPDF pour les PDF
-from docx import Document  # python-docx pour les fichiers Word
 import io
-from odf import text as odf_text, teletype
-from odf.opendocument import load
 import re # Added for regex in deanonymize_docx_file
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
+from contextlib import asynccontextmanager
 
-from .anonymizer import anonymize_text
+from .anonymizer import anonymize_text, anonymize_units
+from .matcher import compile_tiers
 from .deanonymizer import deanonymize_text
-from .models import TextAnonymizationRequest, TextDeanonymizationRequest
-from .pdf_utils import safe_extract_text_from_pdf, validate_pdf_content
+from . import pattern_cache
+from .pattern_cache import compiler
+from .models import TextAnonymizationRequest, TextDeanonymizationRequest, ProjetCreationRequest, ProjetTiersRequest
+from .projets import projet_store, ProjetIntrouvable, AccesProjetRefuse, ConflitBalises
+from .warmup import rechauffer, rapport_demarrage
+from . import handlers, soffice
+from .jobs import job_manager, JobIntrouvable, ProgressCallback, TERMINE, ERREUR
+
+# Flux d'avancement des tâches : intervalle de scrutation et de maintien de connexion (secondes)
+SSE_INTERVALLE = 0.25
+SSE_KEEPALIVE = 15
+
+DUREE_IMPORTS_MS = round((time.perf_counter() - _debut_imports) * 1000, 1)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Chargement des modules de traitement demandés puis préchauffage unique du worker
+    for nom in handlers.a_precharger():
+        handlers.charger(nom)
+    if "pdf" in handlers.charges():
+        # Pool OCR des pages scannées, créé avant la première requête
+        from . import ocr
+        ocr.demarrer()
+    rechauffer(DUREE_IMPORTS_MS, handlers.charges(), handlers.durees_import_ms)
+    yield
+    soffice.arreter()
+    if "pdf" in handlers.charges():
+        from . import ocr
+        ocr.arreter()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuration CORS pour permettre les requêtes depuis le frontend
 app.add_middleware(
@@ -34,20 +57,121 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Encodage source des fichiers texte anonymisés, à renvoyer à la dé-anonymisation
+    expose_headers=["X-Encodage-Source"],
 )
 
 @app.get("/")
 def read_root():
     return {"message": "AnonyJud API is running"}
 
+@app.get("/demarrage")
+def demarrage_endpoint():
+    """
+    Durées des imports et du préchauffage du worker (en millisecondes), et état du cache
+    des expressions compilées (succès, défauts, évictions) depuis le démarrage.
+    Les modules de traitement chargés à la demande apparaissent après leur premier usage.
+    """
+    return {**rapport_demarrage, "handlers_ms": dict(handlers.durees_import_ms), "handlers_charges": list(handlers.charges()),
+            "pattern_cache": pattern_cache.statistiques()}
+
+def ouvrir_projet(projet_id: str, mot_de_passe: Optional[str]):
+    """
+    Ouvre un projet persistant ou lève l'erreur HTTP correspondante.
+    """
+    try:
+        return projet_store.ouvrir(projet_id, mot_de_passe)
+    except ProjetIntrouvable:
+        raise HTTPException(status_code=404, detail="Projet introuvable")
+    except AccesProjetRefuse:
+        raise HTTPException(status_code=403, detail="Mot de passe du projet incorrect")
+
+async def ouvrir_projet_async(projet_id: str, mot_de_passe: Optional[str]):
+    """
+    ouvrir_projet pour les endpoints asynchrones : la vérification du mot de passe
+    (PBKDF2) et la lecture SQLite se font hors de la boucle d'événements.
+    """
+    return await run_in_threadpool(ouvrir_projet, projet_id, mot_de_passe)
+
+def enregistrer_anonymisation(projet, operation: str, mapping: Dict[str, str], **details: Any) -> None:
+    """
+    Mémorise le mapping d'une anonymisation dans le projet, avant de rendre le résultat :
+    une balise qui y désigne déjà une autre valeur est refusée (409).
+    """
+    try:
+        projet_store.enregistrer_operation(projet, operation, mapping, **details)
+    except ConflitBalises as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+def tiers_du_projet(projet, tiers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Retourne les tiers à utiliser pour un projet : ceux fournis dans la requête
+    (mémorisés dans le projet s'ils ont changé), sinon ceux déjà stockés.
+    """
+    if tiers:
+        if tiers != projet.tiers:
+            projet_store.mettre_a_jour_tiers(projet, tiers)
+        return tiers
+    return projet.tiers
+
+def mapping_du_projet(projet) -> Dict[str, str]:
+    """
+    Retourne le mapping mémorisé du projet, ou celui déduit de ses tiers.
+    """
+    if projet.mapping:
+        return projet.mapping
+    if projet.tiers:
+        return generate_mapping_from_tiers(projet.tiers)
+    return {}
+
+@app.post("/projets")
+def create_projet_endpoint(request: ProjetCreationRequest):
+    """
+    Crée un projet persistant (tiers, mapping et historique conservés côté serveur).
+    """
+    projet = projet_store.creer(request.nom, request.mot_de_passe, request.tiers)
+    return {"projet_id": projet.id, "nom": projet.nom}
+
+@app.get("/projets/{projet_id}")
+def get_projet_endpoint(projet_id: str, x_mot_de_passe: Optional[str] = Header(None)):
+    """
+    Retourne les tiers, le mapping et l'historique d'un projet.
+    """
+    return ouvrir_projet(projet_id, x_mot_de_passe).resume()
+
+@app.put("/projets/{projet_id}/tiers")
+def update_projet_tiers_endpoint(projet_id: str, request: ProjetTiersRequest):
+    """
+    Remplace les tiers d'un projet.
+    """
+    projet = ouvrir_projet(projet_id, request.mot_de_passe)
+    projet_store.mettre_a_jour_tiers(projet, request.tiers)
+    return {"projet_id": projet.id, "tiers": len(projet.tiers)}
+
+@app.delete("/projets/{projet_id}")
+def delete_projet_endpoint(projet_id: str, x_mot_de_passe: Optional[str] = Header(None)):
+    """
+    Supprime un projet et toutes ses correspondances.
+    """
+    projet = ouvrir_projet(projet_id, x_mot_de_passe)
+    projet_store.supprimer(projet)
+    return {"projet_id": projet_id, "supprime": True}
+
 @app.post("/anonymize/text")
 def anonymize_text_endpoint(request: TextAnonymizationRequest):
     """
-    Anonymise un texte en utilisant les tiers fournis.
+    Anonymise un texte en utilisant les tiers fournis ou ceux du projet.
     """
     try:
-        anonymized, mapping = anonymize_text(request.text, request.tiers)
+        projet = ouvrir_projet(request.projet_id, request.mot_de_passe) if request.projet_id else None
+        tiers = tiers_du_projet(projet, request.tiers) if projet else request.tiers
+        anonymized, mapping = anonymize_text(request.text, tiers, matcher=projet.matcher if projet else None,
+                                             known=projet_store.balises(projet) if projet else None)
+        if projet:
+            enregistrer_anonymisation(projet, "anonymisation_texte", mapping)
         return {"anonymized_text": anonymized, "mapping": mapping}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -58,9 +182,13 @@ def deanonymize_text_endpoint(request: TextDeanonymizationRequest):
     Si aucun mapping n'est fourni, tente de générer le mapping à partir des tiers.
     """
     try:
+        projet = ouvrir_projet(request.projet_id, request.mot_de_passe) if request.projet_id else None
+        
         # Si le mapping est vide, générer le mapping à partir des tiers
         if not request.has_mapping or not request.mapping or len(request.mapping) == 0:
-            if request.tiers and len(request.tiers) > 0:
+            if projet and not request.tiers:
+                mapping = mapping_du_projet(projet)
+            elif request.tiers and len(request.tiers) > 0:
                 mapping = generate_mapping_from_tiers(request.tiers)
             else:
                 # Fallback: essayer de détecter automatiquement
@@ -73,9 +201,13 @@ def deanonymize_text_endpoint(request: TextDeanonymizationRequest):
             mapping = request.mapping
         
         deanonymized = deanonymize_text(request.anonymized_text, mapping)
+        if projet:
+            projet_store.enregistrer_operation(projet, "desanonymisation_texte")
         
         return {"deanonymized_text": deanonymized, "mapping": mapping}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur dans deanonymize_text_endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -83,40 +215,37 @@ def deanonymize_text_endpoint(request: TextDeanonymizationRequest):
 @app.post("/anonymize/file")
 async def anonymize_file(
     file: UploadFile = File(...),
-    tiers_json: str = Form(...)
+    tiers_json: str = Form("[]"),
+    projet_id: Optional[str] = Form(None),
+    mot_de_passe: Optional[str] = Form(None)
 ):
     """
-    Anonymise un fichier Word, PDF ou ODT en utilisant les tiers fournis.
+    Anonymise un fichier Word, PDF ou ODT en utilisant les tiers fournis ou ceux du projet.
     """
     try:
         # Convertir la chaîne JSON en liste de tiers
         tiers = json.loads(tiers_json)
+        projet = await ouvrir_projet_async(projet_id, mot_de_passe) if projet_id else None
+        if projet:
+            tiers = tiers_du_projet(projet, tiers)
         
-        # Vérifier le type de fichier
+        # Le format est reconnu au contenu du fichier, pas à son nom
         filename = file.filename or ""
-        file_extension = os.path.splitext(filename)[1].lower()
+        content = await file.read()
+        handler = format_du_fichier(content)
         
-        if file_extension == ".pdf":
-            # Traitement des fichiers PDF
-            content = await file.read()
-            pdf_text, mapping = extract_and_anonymize_pdf(content, tiers)
-            return {"text": pdf_text, "mapping": mapping}
-            
-        elif file_extension in [".doc", ".docx"]:
-            # Traitement des fichiers Word
-            content = await file.read()
-            doc_text, mapping = extract_and_anonymize_docx(content, tiers)
-            return {"text": doc_text, "mapping": mapping}
-            
-        elif file_extension == ".odt":
-            # Traitement des fichiers ODT (OpenDocument Text)
-            content = await file.read()
-            odt_text, mapping = extract_and_anonymize_odt(content, tiers)
-            return {"text": odt_text, "mapping": mapping}
-            
-        else:
-            raise HTTPException(status_code=400, detail="Format de fichier non supporté. Utilisez PDF, DOCX ou ODT.")
+        # Unités de texte anonymisées au fil de la lecture, sans assembler le texte brut du document
+        mapping = {}
+        unites = anonymize_units(handler.iter_text_units(content), tiers, mapping=mapping,
+                                 known=projet_store.balises(projet) if projet else None)
+        text = "".join(texte + "\n" for _, texte in unites)
+        
+        if projet:
+            enregistrer_anonymisation(projet, "anonymisation_fichier", mapping, fichier=filename)
+        return {"text": text, "mapping": mapping}
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -153,7 +282,7 @@ def detect_anonymized_patterns(text: str) -> Dict[str, str]:
     
     # Chercher tous les patterns dans le texte
     for pattern, field_type in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
+        matches = compiler(pattern, re.IGNORECASE).findall(text)
         print(f"🔍 Pattern '{pattern}' -> {len(matches)} correspondances trouvées")
         
         for match in matches:
@@ -180,152 +309,12 @@ def detect_anonymized_patterns(text: str) -> Dict[str, str]:
 def generate_mapping_from_tiers(tiers: List[Dict[str, Any]]) -> Dict[str, str]:
     """
     Génère le mapping d'anonymisation à partir des tiers.
-    Utilise la même logique que l'anonymisation pour créer les balises.
+    Utilise la même table de champs que l'anonymisation pour créer les balises.
     """
-    import re
-    
     print(f"🔧 GENERATE_MAPPING_FROM_TIERS - Début de la génération")
     print(f"📊 Nombre de tiers reçus: {len(tiers)}")
     
-    mapping = {}
-    
-    for tier_index, tier in enumerate(tiers):
-        # Utiliser le numéro fixe du tiers ou fallback sur l'index + 1
-        tier_number = tier.get("numero", tier_index + 1)
-        print(f"🔍 Traitement du tiers {tier_number}: {tier}")
-        
-        # Traiter le nom
-        if tier.get("nom"):
-            nom = tier["nom"].strip()
-            if nom and len(nom) > 1:
-                tag = f"NOM{tier_number}"
-                mapping[tag] = nom
-                print(f"✅ Ajouté: {tag} -> {nom}")
-        
-        # Traiter le prénom
-        if tier.get("prenom"):
-            prenom = tier["prenom"].strip()
-            if prenom and len(prenom) > 1:
-                tag = f"PRENOM{tier_number}"
-                mapping[tag] = prenom
-                print(f"✅ Ajouté: {tag} -> {prenom}")
-        
-        # Traiter les composants de l'adresse
-        if tier.get("adresse_numero"):
-            numero = tier["adresse_numero"].strip()
-            if numero and len(numero) > 0:
-                tag = f"NUMERO{tier_number}"
-                mapping[tag] = numero
-                print(f"✅ Ajouté: {tag} -> {numero}")
-        
-        if tier.get("adresse_voie"):
-            voie = tier["adresse_voie"].strip()
-            if voie and len(voie) > 2:
-                tag = f"VOIE{tier_number}"
-                mapping[tag] = voie
-                print(f"✅ Ajouté: {tag} -> {voie}")
-        
-        if tier.get("adresse_code_postal"):
-            code_postal = tier["adresse_code_postal"].strip()
-            if code_postal and len(code_postal) > 0:
-                tag = f"CODEPOSTAL{tier_number}"
-                mapping[tag] = code_postal
-                print(f"✅ Ajouté: {tag} -> {code_postal}")
-        
-        if tier.get("adresse_ville"):
-            ville = tier["adresse_ville"].strip()
-            if ville and len(ville) > 1:
-                tag = f"VILLE{tier_number}"
-                mapping[tag] = ville
-                print(f"✅ Ajouté: {tag} -> {ville}")
-        
-        # Traiter la ville (format simple, pour compatibilité)
-        if tier.get("ville") and not tier.get("adresse_ville"):
-            ville = tier["ville"].strip()
-            if ville and len(ville) > 1:
-                tag = f"VILLE{tier_number}"
-                mapping[tag] = ville
-                print(f"✅ Ajouté: {tag} -> {ville}")
-        
-        # Traiter l'adresse complète (compatibilité)
-        if tier.get("adresse"):
-            adresse = tier["adresse"].strip()
-            if adresse and len(adresse) > 5:
-                tag = f"ADRESSE{tier_number}"
-                mapping[tag] = adresse
-                print(f"✅ Ajouté: {tag} -> {adresse}")
-        
-        # Traiter le téléphone
-        if tier.get("telephone"):
-            tel = tier["telephone"].strip()
-            if tel and len(tel) > 5:
-                tag = f"TEL{tier_number}"
-                mapping[tag] = tel
-                print(f"✅ Ajouté: {tag} -> {tel}")
-        
-        # Traiter le portable
-        if tier.get("portable"):
-            portable = tier["portable"].strip()
-            if portable and len(portable) > 5:
-                tag = f"PORTABLE{tier_number}"
-                mapping[tag] = portable
-                print(f"✅ Ajouté: {tag} -> {portable}")
-        
-        # Traiter l'email
-        if tier.get("email"):
-            email = tier["email"].strip()
-            if email and '@' in email:
-                tag = f"EMAIL{tier_number}"
-                mapping[tag] = email
-                print(f"✅ Ajouté: {tag} -> {email}")
-        
-        # Traiter la société
-        if tier.get("societe"):
-            societe = tier["societe"].strip()
-            if societe and len(societe) > 1:
-                tag = f"SOCIETE{tier_number}"
-                mapping[tag] = societe
-                print(f"✅ Ajouté: {tag} -> {societe}")
-        
-        # Traiter les champs personnalisés
-        if tier.get("customFields") and isinstance(tier["customFields"], list):
-            for custom_field in tier["customFields"]:
-                if isinstance(custom_field, dict):
-                    champ_value = custom_field.get("value")
-                    champ_label = custom_field.get("label")
-                    
-                    if champ_value and isinstance(champ_value, str):
-                        champ_value = champ_value.strip()
-                        if champ_value and len(champ_value) > 1:
-                            label_base = "PERSO"
-                            if champ_label and isinstance(champ_label, str):
-                                label_perso = champ_label.strip()
-                                if label_perso:
-                                    label_base = re.sub(r'[^A-Za-z]', '', label_perso.upper())
-                                    if not label_base:
-                                        label_base = "PERSO"
-                            
-                            tag = f"{label_base}{tier_number}"
-                            mapping[tag] = champ_value
-                            print(f"✅ Ajouté: {tag} -> {champ_value}")
-        
-        # Traiter le champ personnalisé (ancien format)
-        if tier.get("champPerso"):
-            champ_perso = tier["champPerso"]
-            if champ_perso and isinstance(champ_perso, str):
-                champ_perso = champ_perso.strip()
-                if champ_perso and len(champ_perso) > 1:
-                    label_base = "PERSO"
-                    if tier.get("labelChampPerso") and isinstance(tier["labelChampPerso"], str):
-                        label_perso = tier["labelChampPerso"].strip()
-                        if label_perso:
-                            label_base = re.sub(r'[^A-Za-z]', '', label_perso.upper())
-                            if not label_base:
-                                label_base = "PERSO"
-                    
-                    tag = f"{label_base}{tier_number}"
-                    mapping[tag] = champ_perso
-                    print(f"✅ Ajouté: {tag} -> {champ_perso}")
+    mapping = dict(compile_tiers(tiers).mapping)
     
     print(f"🏁 GENERATE_MAPPING_FROM_TIERS - Mapping généré avec {len(mapping)} éléments")
     print(f"🗂️ Mapping final: {mapping}")
@@ -334,13 +323,15 @@ def generate_mapping_from_tiers(tiers: List[Dict[str, Any]]) -> Dict[str, str]:
 @app.post("/deanonymize/file")
 async def deanonymize_file(
     file: UploadFile = File(...),
-    mapping_json: str = Form(...),
+    mapping_json: str = Form("{}"),
     tiers_json: str = Form("[]"),
-    has_mapping: str = Form("true")
+    has_mapping: str = Form("true"),
+    projet_id: Optional[str] = Form(None),
+    mot_de_passe: Optional[str] = Form(None)
 ):
     """
     Dé-anonymise un fichier Word, PDF ou ODT en utilisant le mapping fourni.
-    Si le mapping est vide, essaie de détecter automatiquement les patterns.
+    Si le mapping est vide, utilise celui du projet, puis essaie de détecter automatiquement les patterns.
     """
     try:
         print(f"🚀 DEANONYMIZE_FILE ENDPOINT - Début du traitement")
@@ -352,18 +343,22 @@ async def deanonymize_file(
         # Convertir la chaîne JSON en mapping
         mapping = json.loads(mapping_json)
         tiers = json.loads(tiers_json)
+        projet = await ouvrir_projet_async(projet_id, mot_de_passe) if projet_id else None
+        if projet and (has_mapping.lower() == "false" or not mapping) and not tiers:
+            mapping = mapping_du_projet(projet)
+            has_mapping = "true"
+            print(f"🗄️ Mapping du projet {projet.id} utilisé: {len(mapping)} balises")
         print(f"🗂️ Mapping parsé: {mapping}")
         print(f"📊 Nombre de balises dans le mapping: {len(mapping)}")
         print(f"👥 Nombre de tiers: {len(tiers)}")
         
-        # Vérifier le type de fichier
+        # Lire le contenu du fichier et en reconnaître le format
         filename = file.filename or ""
-        file_extension = os.path.splitext(filename)[1].lower()
-        print(f"📄 Extension du fichier: {file_extension}")
-        
-        # Lire le contenu du fichier
         content = await file.read()
         print(f"📦 Taille du fichier: {len(content)} bytes")
+        handler = format_du_fichier(content)
+        print(f"📄 Format détecté: {handler.nom}")
+        text = None
         
         # Si le mapping est vide, générer le mapping à partir des tiers
         if has_mapping.lower() == "false" or not mapping or len(mapping) == 0:
@@ -376,30 +371,7 @@ async def deanonymize_file(
                 # Fallback: essayer de détecter automatiquement
                 print(f"🔍 Tentative de détection automatique...")
                 # Extraire d'abord le texte pour détecter les patterns
-                if file_extension == ".pdf":
-                    with fitz.open(stream=content, filetype="pdf") as pdf:
-                        text = ""
-                        for page in pdf:
-                            text += page.get_text()
-                elif file_extension in [".doc", ".docx"]:
-                    doc = Document(io.BytesIO(content))
-                    text = ""
-                    for para in doc.paragraphs:
-                        text += para.text + "\n"
-                elif file_extension == ".odt":
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".odt") as temp_file:
-                        temp_file.write(content)
-                        temp_path = temp_file.name
-                    try:
-                        doc = load(temp_path)
-                        text = ""
-                        for paragraph in doc.getElementsByType(odf_text.P):
-                            text += teletype.extractText(paragraph) + "\n"
-                    finally:
-                        if os.path.exists(temp_path):
-                            os.unlink(temp_path)
-                else:
-                    raise HTTPException(status_code=400, detail="Format de fichier non supporté. Utilisez PDF, DOCX ou ODT.")
+                text = handler.extract_text(content)
                 
                 # Détecter les patterns anonymisés automatiquement
                 mapping = detect_anonymized_patterns(text)
@@ -411,28 +383,18 @@ async def deanonymize_file(
         
         print(f"🔄 Début de la désanonymisation avec mapping: {mapping}")
         
-        # Procéder à la dé-anonymisation
-        if file_extension == ".pdf":
-            print(f"📄 Traitement PDF...")
-            pdf_text = extract_and_deanonymize_pdf(content, mapping)
-            print(f"✅ PDF désanonymisé avec succès")
-            return {"text": pdf_text, "mapping": mapping}
-            
-        elif file_extension in [".doc", ".docx"]:
-            print(f"📄 Traitement DOCX...")
-            doc_text = extract_and_deanonymize_docx(content, mapping)
-            print(f"✅ DOCX désanonymisé avec succès")
-            return {"text": doc_text, "mapping": mapping}
-            
-        elif file_extension == ".odt":
-            print(f"📄 Traitement ODT...")
-            odt_text = extract_and_deanonymize_odt(content, mapping)
-            print(f"✅ ODT désanonymisé avec succès")
-            return {"text": odt_text, "mapping": mapping}
-            
-        else:
-            raise HTTPException(status_code=400, detail="Format de fichier non supporté. Utilisez PDF, DOCX ou ODT.")
+        # Procéder à la dé-anonymisation (texte déjà extrait réutilisé)
+        if text is None:
+            text = handler.extract_text(content)
+        text = deanonymize_text(text, mapping)
+        print(f"✅ Fichier {handler.nom} désanonymisé avec succès")
+        
+        if projet:
+            projet_store.enregistrer_operation(projet, "desanonymisation_fichier", fichier=filename)
+        return {"text": text, "mapping": mapping}
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur dans deanonymize_file endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -440,7 +402,9 @@ async def deanonymize_file(
 @app.post("/anonymize/file/download")
 async def anonymize_file_download(
     file: UploadFile = File(...),
-    tiers_json: str = Form(...)
+    tiers_json: str = Form("[]"),
+    projet_id: Optional[str] = Form(None),
+    mot_de_passe: Optional[str] = Form(None)
 ):
     """
     Anonymise un fichier Word ou ODT et retourne le fichier modifié pour téléchargement.
@@ -451,71 +415,32 @@ async def anonymize_file_download(
         
         # Convertir la chaîne JSON en liste de tiers
         tiers = json.loads(tiers_json)
+        projet = await ouvrir_projet_async(projet_id, mot_de_passe) if projet_id else None
+        if projet:
+            tiers = tiers_du_projet(projet, tiers)
         print(f"👥 Nombre de tiers: {len(tiers)}")
         
-        # Vérifier le type de fichier
         filename = file.filename or ""
-        file_extension = os.path.splitext(filename)[1].lower()
-        print(f"📄 Extension du fichier: {file_extension}")
-        
-        if file_extension == ".pdf":
-            print(f"📄 Traitement fichier PDF...")
-            # Traitement des fichiers PDF - Utilisation de la méthode sécurisée par défaut
-            content = await file.read()
-            anonymized_file, mapping = anonymize_pdf_secure_with_graphics(content, tiers)
-            
-            # Créer un nom de fichier pour le téléchargement
-            base_name = os.path.splitext(filename)[0]
-            anonymized_filename = f"{base_name}_ANONYM_SECURE.pdf"
-            
-            print(f"✅ Fichier PDF anonymisé: {anonymized_filename}")
-            
-            # Retourner le fichier modifié
-            return StreamingResponse(
-                io.BytesIO(anonymized_file),
-                media_type="application/pdf",
-                headers={"Content-Disposition": f"attachment; filename={anonymized_filename}"}
-            )
-        elif file_extension in [".doc", ".docx"]:
-            print(f"📄 Traitement fichier Word...")
-            # Traitement des fichiers Word
-            content = await file.read()
-            anonymized_file, mapping = anonymize_docx_file(content, tiers)
-            
-            # Créer un nom de fichier pour le téléchargement
-            base_name = os.path.splitext(filename)[0]
-            anonymized_filename = f"{base_name}_ANONYM.docx"
-            
-            print(f"✅ Fichier Word anonymisé: {anonymized_filename}")
-            
-            # Retourner le fichier modifié
-            return StreamingResponse(
-                io.BytesIO(anonymized_file),
-                media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                headers={"Content-Disposition": f"attachment; filename={anonymized_filename}"}
-            )
-        elif file_extension == ".odt":
-            print(f"📄 Traitement fichier ODT...")
-            # Traitement des fichiers ODT
-            content = await file.read()
-            anonymized_file, mapping = anonymize_odt_file(content, tiers)
-            
-            # Créer un nom de fichier pour le téléchargement
-            base_name = os.path.splitext(filename)[0]
-            anonymized_filename = f"{base_name}_ANONYM.odt"
-            
-            print(f"✅ Fichier ODT anonymisé: {anonymized_filename}")
-            
-            # Retourner le fichier modifié
-            return StreamingResponse(
-                io.BytesIO(anonymized_file),
-                media_type="application/vnd.oasis.opendocument.text",
-                headers={"Content-Disposition": f"attachment; filename={anonymized_filename}"}
-            )
-        else:
-            print(f"❌ Format de fichier non supporté: {file_extension}")
-            raise HTTPException(status_code=400, detail="Seuls les fichiers PDF (.pdf), Word (.docx) et ODT (.odt) sont supportés pour le téléchargement.")
+        content = await file.read()
+        anonymized_file, anonymized_filename, media_type, mapping, encodage = anonymiser_fichier(
+            filename, content, tiers, known=projet_store.balises(projet) if projet else None)
+        
+        print(f"✅ Fichier anonymisé: {anonymized_filename}")
+        if projet:
+            enregistrer_anonymisation(projet, "anonymisation_fichier", mapping, **details_fichier(filename, encodage))
+        
+        # Retourner le fichier modifié ; l'encodage source (fichiers texte) est à renvoyer à la dé-anonymisation
+        headers = {"Content-Disposition": f"attachment; filename={anonymized_filename}"}
+        if encodage:
+            headers["X-Encodage-Source"] = encodage
+        return StreamingResponse(
+            io.BytesIO(anonymized_file),
+            media_type=media_type,
+            headers=headers
+        )
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur dans anonymize_file_download: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -523,10 +448,15 @@ async def anonymize_file_download(
 @app.post("/deanonymize/file/download")
 async def deanonymize_file_download(
     file: UploadFile = File(...),
-    mapping_json: str = Form(...)
+    mapping_json: str = Form("{}"),
+    projet_id: Optional[str] = Form(None),
+    mot_de_passe: Optional[str] = Form(None),
+    encodage: Optional[str] = Form(None)
 ):
     """
     Dé-anonymise un fichier Word ou ODT et retourne le fichier modifié pour téléchargement.
+    Sans mapping fourni, utilise celui mémorisé dans le projet ; sans encodage fourni
+    (fichiers texte, en-tête X-Encodage-Source de l'anonymisation), celui mémorisé pour ce fichier.
     """
     try:
         print(f"🚀 DEANONYMIZE_FILE_DOWNLOAD - Début du traitement")
@@ -534,1338 +464,264 @@ async def deanonymize_file_download(
         
         # Convertir la chaîne JSON en mapping
         mapping = json.loads(mapping_json)
+        projet = await ouvrir_projet_async(projet_id, mot_de_passe) if projet_id else None
+        if projet and not mapping:
+            mapping = mapping_du_projet(projet)
         print(f"🗂️ Mapping reçu: {mapping}")
         print(f"📊 Nombre de balises dans le mapping: {len(mapping)}")
         
-        # Vérifier le type de fichier
         filename = file.filename or ""
-        file_extension = os.path.splitext(filename)[1].lower()
-        print(f"📄 Extension du fichier: {file_extension}")
-        
-        if file_extension == ".pdf":
-            print(f"📄 Traitement fichier PDF...")
-            # Traitement des fichiers PDF - Utilisation de la méthode sécurisée
-            content = await file.read()
-            deanonymized_file = deanonymize_pdf_secure_with_graphics(content, mapping)
-            
-            # Créer un nom de fichier pour le téléchargement
-            base_name = os.path.splitext(filename)[0]
-            # Retirer les suffixes d'anonymisation si présents
-            for suffix in ["_ANONYM_SECURE", "_ANONYM"]:
-                if base_name.endswith(suffix):
-                    base_name = base_name[:-len(suffix)]
-                    break
-            deanonymized_filename = f"{base_name}_DESANONYM_SECURE.pdf"
-            
-            print(f"✅ Fichier PDF dé-anonymisé: {deanonymized_filename}")
-            
-            # Retourner le fichier modifié
-            return StreamingResponse(
-                io.BytesIO(deanonymized_file),
-                media_type="application/pdf",
-                headers={"Content-Disposition": f"attachment; filename={deanonymized_filename}"}
-            )
-        elif file_extension in [".doc", ".docx"]:
-            print(f"📄 Traitement fichier Word...")
-            # Traitement des fichiers Word
-            content = await file.read()
-            deanonymized_file = deanonymize_docx_file(content, mapping)
-            
-            # Créer un nom de fichier pour le téléchargement
-            base_name = os.path.splitext(filename)[0]
-            # Retirer "_ANONYM" du nom si présent
-            if base_name.endswith("_ANONYM"):
-                base_name = base_name[:-7]
-            deanonymized_filename = f"{base_name}_DESANONYM.docx"
-            
-            print(f"✅ Fichier Word dé-anonymisé: {deanonymized_filename}")
-            
-            # Retourner le fichier modifié
-            return StreamingResponse(
-                io.BytesIO(deanonymized_file),
-                media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                headers={"Content-Disposition": f"attachment; filename={deanonymized_filename}"}
-            )
-        elif file_extension == ".odt":
-            print(f"📄 Traitement fichier ODT...")
-            # Traitement des fichiers ODT
-            content = await file.read()
-            deanonymized_file = deanonymize_odt_file(content, mapping)
-            
-            # Créer un nom de fichier pour le téléchargement
-            base_name = os.path.splitext(filename)[0]
-            # Retirer "_ANONYM" du nom si présent
-            if base_name.endswith("_ANONYM"):
-                base_name = base_name[:-7]
-            deanonymized_filename = f"{base_name}_DESANONYM.odt"
-            
-            print(f"✅ Fichier ODT dé-anonymisé: {deanonymized_filename}")
-            
-            # Retourner le fichier modifié
-            return StreamingResponse(
-                io.BytesIO(deanonymized_file),
-                media_type="application/vnd.oasis.opendocument.text",
-                headers={"Content-Disposition": f"attachment; filename={deanonymized_filename}"}
-            )
-        else:
-            print(f"❌ Format de fichier non supporté: {file_extension}")
-            raise HTTPException(status_code=400, detail="Seuls les fichiers PDF (.pdf), Word (.docx) et ODT (.odt) sont supportés pour le téléchargement.")
+        content = await file.read()
+        encodage = encodage_du_retour(filename, encodage, projet)
+        deanonymized_file, deanonymized_filename, media_type = desanonymiser_fichier(filename, content, mapping,
+                                                                                     encodage=encodage)
+        
+        print(f"✅ Fichier dé-anonymisé: {deanonymized_filename}")
+        if projet:
+            projet_store.enregistrer_operation(projet, "desanonymisation_fichier", fichier=filename)
+        
+        # Retourner le fichier modifié
+        return StreamingResponse(
+            io.BytesIO(deanonymized_file),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={deanonymized_filename}"}
+        )
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur dans deanonymize_file_download: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def extract_and_anonymize_pdf(content: bytes, tiers: List[Dict[str, Any]]):
-    """
-    Extrait le texte d'un PDF et l'anonymise de manière sécurisée.
-    Utilise safe_extract_text_from_pdf pour gérer les erreurs get_text().
-    """
-    try:
-        print(f"🔍 EXTRACT_AND_ANONYMIZE_PDF - Début du traitement sécurisé")
-        print(f"👥 Nombre de tiers: {len(tiers)}")
-        
-        # Extraction sécurisée du texte
-        text, extraction_success = safe_extract_text_from_pdf(content)
-        
-        if not extraction_success:
-            print(f"⚠️ Extraction partielle ou échec - tentative avec méthode de fallback")
-            # Fallback: essayer l'ancienne méthode pour compatibilité
-            try:
-                with fitz.open(stream=content, filetype="pdf") as pdf:
-                    text = ""
-                    for page_num in range(pdf.page_count):
-                        try:
-                            page = pdf[page_num]
-                            if page is not None:
-                                try:
-                                    page_text = page.get_text()
-                                    text += page_text
-                                except Exception as page_error:
-                                    print(f"⚠️ Erreur get_text page {page_num + 1}: {str(page_error)}")
-                                    # Essayer avec get_text("text")
-                                    try:
-                                        page_text = page.get_text("text")
-                                        text += page_text
-                                    except Exception as page_error2:
-                                        print(f"⚠️ Erreur get_text('text') page {page_num + 1}: {str(page_error2)}")
-                                        # Passer à la page suivante sans arrêter le processus
-                                        continue
-                        except Exception as e:
-                            print(f"⚠️ Erreur traitement page {page_num + 1}: {str(e)}")
-                            continue
-                            
-                print(f"📝 Fallback: {len(text)} caractères extraits")
-            except Exception as fallback_error:
-                print(f"❌ Fallback aussi en échec: {str(fallback_error)}")
-                if not text:  # Si aucun texte n'a été extrait
-                    raise Exception(f"Impossible d'extraire le texte du PDF: {str(fallback_error)}")
-        
-        if not text or len(text.strip()) == 0:
-            print(f"⚠️ Aucun texte extrait du PDF")
-            return "", {}
-        
-        print(f"📝 Texte extrait: {len(text)} caractères")
-        print(f"📝 Aperçu (premiers 200 chars): {text[:200]}...")
-        
-        # Anonymiser le texte extrait
-        anonymized, mapping = anonymize_text(text, tiers)
-        
-        print(f"🔒 Anonymisation terminée: {len(mapping)} remplacements")
-        return anonymized, mapping
-        
-    except Exception as e:
-        print(f"❌ Erreur dans extract_and_anonymize_pdf: {str(e)}")
-        raise Exception(f"Erreur lors du traitement du PDF: {str(e)}")
+FORMAT_NON_SUPPORTE = ("Format de fichier non supporté. Utilisez PDF (.pdf), Word (.docx, .doc), ODT (.odt), "
+                       "Excel (.xlsx), ODS (.ods), RTF (.rtf), HTML (.html), courriel (.eml) ou texte (.txt).")
 
-def extract_and_anonymize_docx(content: bytes, tiers: List[Dict[str, Any]]):
-    """
-    Extrait le texte d'un document Word et l'anonymise.
-    """
-    try:
-        # Ouvrir le document Word depuis les bytes
-        doc = Document(io.BytesIO(content))
-        text = ""
-        
-        # Extraire le texte de chaque paragraphe
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-            
-        # Anonymiser le texte extrait
-        anonymized, mapping = anonymize_text(text, tiers)
-        return anonymized, mapping
-        
-    except Exception as e:
-        raise Exception(f"Erreur lors du traitement du document Word: {str(e)}")
+def format_du_fichier(content: bytes) -> handlers.FormatHandler:
+    """
+    Traitement correspondant au contenu du fichier (signature), quel que soit son nom.
+    """
+    handler = handlers.detecter(content)
+    if handler is None:
+        print(f"❌ Format de fichier non reconnu")
+        raise HTTPException(status_code=400, detail=FORMAT_NON_SUPPORTE)
+    raison = handler.indisponible()
+    if raison:
+        # Format reconnu mais outil de conversion absent : refus immédiat plutôt qu'un échec en cours de traitement
+        print(f"❌ Format {handler.nom} indisponible")
+        raise HTTPException(status_code=503, detail=raison)
+    return handler
 
-def extract_and_anonymize_odt(content: bytes, tiers: List[Dict[str, Any]]):
+def anonymiser_fichier(filename: str, content: bytes, tiers: List[Dict[str, Any]],
+                       progress: Optional[ProgressCallback] = None, known: Optional[Dict[str, str]] = None):
     """
-    Extrait le texte d'un document OpenDocument Text (ODT) et l'anonymise.
+    Anonymise un fichier selon son format détecté.
+    `known` : balises déjà attribuées (mapping du projet), dont la numérotation est poursuivie.
+    
+    Returns:
+        Tuple (contenu anonymisé, nom du fichier produit, type MIME, mapping, encodage source
+        des fichiers texte ou None)
     """
-    try:
-        # Créer un fichier temporaire pour stocker le contenu ODT
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".odt") as temp_file:
-            temp_file.write(content)
-            temp_path = temp_file.name
-        
-        try:
-            # Charger le document ODT
-            doc = load(temp_path)
-            
-            # Extraire le texte du document
-            text = ""
-            
-            # Parcourir tous les éléments de texte dans le document
-            for paragraph in doc.getElementsByType(odf_text.P):
-                text += teletype.extractText(paragraph) + "\n"
-            
-            # Anonymiser le texte extrait
-            anonymized, mapping = anonymize_text(text, tiers)
-            
-            return anonymized, mapping
-            
-        finally:
-            # Supprimer le fichier temporaire
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-        
-    except Exception as e:
-        raise Exception(f"Erreur lors du traitement du document ODT: {str(e)}") 
+    handler = format_du_fichier(content)
+    print(f"📄 Traitement fichier {handler.nom}...")
+    base_name = os.path.splitext(filename)[0]
+    
+    document, mapping = handler.apply_replacements(content, tiers=tiers, mapping=known, progress=progress)
+    return (handler.write(document), f"{base_name}_ANONYM{handler.suffixe}{handler.extension}", handler.media_type,
+            mapping, handler.encodage(content))
 
-def anonymize_docx_file(content: bytes, tiers: List[Dict[str, Any]]):
+def nom_de_base(filename: str) -> str:
     """
-    Anonymise directement un fichier Word en modifiant son contenu.
-    Préserve le formatage (police, style, majuscules/minuscules, mise en page).
-    Retourne le fichier modifié et le mapping d'anonymisation.
+    Nom du fichier d'origine, sans extension ni suffixe d'anonymisation.
     """
-    try:
-        print(f"DEBUG: Début anonymize_docx_file avec {len(tiers)} tiers")
-        
-        # Ouvrir le document Word depuis les bytes
-        doc = Document(io.BytesIO(content))
-        
-        # Collecter tout le texte du document
-        full_text = ""
-        for para in doc.paragraphs:
-            full_text += para.text + "\n"
-        
-        print(f"DEBUG: Texte extrait (premiers 200 chars): {full_text[:200]}...")
-        
-        # Anonymiser le texte complet pour obtenir le mapping
-        anonymized_text, mapping = anonymize_text(full_text, tiers)
-        
-        print(f"DEBUG: Mapping généré: {mapping}")
-        print(f"DEBUG: Texte anonymisé (premiers 200 chars): {anonymized_text[:200]}...")
-        
-        # Fonction pour anonymiser un run en préservant son formatage
-        def anonymize_run_preserving_format(run, mapping):
-            """Anonymise le texte d'un run en préservant son formatage"""
-            if not run.text:
-                return
-                
-            original_text = run.text
-            modified_text = original_text
-            
-            # Appliquer chaque remplacement du mapping (inverser pour que les tags remplacent les originaux)
-            for tag, original_value in mapping.items():
-                if original_value in modified_text:
-                    # Préserver la casse du texte original
-                    if original_value.isupper():
-                        modified_text = modified_text.replace(original_value, tag.upper())
-                    elif original_value.islower():
-                        modified_text = modified_text.replace(original_value, tag.lower())
-                    elif original_value.istitle():
-                        modified_text = modified_text.replace(original_value, tag.title())
-                    else:
-                        modified_text = modified_text.replace(original_value, tag)
-            
-            # Remplacer le texte du run seulement si modifié (le formatage est automatiquement préservé)
-            if modified_text != original_text:
-                print(f"DEBUG: Run modifié: '{original_text}' -> '{modified_text}'")
-                run.text = modified_text
-        
-        # Appliquer les anonymisations directement dans le document en préservant le formatage
-        paragraphs_processed = 0
-        for para in doc.paragraphs:
-            if para.text.strip():  # Seulement pour les paragraphes non vides
-                # Traiter chaque run individuellement pour préserver le formatage
-                for run in para.runs:
-                    anonymize_run_preserving_format(run, mapping)
-                paragraphs_processed += 1
-        
-        # Traiter également les tableaux
-        cells_processed = 0
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        if para.text.strip():
-                            # Traiter chaque run individuellement pour préserver le formatage
-                            for run in para.runs:
-                                anonymize_run_preserving_format(run, mapping)
-                            cells_processed += 1
-        
-        print(f"DEBUG: Traitement terminé - {paragraphs_processed} paragraphes, {cells_processed} cellules")
-        
-        # Sauvegarder le document modifié en bytes
-        output = io.BytesIO()
-        doc.save(output)
-        output.seek(0)
-        
-        print(f"DEBUG: Fichier anonymisé généré avec succès")
-        return output.getvalue(), mapping
-        
-    except Exception as e:
-        print(f"DEBUG: Erreur dans anonymize_docx_file: {str(e)}")
-        raise Exception(f"Erreur lors de l'anonymisation du fichier Word: {str(e)}")
+    base_name = os.path.splitext(filename)[0]
+    for suffix in ["_ANONYM_SECURE", "_ANONYM"]:
+        if base_name.endswith(suffix):
+            return base_name[:-len(suffix)]
+    return base_name
 
-def deanonymize_docx_file(content: bytes, mapping: Dict[str, str]):
+def details_fichier(filename: str, encodage: Optional[str] = None) -> Dict[str, Any]:
     """
-    Dé-anonymise directement un fichier Word en utilisant le mapping fourni.
-    Préserve le formatage (police, style, majuscules/minuscules, mise en page).
-    Retourne le fichier modifié.
+    Détails d'une opération sur fichier pour l'historique du projet.
     """
-    try:
-        print(f"🔍 DEANONYMIZE_DOCX_FILE - Début du processus")
-        print(f"🗂️ Mapping reçu: {mapping}")
-        print(f"📊 Nombre de balises dans le mapping: {len(mapping)}")
-        
-        # Ouvrir le document Word depuis les bytes
-        doc = Document(io.BytesIO(content))
-        
-        # Extraire tout le texte du document pour analyse
-        full_text = ""
-        for para in doc.paragraphs:
-            full_text += para.text + "\n"
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        full_text += para.text + "\n"
-        
-        print(f"📝 Texte extrait du document (premiers 300 chars): {full_text[:300]}...")
-        
-        # Analyser quelles balises sont présentes dans le texte
-        found_tags = []
-        for tag in mapping.keys():
-            if tag in full_text:
-                found_tags.append(tag)
-                print(f"✅ Balise '{tag}' trouvée dans le document")
-            else:
-                print(f"❌ Balise '{tag}' NON trouvée dans le document")
-        
-        print(f"📋 Résumé: {len(found_tags)}/{len(mapping)} balises trouvées: {found_tags}")
-        
-        # Le mapping est déjà dans le bon sens (balise -> valeur_originale)
-        # Pas besoin d'inverser car generate_mapping_from_tiers() crée déjà le mapping correct
-        print(f"🔄 Mapping reçu (balise -> valeur): {mapping}")
-        
-        # Vérifier si le mapping est dans le bon sens
-        sample_key = list(mapping.keys())[0] if mapping else ""
-        if sample_key and not sample_key.isupper():
-            # Le mapping semble être dans le mauvais sens (valeur -> balise), l'inverser
-            reverse_mapping = {v: k for k, v in mapping.items()}
-            print(f"🔄 Mapping inversé car dans le mauvais sens: {reverse_mapping}")
-        else:
-            # Le mapping est dans le bon sens (balise -> valeur)
-            reverse_mapping = mapping
-            print(f"🔄 Mapping utilisé tel quel: {reverse_mapping}")
-        
-        # Trier les balises par longueur décroissante pour éviter les remplacements partiels
-        sorted_tags = sorted(reverse_mapping.keys(), key=len, reverse=True)
-        print(f"🔢 Balises triées par longueur: {sorted_tags}")
-        
-        # Fonction pour dé-anonymiser un run en préservant son formatage
-        def deanonymize_run_preserving_format(run, mapping, sorted_tags):
-            """Dé-anonymise le texte d'un run en préservant son formatage"""
-            if not run.text:
-                return False
-                
-            original_text = run.text
-            modified_text = original_text
-            has_changes = False
-            
-            # Appliquer chaque remplacement du mapping (balise -> valeur originale)
-            for balise in sorted_tags:
-                valeur_originale = mapping[balise]
-                
-                # Chercher la balise dans toutes les variantes de casse possibles
-                balise_variants = [
-                    balise,           # PRENOM1
-                    balise.lower(),   # prenom1
-                    balise.title(),   # Prenom1
-                    balise.capitalize() # Prenom1 (même résultat que title pour ce cas)
-                ]
-                
-                for variant in balise_variants:
-                    if variant in modified_text:
-                        count_before = modified_text.count(variant)
-                        
-                        # Utiliser une expression régulière pour remplacer la balise exacte (pas de remplacement partiel)
-                        pattern = re.compile(r'\b' + re.escape(variant) + r'\b')
-                        modified_text_new = pattern.sub(valeur_originale, modified_text)
-                        
-                        count_after = modified_text_new.count(variant)
-                        actual_replacements = count_before - count_after
-                        
-                        if actual_replacements > 0:
-                            print(f"✅ Run: {actual_replacements} occurrence(s) de '{variant}' remplacée(s) par '{valeur_originale}'")
-                            modified_text = modified_text_new
-                            has_changes = True
-                            break  # Sortir de la boucle des variants une fois qu'on a trouvé et remplacé
-                        else:
-                            print(f"⚠️ Run: Balise '{variant}' présente mais aucun remplacement de mot entier effectué")
-                            print(f"❌ DEBUG: La balise '{variant}' pourrait être une sous-chaîne d'une autre balise (ex: NOM dans PRENOM)")
-                            # ✅ NE PLUS FAIRE DE FALLBACK avec replace() simple car cela cause le problème PRENOM
-                            # Le fallback replace() sans limites de mots causait: PRENOM1 -> PREHuissoud1
-                            print(f"🚫 Pas de remplacement fallback pour éviter les remplacements partiels dans d'autres balises")
-                            # break supprimé car on continue à chercher les autres variants
-            
-            # Remplacer le texte du run seulement si modifié (le formatage est automatiquement préservé)
-            if has_changes:
-                print(f"📝 Run modifié: '{original_text}' -> '{modified_text}'")
-                run.text = modified_text
-            
-            return has_changes
-        
-        paragraphs_modified = 0
-        runs_modified = 0
-        
-        # Appliquer les dé-anonymisations dans les paragraphes
-        for i, para in enumerate(doc.paragraphs):
-            if para.text.strip():  # Seulement pour les paragraphes non vides
-                para_has_changes = False
-                # Traiter chaque run individuellement pour préserver le formatage
-                for run in para.runs:
-                    if deanonymize_run_preserving_format(run, reverse_mapping, sorted_tags):
-                        runs_modified += 1
-                        para_has_changes = True
-                
-                if para_has_changes:
-                    paragraphs_modified += 1
-        
-        # Traiter également les tableaux
-        cells_modified = 0
-        for table_idx, table in enumerate(doc.tables):
-            for row_idx, row in enumerate(table.rows):
-                for cell_idx, cell in enumerate(row.cells):
-                    for para_idx, para in enumerate(cell.paragraphs):
-                        if para.text.strip():
-                            cell_has_changes = False
-                            # Traiter chaque run individuellement pour préserver le formatage
-                            for run in para.runs:
-                                if deanonymize_run_preserving_format(run, reverse_mapping, sorted_tags):
-                                    runs_modified += 1
-                                    cell_has_changes = True
-                            
-                            if cell_has_changes:
-                                cells_modified += 1
-        
-        print(f"📈 Résultats: {paragraphs_modified} paragraphes, {cells_modified} cellules, {runs_modified} runs modifiés")
-        
-        # Sauvegarder le document modifié en bytes
-        output = io.BytesIO()
-        doc.save(output)
-        output.seek(0)
-        
-        print(f"🏁 DEANONYMIZE_DOCX_FILE - Fichier modifié généré avec succès")
-        return output.getvalue()
-        
-    except Exception as e:
-        print(f"❌ Erreur dans deanonymize_docx_file: {str(e)}")
-        raise Exception(f"Erreur lors de la dé-anonymisation du fichier Word: {str(e)}")
+    return {"fichier": filename, "encodage": encodage} if encodage else {"fichier": filename}
 
-def extract_and_deanonymize_pdf(content: bytes, mapping: Dict[str, str]):
+def encodage_du_retour(filename: str, encodage: Optional[str], projet) -> Optional[str]:
     """
-    Extrait le texte d'un PDF et le dé-anonymise de manière sécurisée.
-    Utilise safe_extract_text_from_pdf pour gérer les erreurs get_text().
+    Encodage source à reprendre à la dé-anonymisation : celui fourni, sinon celui
+    mémorisé dans le projet à l'anonymisation de ce fichier.
     """
-    try:
-        print(f"🔍 EXTRACT_AND_DEANONYMIZE_PDF - Début du traitement sécurisé")
-        print(f"🗂️ Mapping reçu: {mapping}")
-        print(f"📊 Nombre de balises: {len(mapping)}")
-        
-        # Extraction sécurisée du texte
-        text, extraction_success = safe_extract_text_from_pdf(content)
-        
-        if not extraction_success:
-            print(f"⚠️ Extraction partielle ou échec - tentative avec méthode de fallback")
-            # Fallback: essayer l'ancienne méthode pour compatibilité
-            try:
-                with fitz.open(stream=content, filetype="pdf") as pdf:
-                    text = ""
-                    for page_num in range(pdf.page_count):
-                        try:
-                            page = pdf[page_num]
-                            if page is not None:
-                                try:
-                                    page_text = page.get_text()
-                                    text += page_text
-                                except Exception as page_error:
-                                    print(f"⚠️ Erreur get_text page {page_num + 1}: {str(page_error)}")
-                                    # Essayer avec get_text("text")
-                                    try:
-                                        page_text = page.get_text("text")
-                                        text += page_text
-                                    except Exception as page_error2:
-                                        print(f"⚠️ Erreur get_text('text') page {page_num + 1}: {str(page_error2)}")
-                                        # Passer à la page suivante sans arrêter le processus
-                                        continue
-                        except Exception as e:
-                            print(f"⚠️ Erreur traitement page {page_num + 1}: {str(e)}")
-                            continue
-                            
-                print(f"📝 Fallback: {len(text)} caractères extraits")
-            except Exception as fallback_error:
-                print(f"❌ Fallback aussi en échec: {str(fallback_error)}")
-                if not text:  # Si aucun texte n'a été extrait
-                    raise Exception(f"Impossible d'extraire le texte du PDF: {str(fallback_error)}")
-        
-        if not text or len(text.strip()) == 0:
-            print(f"⚠️ Aucun texte extrait du PDF")
-            return ""
-        
-        print(f"📝 Texte extrait: {len(text)} caractères")
-        print(f"📝 Aperçu (premiers 200 chars): {text[:200]}...")
-        
-        # Dé-anonymiser le texte extrait
-        deanonymized = deanonymize_text(text, mapping)
-        
-        print(f"🔓 Dé-anonymisation terminée")
-        return deanonymized
-        
-    except Exception as e:
-        print(f"❌ Erreur dans extract_and_deanonymize_pdf: {str(e)}")
-        raise Exception(f"Erreur lors du traitement du PDF: {str(e)}")
+    if encodage:
+        try:
+            return codecs.lookup(encodage).name
+        except LookupError:
+            raise HTTPException(status_code=400, detail=f"Encodage inconnu: {encodage}")
+    if projet:
+        return projet_store.encodage_source(projet, nom_de_base(filename))
+    return None
 
-def extract_and_deanonymize_docx(content: bytes, mapping: Dict[str, str]):
+def desanonymiser_fichier(filename: str, content: bytes, mapping: Dict[str, str],
+                          progress: Optional[ProgressCallback] = None, encodage: Optional[str] = None):
     """
-    Extrait le texte d'un document Word et le dé-anonymise.
+    Dé-anonymise un fichier selon son format détecté.
+    `encodage` : encodage du fichier source (fichiers texte), voir anonymiser_fichier.
+    
+    Returns:
+        Tuple (contenu dé-anonymisé, nom du fichier produit, type MIME)
     """
-    try:
-        print(f"🔍 EXTRACT_AND_DEANONYMIZE_DOCX - Début du processus")
-        print(f"🗂️ Mapping reçu: {mapping}")
-        
-        # Ouvrir le document Word depuis les bytes
-        doc = Document(io.BytesIO(content))
-        text = ""
-        
-        # Extraire le texte de chaque paragraphe
-        paragraph_count = 0
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text += para.text + "\n"
-                paragraph_count += 1
-        
-        # Extraire le texte des tableaux aussi
-        table_count = 0
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        if para.text.strip():
-                            text += para.text + "\n"
-                            table_count += 1
-        
-        print(f"📝 Texte extrait: {paragraph_count} paragraphes, {table_count} cellules de tableau")
-        print(f"📝 Texte complet (premiers 300 chars): {text[:300]}...")
-        print(f"📊 Longueur totale du texte: {len(text)} caractères")
-            
-        # Dé-anonymiser le texte extrait
-        print(f"🔄 Appel de deanonymize_text...")
-        deanonymized = deanonymize_text(text, mapping)
-        print(f"✅ Désanonymisation terminée")
-        
-        return deanonymized
-        
-    except Exception as e:
-        print(f"❌ Erreur dans extract_and_deanonymize_docx: {str(e)}")
-        raise Exception(f"Erreur lors du traitement du document Word: {str(e)}")
+    handler = format_du_fichier(content)
+    print(f"📄 Traitement fichier {handler.nom}...")
+    
+    # Retirer les suffixes d'anonymisation si présents
+    base_name = nom_de_base(filename)
+    
+    document, _ = handler.apply_replacements(content, mapping=mapping, progress=progress, encodage=encodage)
+    return handler.write(document), f"{base_name}_DESANONYM{handler.suffixe}{handler.extension}", handler.media_type
 
-def extract_and_deanonymize_odt(content: bytes, mapping: Dict[str, str]):
-    """
-    Extrait le texte d'un document OpenDocument Text (ODT) et le dé-anonymise.
-    """
-    try:
-        # Créer un fichier temporaire pour stocker le contenu ODT
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".odt") as temp_file:
-            temp_file.write(content)
-            temp_path = temp_file.name
-        
-        try:
-            # Charger le document ODT
-            doc = load(temp_path)
-            
-            # Extraire le texte du document
-            text = ""
-            
-            # Parcourir tous les éléments de texte dans le document
-            for paragraph in doc.getElementsByType(odf_text.P):
-                text += teletype.extractText(paragraph) + "\n"
-            
-            # Dé-anonymiser le texte extrait
-            deanonymized = deanonymize_text(text, mapping)
-            
-            return deanonymized
-            
-        finally:
-            # Supprimer le fichier temporaire
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-        
-    except Exception as e:
-        raise Exception(f"Erreur lors du traitement du document ODT: {str(e)}") 
+def _job_anonymisation(filename: str, content: bytes, tiers: List[Dict[str, Any]], projet, progress=None):
+    resultat = anonymiser_fichier(filename, content, tiers, progress,
+                                  known=projet_store.balises(projet) if projet else None)
+    if projet:
+        projet_store.enregistrer_operation(projet, "anonymisation_fichier", resultat[3],
+                                           **details_fichier(filename, resultat[4]))
+    return resultat
 
-def anonymize_odt_file(content: bytes, tiers: List[Dict[str, Any]]):
-    """
-    Anonymise directement un fichier ODT en modifiant son contenu.
-    Préserve le formatage et retourne le fichier modifié et le mapping d'anonymisation.
-    """
-    try:
-        print(f"🚀 DEBUG: Début anonymize_odt_file avec {len(tiers)} tiers")
-        
-        # Créer un fichier temporaire pour stocker le contenu ODT
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".odt") as temp_file:
-            temp_file.write(content)
-            temp_path = temp_file.name
-        
-        try:
-            # Charger le document ODT
-            doc = load(temp_path)
-            
-            # Collecter tout le texte du document
-            full_text = ""
-            for paragraph in doc.getElementsByType(odf_text.P):
-                full_text += teletype.extractText(paragraph) + "\n"
-            
-            print(f"📝 DEBUG: Texte extrait (premiers 200 chars): {full_text[:200]}...")
-            
-            # Anonymiser le texte complet pour obtenir le mapping
-            anonymized_text, mapping = anonymize_text(full_text, tiers)
-            
-            print(f"🗂️ DEBUG: Mapping généré: {mapping}")
-            print(f"📝 DEBUG: Texte anonymisé (premiers 200 chars): {anonymized_text[:200]}...")
-            
-            # Appliquer l'anonymisation au document ODT
-            paragraphs_processed = 0
-            for paragraph in doc.getElementsByType(odf_text.P):
-                paragraph_text = teletype.extractText(paragraph)
-                if paragraph_text.strip():
-                    # Anonymiser le texte du paragraphe
-                    anonymized_paragraph = anonymize_text(paragraph_text, tiers)[0]
-                    
-                    # Remplacer le contenu du paragraphe de manière sécurisée
-                    try:
-                        # Vider le paragraphe
-                        paragraph.childNodes = []
-                        # Ajouter le texte anonymisé
-                        paragraph.addText(anonymized_paragraph)
-                        paragraphs_processed += 1
-                    except Exception as e:
-                        print(f"⚠️ DEBUG: Erreur lors du traitement du paragraphe: {str(e)}")
-                        # Continuer avec le paragraphe suivant
-                        continue
-            
-            print(f"📊 DEBUG: Traitement terminé - {paragraphs_processed} paragraphes")
-            
-            # Sauvegarder le document modifié
-            output_path = temp_path + "_anonym"
-            doc.save(output_path)
-            
-            # Lire le fichier anonymisé
-            with open(output_path, 'rb') as f:
-                anonymized_file_content = f.read()
-            
-            # Nettoyer les fichiers temporaires
-            if os.path.exists(output_path):
-                os.unlink(output_path)
-            
-            print(f"✅ DEBUG: Fichier ODT anonymisé généré avec succès")
-            return anonymized_file_content, mapping
-            
-        finally:
-            # Supprimer le fichier temporaire
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-        
-    except Exception as e:
-        print(f"❌ DEBUG: Erreur dans anonymize_odt_file: {str(e)}")
-        raise Exception(f"Erreur lors de l'anonymisation du fichier ODT: {str(e)}")
+def _job_desanonymisation(filename: str, content: bytes, mapping: Dict[str, str], projet,
+                          encodage: Optional[str] = None, progress=None):
+    resultat = desanonymiser_fichier(filename, content, mapping, progress, encodage)
+    if projet:
+        projet_store.enregistrer_operation(projet, "desanonymisation_fichier", fichier=filename)
+    return resultat
 
-def deanonymize_odt_file(content: bytes, mapping: Dict[str, str]):
+def _preparer_anonymisation(content: bytes, tiers: List[Dict[str, Any]], projet_id: Optional[str],
+                            mot_de_passe: Optional[str]):
     """
-    Dé-anonymise directement un fichier ODT en utilisant le mapping fourni.
-    Préserve le formatage et retourne le fichier modifié.
+    Vérifications faites avant de mettre une anonymisation en file (dans le pool de threads :
+    mot de passe PBKDF2, SQLite, reconnaissance du format et import éventuel de son module).
     """
-    try:
-        print(f"🚀 DEBUG: Début deanonymize_odt_file")
-        print(f"🗂️ DEBUG: Mapping reçu: {mapping}")
-        print(f"📊 DEBUG: Nombre de balises dans le mapping: {len(mapping)}")
-        
-        # Créer un fichier temporaire pour stocker le contenu ODT
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".odt") as temp_file:
-            temp_file.write(content)
-            temp_path = temp_file.name
-        
-        try:
-            # Charger le document ODT
-            doc = load(temp_path)
-            
-            # Extraire tout le texte du document pour analyse
-            full_text = ""
-            for paragraph in doc.getElementsByType(odf_text.P):
-                full_text += teletype.extractText(paragraph) + "\n"
-            
-            print(f"📝 DEBUG: Texte extrait (premiers 300 chars): {full_text[:300]}...")
-            
-            # Analyser quelles balises sont présentes dans le texte
-            found_tags = []
-            for tag in mapping.keys():
-                if tag in full_text:
-                    found_tags.append(tag)
-                    print(f"✅ DEBUG: Balise '{tag}' trouvée dans le document")
-                else:
-                    print(f"❌ DEBUG: Balise '{tag}' NON trouvée dans le document")
-            
-            print(f"📋 DEBUG: Résumé: {len(found_tags)}/{len(mapping)} balises trouvées: {found_tags}")
-            
-            # Appliquer la dé-anonymisation au document ODT
-            paragraphs_processed = 0
-            for paragraph in doc.getElementsByType(odf_text.P):
-                paragraph_text = teletype.extractText(paragraph)
-                if paragraph_text.strip():
-                    # Dé-anonymiser le texte du paragraphe
-                    deanonymized_paragraph = deanonymize_text(paragraph_text, mapping)
-                    
-                    # Si le texte a changé, le remplacer
-                    if deanonymized_paragraph != paragraph_text:
-                        try:
-                            # Vider le paragraphe
-                            paragraph.childNodes = []
-                            # Ajouter le texte dé-anonymisé
-                            paragraph.addText(deanonymized_paragraph)
-                            paragraphs_processed += 1
-                        except Exception as e:
-                            print(f"⚠️ DEBUG: Erreur lors du traitement du paragraphe: {str(e)}")
-                            # Continuer avec le paragraphe suivant
-                            continue
-            
-            print(f"📊 DEBUG: Traitement terminé - {paragraphs_processed} paragraphes modifiés")
-            
-            # Sauvegarder le document modifié
-            output_path = temp_path + "_deanonym"
-            doc.save(output_path)
-            
-            # Lire le fichier dé-anonymisé
-            with open(output_path, 'rb') as f:
-                deanonymized_file_content = f.read()
-            
-            # Nettoyer les fichiers temporaires
-            if os.path.exists(output_path):
-                os.unlink(output_path)
-            
-            print(f"✅ DEBUG: Fichier ODT dé-anonymisé généré avec succès")
-            return deanonymized_file_content
-            
-        finally:
-            # Supprimer le fichier temporaire
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-        
-    except Exception as e:
-        print(f"❌ DEBUG: Erreur dans deanonymize_odt_file: {str(e)}")
-        raise Exception(f"Erreur lors de la dé-anonymisation du fichier ODT: {str(e)}") 
+    projet = ouvrir_projet(projet_id, mot_de_passe) if projet_id else None
+    if projet:
+        tiers = tiers_du_projet(projet, tiers)
+    format_du_fichier(content)
+    return projet, tiers
 
-def create_pdf_from_text(text: str, filename: str) -> bytes:
+def _preparer_desanonymisation(content: bytes, filename: str, mapping: Dict[str, str], projet_id: Optional[str],
+                               mot_de_passe: Optional[str], encodage: Optional[str]):
     """
-    Crée un nouveau PDF à partir du texte fourni en utilisant reportlab.
-    Préserve les sauts de ligne et la mise en forme basique.
+    Équivalent de _preparer_anonymisation pour la dé-anonymisation.
     """
-    try:
-        print(f"🚀 CREATE_PDF_FROM_TEXT - Début de la génération PDF")
-        print(f"📄 Nom du fichier: {filename}")
-        print(f"📝 Longueur du texte: {len(text)} caractères")
-        
-        # Créer un buffer en mémoire pour le PDF
-        buffer = io.BytesIO()
-        
-        # Créer le document PDF
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=72,  # 1 inch
-            leftMargin=72,   # 1 inch
-            topMargin=72,    # 1 inch
-            bottomMargin=72  # 1 inch
-        )
-        
-        # Définir les styles
-        styles = getSampleStyleSheet()
-        
-        # Style pour le titre
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Title'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1  # Centré
-        )
-        
-        # Style pour le texte normal
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=11,
-            leading=14,  # Espacement entre les lignes
-            spaceAfter=12,
-            alignment=0  # Justifié à gauche
-        )
-        
-        # Construire le contenu du PDF
-        story = []
-        
-        # Ajouter le titre
-        title = f"Document traité - {filename}"
-        story.append(Paragraph(title, title_style))
-        story.append(Spacer(1, 20))
-        
-        # Diviser le texte en paragraphes
-        paragraphs = text.split('\n')
-        
-        paragraph_count = 0
-        for para_text in paragraphs:
-            para_text = para_text.strip()
-            if para_text:  # Ignorer les lignes vides
-                # Échapper les caractères spéciaux pour reportlab
-                para_text = para_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                
-                # Ajouter le paragraphe
-                story.append(Paragraph(para_text, normal_style))
-                paragraph_count += 1
-            else:
-                # Ajouter un espacement pour les lignes vides
-                story.append(Spacer(1, 6))
-        
-        print(f"📊 Nombre de paragraphes traités: {paragraph_count}")
-        
-        # Générer le PDF
-        doc.build(story)
-        
-        # Récupérer les bytes du PDF
-        buffer.seek(0)
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
-        
-        print(f"✅ PDF généré avec succès, taille: {len(pdf_bytes)} bytes")
-        return pdf_bytes
-        
-    except Exception as e:
-        print(f"❌ Erreur lors de la génération du PDF: {str(e)}")
-        raise Exception(f"Erreur lors de la génération du PDF: {str(e)}")
+    projet = ouvrir_projet(projet_id, mot_de_passe) if projet_id else None
+    if projet and not mapping:
+        mapping = mapping_du_projet(projet)
+    encodage = encodage_du_retour(filename, encodage, projet)
+    format_du_fichier(content)
+    return projet, mapping, encodage
 
-def anonymize_pdf_file(content: bytes, tiers: List[Dict[str, Any]]):
+@app.post("/jobs/anonymize/file")
+async def anonymize_file_job(
+    file: UploadFile = File(...),
+    tiers_json: str = Form("[]"),
+    projet_id: Optional[str] = Form(None),
+    mot_de_passe: Optional[str] = Form(None)
+):
     """
-    Anonymise un fichier PDF en extrayant le texte, l'anonymisant, 
-    puis générant un nouveau PDF avec le texte anonymisé.
+    Met en file l'anonymisation d'un fichier et retourne immédiatement l'identifiant de la tâche.
     """
-    try:
-        print(f"🚀 ANONYMIZE_PDF_FILE - Début du traitement")
-        print(f"👥 Nombre de tiers: {len(tiers)}")
-        
-        # Extraire le texte du PDF original de manière sécurisée
-        text, extraction_success = safe_extract_text_from_pdf(content)
-        
-        if not extraction_success:
-            print(f"⚠️ Extraction partielle ou échec - tentative avec méthode de fallback")
-            # Fallback: essayer l'ancienne méthode pour compatibilité
-            try:
-                with fitz.open(stream=content, filetype="pdf") as pdf:
-                    text = ""
-                    page_count = 0
-                    for page_num in range(pdf.page_count):
-                        try:
-                            page = pdf[page_num]
-                            if page is not None:
-                                try:
-                                    page_text = page.get_text()
-                                    text += page_text
-                                    page_count += 1
-                                except Exception as page_error:
-                                    print(f"⚠️ Erreur get_text page {page_num + 1}: {str(page_error)}")
-                                    # Essayer avec get_text("text")
-                                    try:
-                                        page_text = page.get_text("text")
-                                        text += page_text
-                                        page_count += 1
-                                    except Exception as page_error2:
-                                        print(f"⚠️ Erreur get_text('text') page {page_num + 1}: {str(page_error2)}")
-                                        # Passer à la page suivante sans arrêter le processus
-                                        continue
-                        except Exception as e:
-                            print(f"⚠️ Erreur traitement page {page_num + 1}: {str(e)}")
-                            continue
-                            
-                print(f"📝 Fallback: {len(text)} caractères extraits de {page_count} pages")
-            except Exception as fallback_error:
-                print(f"❌ Fallback aussi en échec: {str(fallback_error)}")
-                if not text:  # Si aucun texte n'a été extrait
-                    raise Exception(f"Impossible d'extraire le texte du PDF: {str(fallback_error)}")
-        else:
-            # Compter les pages pour les logs
-            try:
-                with fitz.open(stream=content, filetype="pdf") as pdf:
-                    page_count = pdf.page_count
-            except:
-                page_count = "inconnu"
-        
-        if not text or len(text.strip()) == 0:
-            print(f"⚠️ Aucun texte extrait du PDF")
-            return b"", {}
-        
-        print(f"📄 Texte extrait de {page_count} pages")
-        print(f"📝 Longueur du texte extrait: {len(text)} caractères")
-        
-        # Anonymiser le texte
-        anonymized_text, mapping = anonymize_text(text, tiers)
-        
-        print(f"🔒 Texte anonymisé, {len(mapping)} remplacements")
-        
-        # Générer le nouveau PDF avec le texte anonymisé
-        pdf_bytes = create_pdf_from_text(anonymized_text, "document_anonymise.pdf")
-        
-        print(f"✅ PDF anonymisé généré avec succès")
-        return pdf_bytes, mapping
-        
-    except Exception as e:
-        print(f"❌ Erreur dans anonymize_pdf_file: {str(e)}")
-        raise Exception(f"Erreur lors de l'anonymisation du fichier PDF: {str(e)}")
+    filename = file.filename or ""
+    tiers = json.loads(tiers_json)
+    content = await file.read()
+    # La boucle d'événements reste libre : seules la lecture du fichier et la mise en file y ont lieu
+    projet, tiers = await run_in_threadpool(_preparer_anonymisation, content, tiers, projet_id, mot_de_passe)
+    job = job_manager.soumettre("anonymisation", filename, _job_anonymisation, filename, content, tiers, projet)
+    print(f"📥 Tâche d'anonymisation {job.id} mise en file: {filename}")
+    return job.resume()
 
-def deanonymize_pdf_file(content: bytes, mapping: Dict[str, str]):
-    """
-    Dé-anonymise un fichier PDF en extrayant le texte, le dé-anonymisant,
-    puis générant un nouveau PDF avec le texte dé-anonymisé.
+@app.post("/jobs/deanonymize/file")
+async def deanonymize_file_job(
+    file: UploadFile = File(...),
+    mapping_json: str = Form("{}"),
+    projet_id: Optional[str] = Form(None),
+    mot_de_passe: Optional[str] = Form(None),
+    encodage: Optional[str] = Form(None)
+):
     """
+    Met en file la dé-anonymisation d'un fichier et retourne immédiatement l'identifiant de la tâche.
+    Sans mapping fourni, utilise celui mémorisé dans le projet ; sans encodage, celui mémorisé pour ce fichier.
+    """
+    filename = file.filename or ""
+    mapping = json.loads(mapping_json)
+    content = await file.read()
+    projet, mapping, encodage = await run_in_threadpool(_preparer_desanonymisation, content, filename, mapping,
+                                                        projet_id, mot_de_passe, encodage)
+    job = job_manager.soumettre("desanonymisation", filename, _job_desanonymisation, filename, content, mapping, projet,
+                                encodage)
+    print(f"📥 Tâche de dé-anonymisation {job.id} mise en file: {filename}")
+    return job.resume()
+
+def obtenir_job(job_id: str):
     try:
-        print(f"🚀 DEANONYMIZE_PDF_FILE - Début du traitement")
-        print(f"🗂️ Mapping reçu: {mapping}")
-        print(f"📊 Nombre de balises dans le mapping: {len(mapping)}")
-        
-        # Extraire le texte du PDF anonymisé
-        with fitz.open(stream=content, filetype="pdf") as pdf:
-            text = ""
-            page_count = 0
-            for page in pdf:
-                text += page.get_text()
-                page_count += 1
-        
-        print(f"📄 Texte extrait de {page_count} pages")
-        print(f"📝 Longueur du texte extrait: {len(text)} caractères")
-        
-        # Dé-anonymiser le texte
-        deanonymized_text = deanonymize_text(text, mapping)
-        
-        print(f"🔓 Texte dé-anonymisé")
-        
-        # Générer le nouveau PDF avec le texte dé-anonymisé
-        pdf_bytes = create_pdf_from_text(deanonymized_text, "document_desanonymise.pdf")
-        
-        print(f"✅ PDF dé-anonymisé généré avec succès")
-        return pdf_bytes
-        
-    except Exception as e:
-        print(f"❌ Erreur dans deanonymize_pdf_file: {str(e)}")
-        raise Exception(f"Erreur lors de la dé-anonymisation du fichier PDF: {str(e)}") 
+        return job_manager.obtenir(job_id)
+    except JobIntrouvable:
+        raise HTTPException(status_code=404, detail="Tâche introuvable ou expirée")
 
-def extract_pdf_elements(doc):
+@app.get("/jobs/{job_id}")
+def get_job_endpoint(job_id: str):
+    """
+    État d'une tâche : étape, élément courant et total (pages, paragraphes...).
+    Le mapping (et l'encodage source des fichiers texte) est joint une fois l'anonymisation terminée.
+    """
+    job = obtenir_job(job_id)
+    etat = job.resume()
+    if job.statut == TERMINE and job.operation == "anonymisation":
+        etat["mapping"] = job.resultat[3]
+        if job.resultat[4]:
+            etat["encodage"] = job.resultat[4]
+    return etat
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str):
     """
-    Extrait tous les éléments du PDF : texte, images, graphiques avec leurs positions.
+    Flux d'événements (Server-Sent Events) de l'avancement d'une tâche :
+    un événement "progression" à chaque changement (étape, index, total, ETA),
+    puis un événement "fin" avec le statut final.
     """
-    pdf_elements = []
+    job = obtenir_job(job_id)
     
-    for page_num in range(doc.page_count):
-        page = doc[page_num]
-        page_elements = {
-            "page_number": page_num,
-            "page_size": page.rect,
-            "text_elements": [],
-            "images": [],
-            "drawings": []
-        }
-        
-        # Extraire le texte avec positions exactes
-        text_dict = page.get_text("dict")
-        for block in text_dict.get("blocks", []):
-            if "lines" in block:  # Bloc de texte
-                for line in block["lines"]:
-                    for span in line["spans"]:
-                        text_element = {
-                            "text": span["text"],
-                            "bbox": span["bbox"],
-                            "font": span["font"],
-                            "size": span["size"],
-                            "flags": span["flags"],
-                            "color": span.get("color", 0)
-                        }
-                        page_elements["text_elements"].append(text_element)
-        
-        # Extraire les images
-        image_list = page.get_images()
-        for img_index, img in enumerate(image_list):
-            try:
-                xref = img[0]
-                pix = fitz.Pixmap(doc, xref)
-                if pix.n < 5:  # GRAY or RGB
-                    img_data = pix.tobytes("png")
-                else:  # CMYK: convert first
-                    pix1 = fitz.Pixmap(fitz.csRGB, pix)
-                    img_data = pix1.tobytes("png")
-                    pix1 = None
-                
-                # Obtenir la position de l'image sur la page
-                img_rect = page.get_image_bbox(img)
-                
-                image_element = {
-                    "data": img_data,
-                    "bbox": img_rect,
-                    "xref": xref
-                }
-                page_elements["images"].append(image_element)
-                pix = None
-            except Exception as e:
-                print(f"⚠️ Erreur lors de l'extraction d'image: {e}")
-        
-        # Extraire les dessins/graphiques vectoriels
-        try:
-            drawings = page.get_drawings()
-            for drawing in drawings:
-                page_elements["drawings"].append(drawing)
-        except Exception as e:
-            print(f"⚠️ Erreur lors de l'extraction des dessins: {e}")
-        
-        pdf_elements.append(page_elements)
+    async def evenements():
+        version = -1
+        derniere_emission = time.monotonic()
+        while True:
+            if job.version != version:
+                version = job.version
+                evenement = "fin" if job.termine else "progression"
+                yield f"event: {evenement}\ndata: {json.dumps(job.resume(), ensure_ascii=False)}\n\n"
+                derniere_emission = time.monotonic()
+                if job.termine:
+                    return
+            elif time.monotonic() - derniere_emission > SSE_KEEPALIVE:
+                # Commentaire SSE : garde la connexion ouverte derrière les proxys
+                yield ": ping\n\n"
+                derniere_emission = time.monotonic()
+            await asyncio.sleep(SSE_INTERVALLE)
     
-    return pdf_elements
+    return StreamingResponse(
+        evenements(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-def anonymize_pdf_secure_with_graphics(pdf_content: bytes, tiers: List[Any]) -> tuple[bytes, Dict[str, str]]:
-    """
-    Anonymise un PDF de manière sécurisée en remplaçant RÉELLEMENT le texte
-    tout en préservant images, graphiques et mise en page exacte.
-    
-    Méthode sécurisée :
-    1. Extrait tous les éléments (texte, images, graphiques)
-    2. Remplace le texte de manière irréversible
-    3. Reconstitue le PDF avec reportlab en préservant la mise en page
-    """
-    try:
-        print(f"🔒 ANONYMIZE_PDF_SECURE_WITH_GRAPHICS - Début du traitement sécurisé")
-        
-        # Ouvrir le PDF original
-        doc = fitz.open(stream=pdf_content, filetype="pdf")
-        mapping = {}
-        replacement_counter = 1
-        
-        print(f"📄 PDF ouvert: {doc.page_count} pages")
-        
-        # Créer les remplacements basés sur les tiers
-        replacements = {}
-        for tiers_data in tiers:
-            numero = tiers_data.get('numero', replacement_counter)
-            print(f"🔍 DEBUG - Traitement tiers numéro {numero}: {tiers_data}")
-            
-            if tiers_data.get('nom'):
-                original_nom = tiers_data['nom'].strip()
-                anonymized_nom = f"NOM{numero}"  # ✅ CORRIGÉ: MAJUSCULES comme le reste du système
-                replacements[original_nom] = anonymized_nom
-                mapping[anonymized_nom] = original_nom
-                print(f"📝 DEBUG - Nom: '{original_nom}' -> '{anonymized_nom}' (CORRIGÉ: majuscules!)")
-                
-            if tiers_data.get('prenom'):
-                original_prenom = tiers_data['prenom'].strip()
-                anonymized_prenom = f"PRENOM{numero}"  # ✅ CORRIGÉ: MAJUSCULES comme le reste du système
-                replacements[original_prenom] = anonymized_prenom
-                mapping[anonymized_prenom] = original_prenom
-                print(f"📝 DEBUG - Prénom: '{original_prenom}' -> '{anonymized_prenom}' (CORRIGÉ: majuscules!)")
-                
-            if tiers_data.get('adresse'):
-                original_adresse = tiers_data['adresse'].strip()
-                anonymized_adresse = f"ADRESSE{numero}"  # ✅ CORRIGÉ: MAJUSCULES comme le reste du système
-                replacements[original_adresse] = anonymized_adresse
-                mapping[anonymized_adresse] = original_adresse
-                print(f"📝 DEBUG - Adresse: '{original_adresse}' -> '{anonymized_adresse}' (CORRIGÉ: majuscules!)")
-            
-            # Ajouter support pour les autres champs pour être cohérent avec anonymize_text()
-            if tiers_data.get('telephone'):
-                original_tel = tiers_data['telephone'].strip()
-                anonymized_tel = f"TEL{numero}"
-                replacements[original_tel] = anonymized_tel
-                mapping[anonymized_tel] = original_tel
-                print(f"📝 DEBUG - Téléphone: '{original_tel}' -> '{anonymized_tel}'")
-            
-            if tiers_data.get('portable'):
-                original_portable = tiers_data['portable'].strip()
-                anonymized_portable = f"PORTABLE{numero}"
-                replacements[original_portable] = anonymized_portable
-                mapping[anonymized_portable] = original_portable
-                print(f"📝 DEBUG - Portable: '{original_portable}' -> '{anonymized_portable}'")
-            
-            if tiers_data.get('email'):
-                original_email = tiers_data['email'].strip()
-                anonymized_email = f"EMAIL{numero}"
-                replacements[original_email] = anonymized_email
-                mapping[anonymized_email] = original_email
-                print(f"📝 DEBUG - Email: '{original_email}' -> '{anonymized_email}'")
-            
-            if tiers_data.get('societe'):
-                original_societe = tiers_data['societe'].strip()
-                anonymized_societe = f"SOCIETE{numero}"
-                replacements[original_societe] = anonymized_societe
-                mapping[anonymized_societe] = original_societe
-                print(f"📝 DEBUG - Société: '{original_societe}' -> '{anonymized_societe}'")
-                
-            replacement_counter += 1
-        
-        print(f"🔄 {len(replacements)} remplacements à effectuer")
-        
-        # Extraire tous les éléments du PDF
-        pdf_elements = extract_pdf_elements(doc)
-        doc.close()  # Fermer le document original
-        
-        # Anonymiser le texte dans les éléments extraits
-        for page_data in pdf_elements:
-            for text_element in page_data["text_elements"]:
-                original_text = text_element["text"]
-                anonymized_text = original_text
-                
-                # Appliquer tous les remplacements
-                for original, anonymized in replacements.items():
-                    if original.lower() in anonymized_text.lower():
-                        anonymized_text = anonymized_text.replace(original, anonymized)
-                        print(f"🔄 Remplacement sécurisé: '{original}' → '{anonymized}'")
-                
-                # Remplacer DÉFINITIVEMENT le texte
-                text_element["text"] = anonymized_text
-        
-        # Reconstituer le PDF avec reportlab
-        buffer = io.BytesIO()
-        
-        # Utiliser reportlab pour créer le nouveau PDF
-        from reportlab.pdfgen import canvas as rl_canvas
-        
-        # Créer le document avec la taille de la première page
-        first_page = pdf_elements[0] if pdf_elements else None
-        if first_page:
-            page_size = (first_page["page_size"].width, first_page["page_size"].height)
-        else:
-            page_size = A4
-            
-        c = rl_canvas.Canvas(buffer, pagesize=page_size)
-        
-        # Reconstituer chaque page
-        for page_data in pdf_elements:
-            page_size = (page_data["page_size"].width, page_data["page_size"].height)
-            c.setPageSize(page_size)
-            
-            # Ajouter les images d'abord (arrière-plan)
-            for image_element in page_data["images"]:
-                try:
-                    img_data = image_element["data"]
-                    bbox = image_element["bbox"]
-                    
-                    # Créer un ImageReader à partir des données PNG
-                    img_reader = ImageReader(io.BytesIO(img_data))
-                    
-                    # Dessiner l'image à sa position exacte
-                    c.drawImage(
-                        img_reader,
-                        bbox.x0, page_size[1] - bbox.y1,  # Conversion coordonnées
-                        width=bbox.width,
-                        height=bbox.height
-                    )
-                except Exception as e:
-                    print(f"⚠️ Erreur lors de l'ajout d'image: {e}")
-            
-            # Ajouter les dessins vectoriels
-            for drawing in page_data["drawings"]:
-                try:
-                    # Simplification : dessiner les formes basiques
-                    if drawing.get("type") == "l":  # Ligne
-                        points = drawing.get("items", [])
-                        if len(points) >= 2:
-                            c.line(points[0][1][0], page_size[1] - points[0][1][1],
-                                  points[1][1][0], page_size[1] - points[1][1][1])
-                    elif drawing.get("type") == "re":  # Rectangle
-                        rect = drawing.get("rect")
-                        if rect:
-                            c.rect(rect[0], page_size[1] - rect[3], 
-                                  rect[2] - rect[0], rect[3] - rect[1])
-                except Exception as e:
-                    print(f"⚠️ Erreur lors de l'ajout de dessin: {e}")
-            
-            # Ajouter le texte anonymisé avec la mise en forme exacte
-            for text_element in page_data["text_elements"]:
-                try:
-                    text = text_element["text"].strip()
-                    if not text:
-                        continue
-                        
-                    bbox = text_element["bbox"]
-                    font_size = text_element["size"]
-                    
-                    # Convertir les coordonnées (PDF vs reportlab)
-                    x = bbox[0]
-                    y = page_size[1] - bbox[3]  # Inverser Y
-                    
-                    # Appliquer la police et la taille
-                    c.setFont("Helvetica", font_size)
-                    
-                    # Dessiner le texte à la position exacte
-                    c.drawString(x, y, text)
-                    
-                except Exception as e:
-                    print(f"⚠️ Erreur lors de l'ajout de texte: {e}")
-            
-            # Passer à la page suivante
-            c.showPage()
-        
-        # Finaliser le PDF
-        c.save()
-        pdf_bytes = buffer.getvalue()
-        
-        print(f"✅ PDF anonymisé sécurisé avec graphiques préservés généré")
-        print(f"🗂️ Mapping créé avec {len(mapping)} entrées")
-        
-        return pdf_bytes, mapping
-        
-    except Exception as e:
-        print(f"❌ Erreur dans anonymize_pdf_secure_with_graphics: {str(e)}")
-        raise Exception(f"Erreur lors de l'anonymisation sécurisée du PDF: {str(e)}")
-
-def deanonymize_pdf_secure_with_graphics(pdf_content: bytes, mapping: Dict[str, str]) -> bytes:
-    """
-    Dé-anonymise un PDF en restaurant le texte original de manière sécurisée
-    tout en préservant les images et graphiques.
-    """
-    try:
-        print(f"🔒 DEANONYMIZE_PDF_SECURE_WITH_GRAPHICS - Début du traitement")
-        print(f"📊 DEBUG - Mapping reçu: {mapping}")
-        print(f"📊 DEBUG - Nombre de balises dans le mapping: {len(mapping)}")
-        
-        # Analyser le mapping pour identifier le problème de casse
-        for tag, original in mapping.items():
-            if tag.islower():
-                print(f"❌ DEBUG - PROBLÈME DE CASSE DÉTECTÉ: balise '{tag}' en minuscules (devrait être en majuscules)")
-            else:
-                print(f"✅ DEBUG - Balise correcte: '{tag}' en majuscules")
-        
-        # Créer les remplacements inverses
-        reverse_replacements = {anonymized: original for anonymized, original in mapping.items()}
-        print(f"🔄 DEBUG - Remplacements inverses créés: {reverse_replacements}")
-        
-        # Même processus que l'anonymisation mais avec les remplacements inversés
-        doc = fitz.open(stream=pdf_content, filetype="pdf")
-        
-        # Extraire tous les éléments
-        pdf_elements = extract_pdf_elements(doc)
-        doc.close()
-        
-        # Dé-anonymiser le texte
-        for page_data in pdf_elements:
-            for text_element in page_data["text_elements"]:
-                anonymized_text = text_element["text"]
-                restored_text = anonymized_text
-                
-                # ✅ CORRECTION: Appliquer les remplacements inverses avec limites de mots
-                # Trier par longueur décroissante pour éviter les remplacements partiels
-                sorted_anonymized = sorted(reverse_replacements.keys(), key=len, reverse=True)
-                
-                for anonymized in sorted_anonymized:
-                    original = reverse_replacements[anonymized]
-                    if anonymized in restored_text:
-                        # Utiliser une expression régulière avec limites de mots pour éviter 
-                        # le problème PRENOM1 -> PREHuissoud1 quand on remplace NOM1
-                        pattern = re.compile(r'\b' + re.escape(anonymized) + r'\b')
-                        if pattern.search(restored_text):
-                            restored_text = pattern.sub(original, restored_text)
-                            print(f"✅ Restauration avec limites de mots: '{anonymized}' → '{original}'")
-                        else:
-                            print(f"⚠️ Balise '{anonymized}' trouvée mais pas en tant que mot entier (probablement dans une autre balise)")
-                
-                text_element["text"] = restored_text
-        
-        # Reconstituer le PDF (même logique que l'anonymisation)
-        buffer = io.BytesIO()
-        from reportlab.pdfgen import canvas as rl_canvas
-        
-        first_page = pdf_elements[0] if pdf_elements else None
-        if first_page:
-            page_size = (first_page["page_size"].width, first_page["page_size"].height)
-        else:
-            page_size = A4
-            
-        c = rl_canvas.Canvas(buffer, pagesize=page_size)
-        
-        # Reconstituer chaque page avec le texte restauré
-        for page_data in pdf_elements:
-            page_size = (page_data["page_size"].width, page_data["page_size"].height)
-            c.setPageSize(page_size)
-            
-            # Images
-            for image_element in page_data["images"]:
-                try:
-                    img_data = image_element["data"]
-                    bbox = image_element["bbox"]
-                    img_reader = ImageReader(io.BytesIO(img_data))
-                    c.drawImage(
-                        img_reader,
-                        bbox.x0, page_size[1] - bbox.y1,
-                        width=bbox.width,
-                        height=bbox.height
-                    )
-                except Exception as e:
-                    print(f"⚠️ Erreur image: {e}")
-            
-            # Dessins
-            for drawing in page_data["drawings"]:
-                try:
-                    if drawing.get("type") == "l":
-                        points = drawing.get("items", [])
-                        if len(points) >= 2:
-                            c.line(points[0][1][0], page_size[1] - points[0][1][1],
-                                  points[1][1][0], page_size[1] - points[1][1][1])
-                    elif drawing.get("type") == "re":
-                        rect = drawing.get("rect")
-                        if rect:
-                            c.rect(rect[0], page_size[1] - rect[3], 
-                                  rect[2] - rect[0], rect[3] - rect[1])
-                except Exception as e:
-                    print(f"⚠️ Erreur dessin: {e}")
-            
-            # Texte restauré
-            for text_element in page_data["text_elements"]:
-                try:
-                    text = text_element["text"].strip()
-                    if not text:
-                        continue
-                        
-                    bbox = text_element["bbox"]
-                    font_size = text_element["size"]
-                    x = bbox[0]
-                    y = page_size[1] - bbox[3]
-                    
-                    c.setFont("Helvetica", font_size)
-                    c.drawString(x, y, text)
-                    
-                except Exception as e:
-                    print(f"⚠️ Erreur texte: {e}")
-            
-            c.showPage()
-        
-        c.save()
-        pdf_bytes = buffer.getvalue()
-        
-        print(f"✅ PDF dé-anonymisé sécurisé généré")
-        return pdf_bytes
-        
-    except Exception as e:
-        print(f"❌ Erreur dans deanonymize_pdf_secure_with_graphics: {str(e)}")
-        raise Exception(f"Erreur lors de la dé-anonymisation sécurisée: {str(e)}") 
-        
\ No newline at end of file
+@app.get("/jobs/{job_id}/result")
+def get_job_result_endpoint(job_id: str):
+    """
+    Télécharge le fichier produit par une tâche terminée.
+    """
+    job = obtenir_job(job_id)
+    if job.statut == ERREUR:
+        raise HTTPException(status_code=500, detail=job.erreur)
+    if job.statut != TERMINE:
+        raise HTTPException(status_code=409, detail=f"Tâche non terminée ({job.statut})")
+    contenu, nom_fichier, media_type = job.resultat[:3]
+    return StreamingResponse(
+        io.BytesIO(contenu),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={nom_fichier}"}
+    )
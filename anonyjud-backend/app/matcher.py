@@ -0,0 +1,299 @@
+"""
+Table déclarative des champs de tiers et matcher compilé
+Un seul motif par ensemble de tiers, partagé par le texte, les mappings et les PDF
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .normalize import collapse_whitespace, fold_text, fold_value
+from .pattern_cache import compiler
+from .phone_index import PHONE_RUN_PATTERN, PhoneIndex
+
+class FieldSpec(NamedTuple):
+    """
+    Description déclarative d'un champ de tiers à anonymiser.
+
+    Attributes:
+        keys: clés du tiers à lire, la première non vide est retenue
+        prefix: préfixe de la balise (NOM -> NOM1)
+        min_length: longueur minimale de la valeur (après strip)
+        mode: "insensitive" (casse, accents et espaces ignorés), "exact" (littéral à la
+              casse près, blancs multiples tolérés : emails, identifiants) ou "phone"
+              (index des numéros normalisés)
+        requires: sous-chaîne obligatoire dans la valeur (ex: "@" pour l'email)
+    """
+    keys: Tuple[str, ...]
+    prefix: str
+    min_length: int
+    mode: str
+    requires: str = ""
+
+# Ordre historique des champs dans anonymize_text / generate_mapping_from_tiers
+FIELD_SPECS: Tuple[FieldSpec, ...] = (
+    FieldSpec(("nom",), "NOM", 2, "insensitive"),
+    FieldSpec(("prenom",), "PRENOM", 2, "insensitive"),
+    FieldSpec(("adresse_numero",), "NUMERO", 1, "insensitive"),
+    FieldSpec(("adresse_voie",), "VOIE", 3, "insensitive"),
+    FieldSpec(("adresse_code_postal",), "CODEPOSTAL", 1, "exact"),
+    FieldSpec(("adresse_ville", "ville"), "VILLE", 2, "insensitive"),
+    FieldSpec(("adresse",), "ADRESSE", 6, "exact"),
+    FieldSpec(("telephone",), "TEL", 6, "phone"),
+    FieldSpec(("portable",), "PORTABLE", 6, "phone"),
+    FieldSpec(("email",), "EMAIL", 1, "exact", requires="@"),
+    FieldSpec(("societe",), "SOCIETE", 2, "insensitive"),
+)
+
+# Champs personnalisés (nouveau format customFields et ancien champPerso)
+CUSTOM_FIELD_MIN_LENGTH = 2
+CUSTOM_FIELD_MODE = "insensitive"
+
+# Nombre d'ensembles de tiers compilés gardés en mémoire
+MATCHER_CACHE_SIZE = 64
+
+def custom_label_prefix(label: Any) -> str:
+    """
+    Convertit le libellé d'un champ personnalisé en préfixe de balise (lettres majuscules),
+    "PERSO" à défaut.
+    """
+    if label and isinstance(label, str):
+        label_perso = label.strip()
+        if label_perso:
+            label_base = re.sub(r'[^A-Za-z]', '', label_perso.upper())
+            if label_base:
+                return label_base
+    return "PERSO"
+
+def iter_tier_fields(tiers: List[Dict[str, Any]]) -> Iterator[Tuple[str, str, str]]:
+    """
+    Parcourt les tiers selon la table FIELD_SPECS.
+
+    Yields:
+        Tuples (balise, valeur, mode) dans l'ordre historique de traitement
+    """
+    for tier_index, tier in enumerate(tiers):
+        # Utiliser le numéro fixe du tiers ou fallback sur l'index + 1
+        tier_number = tier.get("numero", tier_index + 1)
+
+        for spec in FIELD_SPECS:
+            value = next((tier.get(key) for key in spec.keys if tier.get(key)), None)
+            if not value or not isinstance(value, str):
+                continue
+            value = value.strip()
+            if len(value) < spec.min_length or (spec.requires and spec.requires not in value):
+                continue
+            yield f"{spec.prefix}{tier_number}", value, spec.mode
+
+        # Champs personnalisés (nouveau format)
+        if tier.get("customFields") and isinstance(tier["customFields"], list):
+            for custom_field in tier["customFields"]:
+                if not isinstance(custom_field, dict):
+                    continue
+                champ_value = custom_field.get("value")
+                if champ_value and isinstance(champ_value, str):
+                    champ_value = champ_value.strip()
+                    if len(champ_value) >= CUSTOM_FIELD_MIN_LENGTH:
+                        tag = f"{custom_label_prefix(custom_field.get('label'))}{tier_number}"
+                        yield tag, champ_value, CUSTOM_FIELD_MODE
+
+        # Champ personnalisé (ancien format pour compatibilité)
+        champ_perso = tier.get("champPerso")
+        if champ_perso and isinstance(champ_perso, str):
+            champ_perso = champ_perso.strip()
+            if len(champ_perso) >= CUSTOM_FIELD_MIN_LENGTH:
+                tag = f"{custom_label_prefix(tier.get('labelChampPerso'))}{tier_number}"
+                yield tag, champ_perso, CUSTOM_FIELD_MODE
+
+def _value_pattern(folded: str) -> str:
+    """
+    Motif regex d'une valeur repliée, à appliquer sur le texte replié.
+    Les blancs ne sont tolérés (multiples, sauts de ligne) que là où la valeur en contient :
+    "Laporte" ne doit pas trouver "la porte".
+    """
+    return r'\s+'.join(re.escape(word) for word in folded.split(" "))
+
+def _whole_words(source: str) -> str:
+    """
+    Alternative de valeurs limitée aux mots entiers ("Jean" ne touche pas "Jeanne"),
+    y compris pour une valeur qui commence ou finit par une ponctuation.
+    """
+    return r'(?<!\w)(?:' + source + r')(?!\w)'
+
+class CompiledMatcher:
+    """
+    Matcher compilé une seule fois pour un ensemble de tiers.
+
+    Toutes les valeurs sont réunies dans une seule alternative (les plus longues
+    d'abord) : un seul passage de regex remplace toutes les valeurs de tous les tiers.
+    Les téléphones ne sont pas dans l'alternative : les suites de chiffres sont
+    reconnues par un motif unique puis cherchées dans l'index des numéros normalisés.
+
+    La recherche se fait sur le texte replié (voir normalize.py) : accents, casse et
+    blancs multiples n'empêchent plus la correspondance, et les positions trouvées
+    sont reportées sur le texte original.
+    """
+    def __init__(self, fields: List[Tuple[str, str, str]]):
+        self.mapping: Dict[str, str] = {}
+        # Valeurs exactes : forme repliée -> {valeur aux blancs fusionnés, sans casse -> balise}
+        self._exact: Dict[str, Dict[str, str]] = {}
+        # Valeurs insensibles : forme repliée sans espaces -> balise
+        self._folded: Dict[str, str] = {}
+        self.phones = PhoneIndex()
+        patterns: Dict[str, str] = {}
+        insensitive: Set[str] = set()
+
+        for tag, value, mode in fields:
+            self.mapping[tag] = value
+            if mode == "phone":
+                self.phones.add(value, tag)
+                continue
+            folded = fold_value(value)
+            if not folded:
+                continue
+            if mode == "insensitive":
+                self._folded.setdefault(folded.replace(" ", ""), tag)
+                insensitive.add(folded)
+            else:
+                self._exact.setdefault(folded, {}).setdefault(collapse_whitespace(value).casefold(), tag)
+            patterns.setdefault(folded, _value_pattern(folded))
+
+        # Les valeurs les plus longues d'abord pour éviter les remplacements partiels
+        ordered = sorted(patterns, key=len, reverse=True)
+        values_source = _whole_words('|'.join(patterns[f] for f in ordered)) if ordered else ""
+        self._values_pattern: Optional[re.Pattern] = compiler(values_source) if ordered else None
+        insensitive_source = '|'.join(patterns[f] for f in ordered if f in insensitive)
+        self._insensitive_pattern: Optional[re.Pattern] = compiler(_whole_words(insensitive_source)) if insensitive_source else None
+
+        alternatives = []
+        if self.phones:
+            alternatives.append(f'(?P<phone>{PHONE_RUN_PATTERN})')
+        if values_source:
+            alternatives.append(values_source)
+        self.pattern: Optional[re.Pattern] = compiler('|'.join(alternatives)) if alternatives else None
+
+    def _tag_for(self, found: str, original: str) -> Optional[str]:
+        exact = self._exact.get(found)
+        if exact is not None:
+            tag = exact.get(collapse_whitespace(original).casefold())
+            if tag is not None:
+                return tag
+        return self._folded.get(found.replace(" ", ""))
+
+    def _iter_replacements(self, text: str, pattern: "re.Pattern") -> Iterator[Tuple[int, int, str]]:
+        """
+        Balaye une seule fois le texte replié.
+
+        Yields:
+            Tuples (début, fin, remplacement) dans le texte original
+        """
+        shadow = fold_text(text)
+        for match in pattern.finditer(shadow.text):
+            start, end = shadow.original_span(match.start(), match.end())
+            original = text[start:end]
+            if match.lastgroup == "phone":
+                replacement = self._resolve_phone_run(original)
+            else:
+                replacement = self._tag_for(match.group(0), original)
+                if replacement is None and pattern is not self._insensitive_pattern:
+                    # Valeur exacte aux accents différents : les valeurs plus courtes restent cherchées
+                    replacement = self._substitute(original, self._insensitive_pattern)
+                    if replacement == original:
+                        replacement = None
+            if replacement is not None:
+                yield start, end, replacement
+
+    def _substitute(self, text: str, pattern: Optional["re.Pattern"]) -> str:
+        if pattern is None or not text:
+            return text
+        pieces = []
+        position = 0
+        for start, end, replacement in self._iter_replacements(text, pattern):
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            position = end
+        if not pieces:
+            return text
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+    def _resolve_phone_run(self, run: str) -> Optional[str]:
+        """
+        Remplacement d'une suite de chiffres, ou None si elle ne contient rien de connu.
+        """
+        tag = self.phones.lookup(run)
+        if tag is not None:
+            return tag
+
+        # Numéros accolés, puis autres valeurs (numéro de voie, champ personnalisé...) entre eux
+        pieces = []
+        position = 0
+        for start, end, tag in self.phones.iter_embedded(run):
+            pieces.append(self._substitute(run[position:start], self._values_pattern))
+            pieces.append(tag)
+            position = end
+        pieces.append(self._substitute(run[position:], self._values_pattern))
+        replaced = ''.join(pieces)
+        return replaced if replaced != run else None
+
+    def apply(self, text: str) -> str:
+        """
+        Remplace toutes les valeurs connues par leurs balises en un seul passage.
+        """
+        return self._substitute(text, self.pattern)
+
+    def finditer(self, text: str, limit: Optional[int] = None) -> Iterator[Tuple[int, int, str]]:
+        """
+        Positions des valeurs à anonymiser dans le texte, sans le modifier.
+
+        Args:
+            text: Texte à parcourir
+            limit: Seules les valeurs commençant avant cette position sont retournées
+
+        Yields:
+            Tuples (début, fin, remplacement)
+        """
+        if self.pattern is None or not text:
+            return
+        for start, end, replacement in self._iter_replacements(text, self.pattern):
+            if limit is not None and start >= limit:
+                return
+            yield start, end, replacement
+
+    def has_match(self, text: str) -> bool:
+        """
+        Indique si le texte contient au moins une valeur à anonymiser.
+        """
+        if self.pattern is None or not text:
+            return False
+        return next(self._iter_replacements(text, self.pattern), None) is not None
+
+_matcher_cache: "OrderedDict[str, CompiledMatcher]" = OrderedDict()
+_matcher_cache_lock = threading.Lock()
+
+def compile_tiers(tiers: List[Dict[str, Any]]) -> CompiledMatcher:
+    """
+    Compile la table des champs pour les tiers fournis.
+    Les matchers sont mis en cache par contenu des tiers : les appels répétés
+    avec les mêmes tiers (texte puis fichier, plusieurs pages...) ne recompilent rien.
+
+    Args:
+        tiers: Liste des tiers avec leurs informations personnelles
+
+    Returns:
+        CompiledMatcher prêt à l'emploi (mapping balise -> valeur inclus)
+    """
+    key = json.dumps(tiers or [], sort_keys=True, ensure_ascii=False, default=str)
+    with _matcher_cache_lock:
+        matcher = _matcher_cache.get(key)
+        if matcher is not None:
+            _matcher_cache.move_to_end(key)
+            return matcher
+
+    matcher = CompiledMatcher(list(iter_tier_fields(tiers or [])))
+    with _matcher_cache_lock:
+        _matcher_cache[key] = matcher
+        while len(_matcher_cache) > MATCHER_CACHE_SIZE:
+            _matcher_cache.popitem(last=False)
+    return matcher
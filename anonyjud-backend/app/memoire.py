@@ -0,0 +1,112 @@
+"""
+Suivi de la mémoire résidente (RSS) du processus
+Les traitements de gros documents vérifient le budget entre deux lots de pages : un
+fichier démesuré échoue proprement au lieu de faire tuer le worker par le système.
+Le budget porte sur la mémoire prise depuis le début du traitement, pas sur celle du
+processus entier (bibliothèques chargées, caches, autres traitements déjà en cours)
+"""
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Mémoire résidente qu'un traitement par lots peut ajouter à celle du processus (Mo, 0 : pas de limite)
+MEMORY_BUDGET_MB = int(os.getenv("ANONYJUD_MEMORY_BUDGET_MB", "1536"))
+
+_STATM = "/proc/self/statm"
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+def _charger_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+        return libc.malloc_trim
+    except (OSError, AttributeError):
+        # Autre allocateur que la glibc (musl, macOS)
+        return None
+
+_malloc_trim = _charger_libc()
+
+class MemoireInsuffisante(Exception):
+    """Le budget mémoire est dépassé même avec le plus petit lot"""
+
+def rss() -> Optional[int]:
+    """
+    Mémoire résidente actuelle du processus en octets, None si elle n'est pas mesurable
+    (/proc absent hors Linux).
+    """
+    try:
+        with open(_STATM, "rb") as f:
+            # size resident shared text lib data dt, en pages
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+def liberer() -> None:
+    """
+    Collecte les objets en attente et rend au système la mémoire libérée par l'allocateur :
+    sans cela la mémoire résidente ne redescend pas après un lot.
+    """
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+def _mo(octets: int) -> int:
+    return octets // (1024 * 1024)
+
+class BudgetMemoire:
+    """
+    Budget de mémoire résidente d'un traitement par lots, mesuré par rapport à la mémoire
+    du processus au début du traitement.
+    Le lot est réduit de moitié quand le budget est dépassé, puis agrandi de nouveau
+    quand la mémoire prise redescend sous la moitié du budget.
+    """
+    def __init__(self, lot: int, budget_mb: int = MEMORY_BUDGET_MB):
+        self.lot_max = max(1, lot)
+        self.lot = self.lot_max
+        self.budget = budget_mb * 1024 * 1024 if budget_mb > 0 else None
+        self.depart = rss()
+        self.pic = 0
+
+    def mesurer(self) -> Optional[int]:
+        """
+        Mémoire prise depuis le début du traitement en octets, None si elle n'est pas mesurable.
+        """
+        courant = rss()
+        if courant is None or self.depart is None:
+            return None
+        utilise = max(0, courant - self.depart)
+        self.pic = max(self.pic, utilise)
+        return utilise
+
+    def verifier(self) -> int:
+        """
+        À appeler entre deux lots. Retourne la taille du prochain lot.
+
+        Raises:
+            MemoireInsuffisante: budget dépassé alors que le lot n'est déjà que d'une page
+        """
+        courant = self.mesurer()
+        if self.budget is None or courant is None:
+            return self.lot
+        if courant > self.budget:
+            # Les objets du lot précédent peuvent attendre le ramasse-miettes
+            liberer()
+            courant = self.mesurer()
+        if courant > self.budget:
+            if self.lot == 1:
+                raise MemoireInsuffisante(
+                    f"Document trop volumineux pour la mémoire disponible "
+                    f"({_mo(courant)} Mo pris par le traitement, budget {_mo(self.budget)} Mo)")
+            self.lot = max(1, self.lot // 2)
+            logger.warning(f"⚠️ Traitement à {_mo(courant)} Mo (budget {_mo(self.budget)} Mo) : lots de {self.lot} page(s)")
+        elif courant < self.budget // 2 and self.lot < self.lot_max:
+            self.lot = min(self.lot_max, self.lot * 2)
+        return self.lot
@@ -2,16 +2,96 @@
 
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import os
+import uuid
+
+from .matcher import compile_tiers
+
+# Nombre d'itérations PBKDF2 pour le hachage des mots de passe de projet
+PASSWORD_HASH_ITERATIONS = 200_000
+# Taille maximale de l'historique conservé par projet
+HISTORIQUE_MAX = 500
+
+
+def hash_mot_de_passe(mot_de_passe: str, sel: Optional[bytes] = None) -> Dict[str, str]:
+    """
+    Hache un mot de passe de projet avec PBKDF2-SHA256.
+
+    Returns:
+        Dictionnaire {"sel": ..., "hash": ...} encodé en hexadécimal
+    """
+    if sel is None:
+        sel = os.urandom(16)
+    empreinte = hashlib.pbkdf2_hmac("sha256", mot_de_passe.encode("utf-8"), sel, PASSWORD_HASH_ITERATIONS)
+    return {"sel": sel.hex(), "hash": empreinte.hex()}
+
 
 class Projet:
     """
     Représente un projet d'expertise avec base de correspondance, historique, etc.
     """
-    def __init__(self, nom, mot_de_passe):
+    def __init__(self, nom, mot_de_passe, projet_id=None, tiers=None, mapping=None, historique=None):
+        self.id = projet_id or uuid.uuid4().hex
         self.nom = nom
-        self.mot_de_passe = mot_de_passe
-        self.mapping = {}
-        self.historique = []
+        # Le mot de passe n'est jamais conservé en clair
+        self.mot_de_passe = hash_mot_de_passe(mot_de_passe) if isinstance(mot_de_passe, str) else mot_de_passe
+        self.tiers = tiers or []
+        self.mapping = mapping or {}
+        self.historique = historique or []
+
+    @property
+    def tiers(self) -> List[Dict[str, Any]]:
+        return self._tiers
+
+    @tiers.setter
+    def tiers(self, tiers: List[Dict[str, Any]]) -> None:
+        # Changer les tiers invalide le matcher compilé
+        self._tiers = tiers
+        self._matcher = None
+
+    @property
+    def matcher(self):
+        """
+        Matcher compilé pour les tiers du projet, construit au premier usage.
+        """
+        if self._matcher is None:
+            self._matcher = compile_tiers(self._tiers)
+        return self._matcher
+
+    def verifier_mot_de_passe(self, mot_de_passe: Optional[str]) -> bool:
+        """
+        Vérifie le mot de passe fourni contre l'empreinte stockée.
+        """
+        if not mot_de_passe or not self.mot_de_passe:
+            return False
+        attendu = hash_mot_de_passe(mot_de_passe, bytes.fromhex(self.mot_de_passe["sel"]))
+        return hmac.compare_digest(attendu["hash"], self.mot_de_passe["hash"])
+
+    def ajouter_historique(self, operation: str, **details: Any) -> Dict[str, Any]:
+        """
+        Ajoute une entrée à l'historique du projet et la retourne.
+        """
+        entree = {"operation": operation, "date": datetime.now(timezone.utc).isoformat(), **details}
+        self.historique.append(entree)
+        # Les projets restent en cache : l'historique est borné en mémoire, pas seulement en base
+        if len(self.historique) > HISTORIQUE_MAX:
+            del self.historique[:-HISTORIQUE_MAX]
+        return entree
+
+    def resume(self) -> Dict[str, Any]:
+        """
+        Représentation publique du projet (sans le mot de passe).
+        """
+        return {
+            "projet_id": self.id,
+            "nom": self.nom,
+            "tiers": self.tiers,
+            "mapping": self.mapping,
+            "historique": self.historique,
+        }
 
 class TextAnonymizationRequest(BaseModel):
     """
@@ -19,6 +99,8 @@ class TextAnonymizationRequest(BaseModel):
     """
     text: str
     tiers: List[Dict[str, Any]] = []
+    projet_id: Optional[str] = None
+    mot_de_passe: Optional[str] = None
 
 class TextDeanonymizationRequest(BaseModel):
     """
@@ -27,4 +109,21 @@ class TextDeanonymizationRequest(BaseModel):
     anonymized_text: str
     mapping: Dict[str, str] = {}
     tiers: List[Dict[str, Any]] = []
-    has_mapping: bool = True 
\ No newline at end of file
+    has_mapping: bool = True
+    projet_id: Optional[str] = None
+    mot_de_passe: Optional[str] = None
+
+class ProjetCreationRequest(BaseModel):
+    """
+    Modèle pour la création d'un projet persistant.
+    """
+    nom: str
+    mot_de_passe: str
+    tiers: List[Dict[str, Any]] = []
+
+class ProjetTiersRequest(BaseModel):
+    """
+    Modèle pour la mise à jour des tiers d'un projet.
+    """
+    mot_de_passe: str
+    tiers: List[Dict[str, Any]] = []
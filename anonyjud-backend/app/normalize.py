@@ -0,0 +1,98 @@
+"""
+Texte « ombre » normalisé pour la recherche insensible aux accents, à la casse et aux espaces
+Le texte replié (NFKD sans accents, minuscules, espaces fusionnés) garde une table
+d'offsets compacte vers le texte original pour y reporter les remplacements
+"""
+import re
+import unicodedata
+from array import array
+from typing import Dict, Tuple
+
+_SPACE_RUN = re.compile(r' {2,}')
+_WHITESPACE = re.compile(r'\s+')
+
+# Repli de chaque caractère déjà rencontré (partagé entre requêtes)
+_fold_cache: Dict[str, str] = {}
+
+def fold_char(ch: str) -> str:
+    """
+    Repli d'un caractère : espace pour tout blanc, sinon NFKD sans diacritiques en minuscules
+    ("É" -> "e", "ﬁ" -> "fi", " " -> " ").
+    """
+    folded = _fold_cache.get(ch)
+    if folded is None:
+        if ch.isspace():
+            folded = " "
+        else:
+            folded = "".join(c for c in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(c)).lower()
+        _fold_cache[ch] = folded
+    return folded
+
+class ShadowText:
+    """
+    Texte replié et table d'offsets : offsets[i] est l'index, dans le texte original,
+    du caractère qui a produit le i-ème caractère replié.
+    """
+    __slots__ = ("original", "text", "offsets")
+
+    def __init__(self, original: str, text: str, offsets: array):
+        self.original = original
+        self.text = text
+        self.offsets = offsets
+
+    def original_span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Convertit un intervalle [start, end) du texte replié en intervalle du texte original.
+        """
+        offsets = self.offsets
+        size = len(offsets)
+        # Ne pas couper un caractère original qui a produit plusieurs caractères repliés
+        while 0 < end < size and offsets[end] == offsets[end - 1]:
+            end += 1
+        original_end = offsets[end] if end < size else len(self.original)
+        return offsets[start], original_end
+
+def fold_text(text: str) -> ShadowText:
+    """
+    Construit le texte replié de `text` et sa table d'offsets.
+
+    Le cas courant (chaque caractère replié en un seul) passe par str.translate ;
+    seuls les textes contenant des ligatures ou des marques isolées suivent le chemin lent.
+    """
+    table = {ord(ch): fold_char(ch) for ch in set(text)}
+    shadow = text.translate(table)
+
+    if all(len(folded) == 1 for folded in table.values()):
+        offsets = array('I', range(len(text)))
+    else:
+        offsets = array('I')
+        for index, ch in enumerate(text):
+            offsets.extend([index] * len(table[ord(ch)]))
+
+    # Fusion des suites d'espaces : seul le premier blanc de chaque suite est conservé
+    if "  " in shadow:
+        parts = []
+        kept = array('I')
+        position = 0
+        for match in _SPACE_RUN.finditer(shadow):
+            parts.append(shadow[position:match.start() + 1])
+            kept.extend(offsets[position:match.start() + 1])
+            position = match.end()
+        parts.append(shadow[position:])
+        kept.extend(offsets[position:])
+        shadow = "".join(parts)
+        offsets = kept
+
+    return ShadowText(text, shadow, offsets)
+
+def fold_value(value: str) -> str:
+    """
+    Forme repliée d'une valeur recherchée (tiers, balise...).
+    """
+    return fold_text(value.strip()).text
+
+def collapse_whitespace(value: str) -> str:
+    """
+    Fusionne les blancs d'une valeur sans autre repli (comparaisons exactes).
+    """
+    return _WHITESPACE.sub(" ", value.strip())
@@ -0,0 +1,212 @@
+"""
+OCR des pages PDF sans couche texte (annexes scannées)
+Tesseract local via l'intégration OCR de PyMuPDF, pages traitées en parallèle
+dans un pool de processus, résultats mis en cache par empreinte de l'image de page
+Le pool est créé au démarrage de l'application et arrêté avec elle ; ses processus
+ne sont pas des copies (fork) du worker et de ses threads
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+# "auto" : OCR si Tesseract est installé ; "0" : désactivé ; "1" : avertit s'il manque
+OCR_MODE = os.getenv("ANONYJUD_OCR", "auto")
+OCR_LANGUAGE = os.getenv("ANONYJUD_OCR_LANG", "fra")
+OCR_DPI = int(os.getenv("ANONYJUD_OCR_DPI", "300"))
+
+def _processeurs() -> int:
+    """
+    Processeurs disponibles pour ce worker : ceux accordés au processus, partagés entre
+    les workers du serveur (WEB_CONCURRENCY, lu par uvicorn).
+    """
+    try:
+        disponibles = len(os.sched_getaffinity(0))
+    except AttributeError:
+        disponibles = os.cpu_count() or 1
+    return max(1, disponibles // max(1, int(os.getenv("WEB_CONCURRENCY", "1"))))
+
+# Processus du pool OCR (par défaut : processeurs disponibles, 4 au plus)
+OCR_WORKERS = max(1, int(os.getenv("ANONYJUD_OCR_WORKERS", str(min(4, _processeurs())))))
+# Démarrage des processus du pool : "forkserver" (Linux) ou "spawn", jamais "fork"
+OCR_START_METHOD = os.getenv("ANONYJUD_OCR_START_METHOD",
+                             "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+OCR_CACHE_SIZE = int(os.getenv("ANONYJUD_OCR_CACHE_SIZE", "256"))
+
+# Mot reconnu : (x0, y0, x1, y1, mot, bloc, ligne) en coordonnées de page non tournée
+OcrWord = Tuple[float, float, float, float, str, int, int]
+
+_cache: "OrderedDict[str, List[OcrWord]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_tessdata: Optional[str] = None
+_tessdata_checked = False
+
+def tessdata() -> Optional[str]:
+    """
+    Dossier tessdata de Tesseract, ou None si l'OCR est indisponible ou désactivé.
+    """
+    global _tessdata, _tessdata_checked
+    if OCR_MODE == "0":
+        return None
+    if not _tessdata_checked:
+        try:
+            _tessdata = fitz.get_tessdata()
+        except Exception as e:
+            _tessdata = None
+            log = logger.warning if OCR_MODE == "1" else logger.info
+            log(f"⚠️ OCR indisponible, pages scannées non analysées: {str(e)}")
+        _tessdata_checked = True
+    return _tessdata
+
+def demarrer() -> None:
+    """
+    Crée le pool OCR (au démarrage de l'application) si l'OCR est disponible.
+    """
+    global _pool
+    if tessdata() is None:
+        return
+    with _pool_lock:
+        if _pool is not None:
+            return
+        context = multiprocessing.get_context(OCR_START_METHOD)
+        if OCR_START_METHOD == "forkserver":
+            # Les processus sont dérivés d'un serveur qui a déjà importé PyMuPDF
+            context.set_forkserver_preload(["fitz"])
+        _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=context)
+    logger.info(f"🔎 Pool OCR créé: {OCR_WORKERS} processus ({OCR_START_METHOD})")
+
+def arreter() -> None:
+    """
+    Arrête le pool OCR (à l'arrêt de l'application) ; les pages en attente sont abandonnées.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+        logger.info("🛑 Pool OCR arrêté")
+
+def _get_pool() -> ProcessPoolExecutor:
+    # Hors de l'application (scripts, tests), le pool est créé au premier OCR
+    if _pool is None:
+        demarrer()
+    return _pool
+
+def _ocr_png(png: bytes, language: str, tessdata_dir: str) -> Tuple[Tuple[float, float], List[OcrWord]]:
+    """
+    OCR d'une image de page (exécuté dans un processus du pool).
+
+    Returns:
+        (taille de la page OCR, mots reconnus en coordonnées de cette page)
+    """
+    pix = fitz.Pixmap(png)
+    ocr_pdf = pix.pdfocr_tobytes(language=language, tessdata=tessdata_dir)
+    with fitz.open(stream=ocr_pdf, filetype="pdf") as ocr_doc:
+        page = ocr_doc[0]
+        words = [tuple(word[:7]) for word in page.get_text("words")]
+        return (page.rect.width, page.rect.height), words
+
+def pages_sans_texte(doc: fitz.Document) -> List[int]:
+    """
+    Pages sans couche texte mais contenant des images : candidates à l'OCR.
+    """
+    return [page.number for page in doc if page.get_images() and not page.get_text().strip()]
+
+def ocr_pages(doc: fitz.Document, pages: Iterable[int]) -> Dict[int, List[OcrWord]]:
+    """
+    Reconnaît le texte des pages indiquées, en parallèle, avec cache par image de page.
+
+    Returns:
+        Numéro de page -> mots reconnus (coordonnées de la page non tournée)
+    """
+    tessdata_dir = tessdata()
+    if tessdata_dir is None:
+        return {}
+
+    results: Dict[int, List[OcrWord]] = {}
+    pending = {}
+    for page_num in pages:
+        page = doc[page_num]
+        png = page.get_pixmap(dpi=OCR_DPI).tobytes("png")
+        key = hashlib.sha1(png).hexdigest() + OCR_LANGUAGE
+        with _cache_lock:
+            words = _cache.get(key)
+            if words is not None:
+                _cache.move_to_end(key)
+        if words is not None:
+            results[page_num] = words
+        else:
+            pending[page_num] = (key, _get_pool().submit(_ocr_png, png, OCR_LANGUAGE, tessdata_dir))
+
+    if pending:
+        logger.info(f"🔎 OCR de {len(pending)} page(s), {len(results)} depuis le cache")
+
+    for page_num, (key, future) in pending.items():
+        try:
+            (width, height), raw_words = future.result()
+        except Exception as e:
+            logger.warning(f"⚠️ OCR impossible (page {page_num + 1}): {str(e)}")
+            continue
+        # Image rendue de la page affichée -> coordonnées de la page non tournée
+        page = doc[page_num]
+        scale = fitz.Matrix(page.rect.width / width, page.rect.height / height) * page.derotation_matrix
+        words = []
+        for x0, y0, x1, y1, word, block, line in raw_words:
+            rect = fitz.Rect(x0, y0, x1, y1) * scale
+            words.append((rect.x0, rect.y0, rect.x1, rect.y1, word, block, line))
+        results[page_num] = words
+        with _cache_lock:
+            _cache[key] = words
+            while len(_cache) > OCR_CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    return results
+
+def zones_a_masquer(words: List[OcrWord], matcher) -> List[fitz.Rect]:
+    """
+    Cadres des mots reconnus couverts par une valeur à anonymiser.
+    Les mots sont réassemblés ligne par ligne pour que les valeurs sur plusieurs mots
+    (prénom nom, numéro de téléphone espacé...) soient trouvées par le matcher.
+    """
+    parts = []
+    positions = []  # (début, fin, index du mot) dans le texte réassemblé
+    length = 0
+    previous_line = None
+    for index, (_x0, _y0, _x1, _y1, word, block, line) in enumerate(words):
+        if previous_line is not None:
+            separator = " " if (block, line) == previous_line else "\n"
+            parts.append(separator)
+            length += 1
+        positions.append((length, length + len(word), index))
+        parts.append(word)
+        length += len(word)
+        previous_line = (block, line)
+
+    rects = []
+    for start, end, _replacement in matcher.finditer("".join(parts)):
+        for word_start, word_end, index in positions:
+            if word_start < end and word_end > start:
+                rects.append(fitz.Rect(words[index][:4]))
+    return rects
+
+def masquer_zones(page: fitz.Page, rects: List[fitz.Rect]) -> None:
+    """
+    Caviarde définitivement les zones : les pixels des images sous chaque cadre sont effacés.
+    """
+    for rect in rects:
+        page.add_redact_annot(rect, fill=(0, 0, 0))
+    page.apply_redactions(
+        images=fitz.PDF_REDACT_IMAGE_PIXELS,
+        graphics=fitz.PDF_REDACT_LINE_ART_NONE,
+        text=fitz.PDF_REDACT_TEXT_REMOVE,
+    )
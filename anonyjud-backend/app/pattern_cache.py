@@ -0,0 +1,71 @@
+"""
+Cache des expressions régulières compilées, partagé par tous les modules
+Capacité explicite et compteurs (succès, défauts, évictions) : les motifs construits
+par balise ou par valeur ne chassent plus les motifs fixes du cache interne de `re`
+(512 entrées, vidé par moitié quand il déborde)
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+# Nombre de motifs compilés gardés en mémoire
+PATTERN_CACHE_SIZE = int(os.getenv("ANONYJUD_PATTERN_CACHE_SIZE", "2048"))
+
+class PatternCache:
+    """
+    Motifs compilés par (source, options), le moins récemment utilisé évincé en premier.
+    """
+    def __init__(self, capacite: int):
+        self.capacite = max(1, capacite)
+        self._motifs: "OrderedDict[Tuple[str, int], re.Pattern]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.succes = 0
+        self.defauts = 0
+        self.evictions = 0
+
+    def compiler(self, source: str, flags: int = 0) -> "re.Pattern":
+        cle = (source, flags)
+        with self._lock:
+            motif = self._motifs.get(cle)
+            if motif is not None:
+                self._motifs.move_to_end(cle)
+                self.succes += 1
+                return motif
+            self.defauts += 1
+
+        # Compilation hors verrou : un motif compilé deux fois en parallèle reste correct
+        motif = re.compile(source, flags)
+        with self._lock:
+            self._motifs[cle] = motif
+            while len(self._motifs) > self.capacite:
+                self._motifs.popitem(last=False)
+                self.evictions += 1
+        return motif
+
+    def vider(self) -> None:
+        with self._lock:
+            self._motifs.clear()
+
+    def statistiques(self) -> Dict[str, int]:
+        with self._lock:
+            return {"motifs": len(self._motifs), "capacite": self.capacite, "succes": self.succes,
+                    "defauts": self.defauts, "evictions": self.evictions}
+
+_cache = PatternCache(PATTERN_CACHE_SIZE)
+
+def compiler(source: str, flags: int = 0) -> "re.Pattern":
+    """
+    Équivalent de re.compile, servi par le cache partagé.
+    """
+    return _cache.compiler(source, flags)
+
+def mot_entier(valeur: str, flags: int = 0) -> "re.Pattern":
+    """
+    Motif de `valeur` littérale en mot entier (ex: NOM1 sans toucher PRENOM1).
+    """
+    return _cache.compiler(r'\b' + re.escape(valeur) + r'\b', flags)
+
+def statistiques() -> Dict[str, int]:
+    return _cache.statistiques()
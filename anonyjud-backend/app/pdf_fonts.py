@@ -0,0 +1,176 @@
+"""
+Polices embarquées des PDF pour la reconstruction reportlab
+Extraction unique par document via PyMuPDF, enregistrement unique auprès de reportlab,
+cache des enregistrements par empreinte de police partagé entre les requêtes et borné
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de polices embarquées enregistrées auprès de reportlab (registre global
+# du processus, sans retrait possible), polices standard au-delà
+FONT_CACHE_SIZE = int(os.getenv("ANONYJUD_FONT_CACHE_SIZE", "256"))
+
+# Bits de span["flags"] de PyMuPDF
+FLAG_ITALIC = 2
+FLAG_SERIF = 4
+FLAG_MONO = 8
+FLAG_BOLD = 16
+
+_BASE14 = {
+    # (famille, gras, italique) -> police standard
+    ("sans", False, False): "Helvetica",
+    ("sans", True, False): "Helvetica-Bold",
+    ("sans", False, True): "Helvetica-Oblique",
+    ("sans", True, True): "Helvetica-BoldOblique",
+    ("serif", False, False): "Times-Roman",
+    ("serif", True, False): "Times-Bold",
+    ("serif", False, True): "Times-Italic",
+    ("serif", True, True): "Times-BoldItalic",
+    ("mono", False, False): "Courier",
+    ("mono", True, False): "Courier-Bold",
+    ("mono", False, True): "Courier-Oblique",
+    ("mono", True, True): "Courier-BoldOblique",
+}
+
+# Polices standard utilisées en repli (préchargées au démarrage)
+BASE14_FONTS = tuple(_BASE14.values())
+
+# Empreinte SHA-1 du programme de police -> police reportlab (None si non utilisable)
+_registered: Dict[str, Optional[TTFont]] = {}
+_registered_lock = threading.Lock()
+_saturation_signalee = threading.Event()
+
+def _font_key(name: str) -> str:
+    """
+    Clé de comparaison d'un nom de police : sans préfixe de sous-ensemble (ABCDEF+),
+    sans espaces ni tirets, en minuscules.
+    """
+    if len(name) > 7 and name[6] == "+":
+        name = name[7:]
+    return re.sub(r'[\s\-_,]', '', name).lower()
+
+def fallback_font(font_name: str, flags: int) -> str:
+    """
+    Police standard la plus proche d'après les indicateurs du span et son nom.
+    """
+    lowered = font_name.lower()
+    bold = bool(flags & FLAG_BOLD) or "bold" in lowered or "black" in lowered
+    italic = bool(flags & FLAG_ITALIC) or "italic" in lowered or "oblique" in lowered
+    # Le nom de la famille prime sur les indicateurs, souvent faux (Arial marquée serif)
+    if "courier" in lowered or "mono" in lowered:
+        family = "mono"
+    elif "sans" in lowered or "arial" in lowered or "helvetica" in lowered:
+        family = "sans"
+    elif "times" in lowered or "serif" in lowered:
+        family = "serif"
+    elif flags & FLAG_MONO:
+        family = "mono"
+    elif flags & FLAG_SERIF:
+        family = "serif"
+    else:
+        family = "sans"
+    return _BASE14[(family, bold, italic)]
+
+def _register_font_program(content: bytes) -> Optional[TTFont]:
+    """
+    Enregistre un programme TrueType auprès de reportlab, une seule fois par empreinte et
+    sous un nom qui lui est propre. reportlab ne permet ni de retirer ni de remplacer une
+    police enregistrée : au-delà de FONT_CACHE_SIZE programmes, les nouveaux ne sont plus
+    enregistrés et leurs spans passent en police standard.
+    """
+    digest = hashlib.sha1(content).hexdigest()
+    with _registered_lock:
+        if digest in _registered:
+            return _registered[digest]
+        if len(_registered) >= FONT_CACHE_SIZE:
+            if not _saturation_signalee.is_set():
+                _saturation_signalee.set()
+                logger.warning(f"⚠️ {FONT_CACHE_SIZE} polices embarquées enregistrées, les suivantes sont remplacées par des polices standard")
+            return None
+
+        try:
+            name = f"PDF-{digest[:16]}"
+            pdfmetrics.registerFont(TTFont(name, io.BytesIO(content)))
+            # Pour un nom de face déjà enregistré, reportlab rattache au nom l'autre police
+            font = pdfmetrics.getFont(name)
+            if font.fontName != name:
+                raise ValueError(f"nom de face déjà enregistré: {font.face.name}")
+        except Exception as e:
+            # Sous-ensembles sans table cmap/post, CFF... : repli sur une police standard
+            logger.debug(f"Police embarquée non utilisable par reportlab: {str(e)}")
+            font = None
+        _registered[digest] = font
+        return font
+
+class DocumentFonts:
+    """
+    Correspondance entre les polices d'un document et les polices reportlab.
+    """
+    def __init__(self):
+        self._by_key: Dict[str, str] = {}
+        self._glyphs: Dict[str, frozenset] = {}
+
+    @classmethod
+    def from_document(cls, doc, pages: Optional[List[int]] = None) -> "DocumentFonts":
+        """
+        Extrait et enregistre les polices TrueType embarquées (un seul passage par document),
+        éventuellement limité aux pages reconstituées.
+        """
+        fonts = cls()
+        seen = set()
+        for page_num in (range(doc.page_count) if pages is None else pages):
+            page = doc[page_num]
+            try:
+                page_fonts = page.get_fonts(full=True)
+            except Exception as e:
+                logger.warning(f"⚠️ Lecture des polices impossible: {str(e)}")
+                continue
+            for xref, ext, _type, basefont, *_ in page_fonts:
+                if xref in seen:
+                    continue
+                seen.add(xref)
+                if ext != "ttf":
+                    continue
+                try:
+                    _name, _ext, _subtype, content = doc.extract_font(xref)
+                except Exception as e:
+                    logger.debug(f"Extraction de police impossible (xref {xref}): {str(e)}")
+                    continue
+                if not content:
+                    continue
+                font = _register_font_program(content)
+                if font is not None:
+                    fonts._add(basefont, font)
+
+        logger.info(f"🔤 {len(fonts._glyphs)} police(s) embarquée(s) réutilisable(s) sur {len(seen)}")
+        return fonts
+
+    def _add(self, basefont: str, font: TTFont) -> None:
+        rl_name, face = font.fontName, font.face
+        self._glyphs[rl_name] = frozenset(face.charToGlyph)
+        for name in (basefont, face.name.decode("latin-1") if isinstance(face.name, bytes) else face.name):
+            if name:
+                self._by_key.setdefault(_font_key(name), rl_name)
+
+    def resolve(self, font_name: str, flags: int, text: str) -> str:
+        """
+        Police reportlab pour un span : la police d'origine si elle contient tous les
+        glyphes du texte (les balises peuvent manquer dans un sous-ensemble), sinon
+        la police standard la plus proche.
+        """
+        rl_name = self._by_key.get(_font_key(font_name or ""))
+        if rl_name is not None:
+            glyphs = self._glyphs[rl_name]
+            if all(ord(ch) in glyphs for ch in text):
+                return rl_name
+        return fallback_font(font_name or "", flags)
@@ -0,0 +1,180 @@
+"""
+Rejeu des dessins vectoriels (page.get_drawings) dans un canvas reportlab
+Chaque chemin est converti en un passage sur ses items (l, c, re, qu), l'état graphique
+(couleurs, épaisseur, tirets, opacité) n'est réémis que lorsqu'il change. Les points de
+tous les chemins d'une page sont convertis en coordonnées reportlab en une seule opération
+"""
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from reportlab.pdfgen.canvas import Canvas, FILL_EVEN_ODD, FILL_NON_ZERO
+
+logger = logging.getLogger(__name__)
+
+_DASHES = re.compile(r'\[\s*([^\]]*)\]\s*([\d.]+)')
+
+def _parse_dashes(dashes: Optional[str]):
+    """
+    "[ 3 2 ] 0" -> ([3.0, 2.0], 0.0) ; None si absent ou illisible.
+    """
+    if not dashes:
+        return None
+    match = _DASHES.match(dashes)
+    if not match:
+        return None
+    return [float(v) for v in match.group(1).split()], float(match.group(2))
+
+def _valeur(drawing: Dict[str, Any], cle: str, defaut: float) -> float:
+    """
+    Valeur numérique d'un dessin, `defaut` seulement si elle est absente : une opacité
+    nulle (tracé invisible) ou une épaisseur nulle (trait le plus fin) sont conservées.
+    """
+    valeur = drawing.get(cle)
+    return valeur if valeur is not None else defaut
+
+def _points(drawing: Dict[str, Any]) -> Iterator[Any]:
+    """
+    Points d'un chemin dans l'ordre où emit() les utilise (coin bas gauche pour un rectangle).
+    """
+    for item in drawing.get("items", ()):
+        op = item[0]
+        if op == "l":
+            yield item[1]
+            yield item[2]
+        elif op == "c":
+            yield from item[1:5]
+        elif op == "re":
+            yield item[1].bl
+        elif op == "qu":
+            quad = item[1]
+            yield quad.ul
+            yield quad.ur
+            yield quad.lr
+            yield quad.ll
+
+class PathEmitter:
+    """
+    Émetteur de chemins pour une page : coordonnées PyMuPDF (origine en haut)
+    converties vers reportlab (origine en bas).
+    """
+    def __init__(self, c: Canvas):
+        self._canvas = c
+        self._height = 0.0
+        self.paths = 0
+        self.reset(0.0)
+
+    def reset(self, page_height: float) -> None:
+        """
+        Nouvelle page : showPage réinitialise l'état graphique de reportlab.
+        """
+        self._height = page_height
+        self._state: Dict[str, Any] = {}
+
+    def _set(self, key: str, value: Any, apply) -> None:
+        if self._state.get(key, ()) != value:
+            apply(value)
+            self._state[key] = value
+
+    def _set_color(self, key: str, color: Sequence[float], gray, rgb, cmyk) -> None:
+        color = tuple(color)
+        if self._state.get(key) == color:
+            return
+        if len(color) == 1:
+            gray(color[0])
+        elif len(color) == 4:
+            cmyk(*color)
+        else:
+            rgb(*color[:3])
+        self._state[key] = color
+
+    def emit_page(self, drawings: List[Dict[str, Any]]) -> None:
+        """
+        Rejoue les chemins d'une page : tous leurs points sont d'abord convertis
+        (y -> hauteur de page - y) en une opération.
+        """
+        coordonnees: List[float] = []
+        comptes: List[int] = []
+        for drawing in drawings:
+            debut = len(coordonnees)
+            for point in _points(drawing):
+                coordonnees.append(point.x)
+                coordonnees.append(point.y)
+            comptes.append((len(coordonnees) - debut) // 2)
+        points = np.array(coordonnees, dtype=np.float64).reshape(-1, 2)
+        points[:, 1] = self._height - points[:, 1]
+        convertis = points.tolist()
+
+        debut = 0
+        for drawing, compte in zip(drawings, comptes):
+            try:
+                self.emit(drawing, convertis[debut:debut + compte])
+            except Exception as e:
+                logger.warning(f"⚠️ Erreur lors de l'ajout de dessin: {e}")
+            debut += compte
+
+    def emit(self, drawing: Dict[str, Any], points: List[List[float]]) -> None:
+        """
+        Rejoue un chemin de page.get_drawings() à partir de ses points déjà convertis.
+        """
+        kind = drawing.get("type") or ""
+        fill = drawing.get("fill") if "f" in kind else None
+        stroke = drawing.get("color") if "s" in kind else None
+        if fill is None and stroke is None:
+            return
+
+        c = self._canvas
+        path = c.beginPath()
+        current = None
+        suivant = iter(points).__next__
+        for item in drawing.get("items", ()):
+            op = item[0]
+            if op == "l":
+                start, end = suivant(), suivant()
+                if current != start:
+                    path.moveTo(*start)
+                path.lineTo(*end)
+                current = end
+            elif op == "c":
+                start, c1, c2, end = suivant(), suivant(), suivant(), suivant()
+                if current != start:
+                    path.moveTo(*start)
+                path.curveTo(*c1, *c2, *end)
+                current = end
+            elif op == "re":
+                rect = item[1]
+                path.rect(*suivant(), rect.width, rect.height)
+                current = None
+            elif op == "qu":
+                path.moveTo(*suivant())
+                path.lineTo(*suivant())
+                path.lineTo(*suivant())
+                path.lineTo(*suivant())
+                path.close()
+                current = None
+        if drawing.get("closePath"):
+            path.close()
+
+        if fill is not None:
+            self._set_color("fill", fill, c.setFillGray, c.setFillColorRGB, c.setFillColorCMYK)
+            self._set("fill_alpha", _valeur(drawing, "fill_opacity", 1.0), c.setFillAlpha)
+        if stroke is not None:
+            self._set_color("stroke", stroke, c.setStrokeGray, c.setStrokeColorRGB, c.setStrokeColorCMYK)
+            self._set("stroke_alpha", _valeur(drawing, "stroke_opacity", 1.0), c.setStrokeAlpha)
+            self._set("width", _valeur(drawing, "width", 1.0), c.setLineWidth)
+            if drawing.get("lineJoin") is not None:
+                self._set("join", int(drawing["lineJoin"]), c.setLineJoin)
+            if drawing.get("lineCap"):
+                self._set("cap", int(max(drawing["lineCap"])), c.setLineCap)
+            dashes = _parse_dashes(drawing.get("dashes"))
+            if dashes is not None:
+                self._set("dashes", dashes, lambda value: c.setDash(value[0], value[1]))
+
+        c.drawPath(
+            path,
+            stroke=1 if stroke is not None else 0,
+            fill=1 if fill is not None else 0,
+            fillMode=FILL_EVEN_ODD if drawing.get("even_odd") else FILL_NON_ZERO,
+        )
+        self.paths += 1
@@ -0,0 +1,243 @@
+"""
+Reconstitution d'un PDF avec reportlab à partir des éléments extraits
+(texte remplacé, images, dessins vectoriels), commune à l'anonymisation et à la dé-anonymisation
+"""
+import io
+import logging
+import os
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import fitz
+import numpy as np
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from .pdf_fonts import DocumentFonts
+from .pdf_paths import PathEmitter
+from .ocr import masquer_zones
+from .pdf_scrub import reporter_annotations, scrub_pdf
+
+logger = logging.getLogger(__name__)
+
+# Dossier des lots de pages reconstituées (défaut : dossier temporaire du système)
+PDF_SPOOL_DIR = os.getenv("ANONYJUD_PDF_SPOOL_DIR") or None
+
+class LotsReconstitues:
+    """
+    Pages reconstituées gardées sur disque, un fichier PDF par lot : seul le lot en cours
+    de reconstitution, puis d'insertion dans le document assemblé, est en mémoire.
+    """
+    def __init__(self):
+        self._dossier = tempfile.TemporaryDirectory(prefix="anonyjud-pdf-", dir=PDF_SPOOL_DIR)
+        # (chemin, index de la première page, nombre de pages)
+        self._lots: List[Tuple[str, int, int]] = []
+        self.page_count = 0
+
+    def ajouter(self, pdf: bytes, pages: int) -> None:
+        chemin = os.path.join(self._dossier.name, f"lot{len(self._lots):05d}.pdf")
+        with open(chemin, "wb") as f:
+            f.write(pdf)
+        self._lots.append((chemin, self.page_count, pages))
+        self.page_count += pages
+
+    def inserer(self, output: fitz.Document, from_page: int, to_page: int) -> None:
+        """
+        Insère dans `output` les pages reconstituées `from_page` à `to_page` (incluses).
+        """
+        for chemin, premiere, pages in self._lots:
+            debut, fin = max(from_page, premiere), min(to_page, premiere + pages - 1)
+            if debut <= fin:
+                with fitz.open(chemin) as lot:
+                    output.insert_pdf(lot, from_page=debut - premiere, to_page=fin - premiere)
+
+    def close(self) -> None:
+        self._lots = []
+        self._dossier.cleanup()
+
+class _TextBatch:
+    """
+    Texte d'une page regroupé dans un seul objet texte reportlab (un bloc BT/ET) :
+    positions relatives (Td) d'un span au suivant, setFont émis seulement si la police
+    ou la taille change, couleur émise seulement si elle change.
+    """
+    def __init__(self, c: canvas.Canvas):
+        self._canvas = c
+        self._text = c.beginText(0, 0)
+        self._font = None
+        self._color = 0
+        self.spans = 0
+        self.font_changes = 0
+
+    def draw(self, font_name: str, size: float, dx: float, dy: float, text: str, color: int = 0) -> None:
+        """
+        Écrit un span à (dx, dy) de la ligne de base du span précédent (reportlab, y vers le haut).
+        """
+        if self._color != color:
+            # Couleur sRGB entière de PyMuPDF (0xRRGGBB)
+            self._text.setFillColorRGB(((color >> 16) & 255) / 255, ((color >> 8) & 255) / 255, (color & 255) / 255)
+            self._color = color
+        if self._font != (font_name, size):
+            self._text.setFont(font_name, size)
+            self._font = (font_name, size)
+            self.font_changes += 1
+        if dx or dy:
+            # moveCursor compte dy vers le bas
+            self._text.moveCursor(dx, -dy)
+        self._text.textOut(text)
+        self.spans += 1
+
+    def close(self) -> None:
+        if self.spans:
+            self._canvas.drawText(self._text)
+
+def rebuild_pdf(pdf_elements: List[Dict[str, Any]], fonts: Optional[DocumentFonts] = None,
+                progress: Optional[Callable[[str, int, int], None]] = None) -> bytes:
+    """
+    Reconstitue un PDF à partir des éléments extraits par extract_pdf_elements.
+
+    Args:
+        pdf_elements: Pages extraites (taille, spans de texte, images, dessins)
+        fonts: Polices embarquées du document d'origine (polices standard sinon)
+        progress: Rappel d'avancement (étape, page courante, nombre de pages)
+
+    Returns:
+        Le contenu du PDF reconstitué
+    """
+    fonts = fonts or DocumentFonts()
+    buffer = io.BytesIO()
+
+    # Créer le document avec la taille de la première page
+    first_page = pdf_elements[0] if pdf_elements else None
+    if first_page:
+        page_size = first_page["page_size"]
+    else:
+        page_size = A4
+
+    c = canvas.Canvas(buffer, pagesize=page_size)
+    paths = PathEmitter(c)
+    font_changes = 0
+    spans = 0
+
+    for index, page_data in enumerate(pdf_elements):
+        if progress:
+            progress("reconstruction", index + 1, len(pdf_elements))
+        page_size = page_data["page_size"]
+        c.setPageSize(page_size)
+
+        # Images d'abord (arrière-plan), cadres convertis en une opération :
+        # (x0, y1, largeur, hauteur) -> (x0, hauteur de page - y1, largeur, hauteur)
+        images = page_data["images"]
+        if images:
+            boxes = np.array([(image["bbox"].x0, image["bbox"].y1, image["bbox"].width, image["bbox"].height)
+                              for image in images], dtype=np.float64)
+            boxes[:, 1] = page_size[1] - boxes[:, 1]
+            for image_element, (x, y, width, height) in zip(images, boxes.tolist()):
+                try:
+                    c.drawImage(ImageReader(io.BytesIO(image_element["data"])), x, y, width=width, height=height)
+                except Exception as e:
+                    logger.warning(f"⚠️ Erreur lors de l'ajout d'image: {e}")
+
+        # Dessins vectoriels (état graphique isolé du texte)
+        c.saveState()
+        paths.reset(page_size[1])
+        paths.emit_page(page_data["drawings"])
+        c.restoreState()
+
+        # Texte avec sa police d'origine quand elle est réutilisable, en un seul objet texte ;
+        # positions converties pour toute la page avant la boucle d'émission
+        batch = _TextBatch(c)
+        page_spans = page_data["spans"]
+        indices = page_spans.visibles()
+        dxs, dys = page_spans.deplacements(page_size[1], indices)
+        report_x = report_y = 0.0
+        for (text, font, size, flags, color), dx, dy in zip(page_spans.lignes(indices), dxs.tolist(), dys.tolist()):
+            try:
+                # Les blancs de tête sont gardés : ils font partie de l'avance depuis l'origine
+                text = text.rstrip()
+                font_name = fonts.resolve(font, flags, text)
+                batch.draw(font_name, size, dx + report_x, dy + report_y, text, color)
+                report_x = report_y = 0.0
+            except Exception as e:
+                # Le span suivant part de la dernière position écrite
+                report_x += dx
+                report_y += dy
+                logger.warning(f"⚠️ Erreur lors de l'ajout de texte: {e}")
+        batch.close()
+        font_changes += batch.font_changes
+        spans += batch.spans
+
+        c.showPage()
+
+    c.save()
+    logger.info(f"🔤 {spans} span(s) en {len(pdf_elements)} objet(s) texte, {font_changes} changement(s) de police, {paths.paths} chemin(s)")
+    return buffer.getvalue()
+
+def assemble_pdf(doc: fitz.Document, rebuilt: Union[bytes, LotsReconstitues, None], rebuilt_pages: List[int],
+                 apply: Optional[Callable[[str], str]] = None,
+                 redactions: Optional[Dict[int, List[fitz.Rect]]] = None, anonymisation: bool = True) -> fitz.Document:
+    """
+    Assemble le PDF final : les pages reconstituées (dans l'ordre de `rebuilt_pages`)
+    remplacent les pages correspondantes de `doc`, les autres sont recopiées telles quelles.
+
+    Args:
+        doc: Document d'origine
+        rebuilt: PDF reportlab contenant les pages reconstituées (contenu, ou lots sur
+            disque supprimés à la fin de l'assemblage)
+        rebuilt_pages: Numéros (à partir de 0) des pages reconstituées
+        apply: Fonction de remplacement appliquée aux métadonnées, signets, annotations,
+            champs et fichiers joints (sinon ils ne sont pas reportés)
+        redactions: Zones à caviarder par numéro de page (mots reconnus par OCR)
+        anonymisation: False pour une dé-anonymisation (voir scrub_pdf)
+
+    Returns:
+        Le document assemblé (à sérialiser avec write_pdf)
+    """
+    output = fitz.open()
+    rebuilt_doc = fitz.open(stream=rebuilt, filetype="pdf") if isinstance(rebuilt, bytes) else None
+    positions = {page_num: index for index, page_num in enumerate(rebuilt_pages)}
+
+    def inserer(from_page: int, to_page: int) -> None:
+        if rebuilt_doc is not None:
+            output.insert_pdf(rebuilt_doc, from_page=from_page, to_page=to_page)
+        else:
+            rebuilt.inserer(output, from_page, to_page)
+
+    try:
+        # Recopie par plages contiguës : un seul insert_pdf par suite de pages de même origine
+        start = 0
+        while start < doc.page_count:
+            from_rebuilt = start in positions
+            end = start
+            while end + 1 < doc.page_count and ((end + 1) in positions) == from_rebuilt:
+                end += 1
+            if from_rebuilt:
+                inserer(positions[start], positions[end])
+            else:
+                output.insert_pdf(doc, from_page=start, to_page=end)
+            start = end + 1
+    finally:
+        if rebuilt_doc is not None:
+            rebuilt_doc.close()
+        elif rebuilt is not None:
+            rebuilt.close()
+
+    for page_num, rects in (redactions or {}).items():
+        if rects:
+            masquer_zones(output[page_num], rects)
+
+    if apply is not None:
+        reportees = reporter_annotations(doc, output, rebuilt_pages)
+        stats = scrub_pdf(doc, output, apply, anonymisation)
+        stats["annotations reportées"] = reportees
+        logger.info(f"🧹 Textes hors pages nettoyés: {stats}")
+    return output
+
+def write_pdf(output: fitz.Document) -> bytes:
+    """
+    Sérialise et ferme un document assemblé.
+    """
+    pdf_bytes = output.tobytes(garbage=1, deflate=True)
+    output.close()
+    return pdf_bytes
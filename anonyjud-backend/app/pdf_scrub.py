@@ -0,0 +1,136 @@
+"""
+Nettoyage des textes hors contenu de page d'un PDF anonymisé
+Métadonnées, XMP, signets, annotations, champs de formulaire et fichiers joints
+passent par la même fonction de remplacement que le texte des pages. Les annotations
+des pages reconstituées sont d'abord reportées depuis le document d'origine
+"""
+import logging
+from typing import Callable, Dict, Iterable
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+# Clés de métadonnées reportées dans le document produit
+_METADATA_KEYS = ("title", "author", "subject", "keywords", "creator", "producer")
+
+# Champs d'information des annotations susceptibles de contenir du texte saisi
+_ANNOT_INFO_KEYS = ("content", "title", "subject")
+
+def reporter_annotations(source: fitz.Document, output: fitz.Document, pages: Iterable[int]) -> int:
+    """
+    Reporte sur les pages reconstituées `pages` de `output` les annotations (et champs de
+    formulaire) des pages correspondantes de `source`, à nettoyer ensuite par scrub_pdf.
+    La page d'origine est recopiée en fin de document le temps d'en détacher les annotations.
+
+    Returns:
+        Nombre d'annotations reportées
+    """
+    reportees = 0
+    for page_num in pages:
+        if source.xref_get_key(source[page_num].xref, "Annots")[0] == "null":
+            continue
+        temporaire = output.page_count
+        output.insert_pdf(source, from_page=page_num, to_page=page_num)
+        copie, cible = output[temporaire], output[page_num]
+        xrefs = [xref for xref, *_ in copie.annot_xrefs()]
+        if xrefs:
+            existantes = [xref for xref, *_ in cible.annot_xrefs()]
+            output.xref_set_key(cible.xref, "Annots", "[" + " ".join(f"{xref} 0 R" for xref in existantes + xrefs) + "]")
+            for xref in xrefs:
+                output.xref_set_key(xref, "P", f"{cible.xref} 0 R")
+            output.xref_set_key(copie.xref, "Annots", "null")
+            reportees += len(xrefs)
+        output.delete_page(temporaire)
+    return reportees
+
+def scrub_pdf(source: fitz.Document, output: fitz.Document, apply: Callable[[str], str],
+              anonymisation: bool = True) -> Dict[str, int]:
+    """
+    Reporte dans `output` les textes hors pages de `source` après remplacement,
+    et remplace en place les annotations et champs de formulaire de `output`.
+    Les pages de `output` doivent correspondre une à une à celles de `source`.
+
+    Args:
+        source: Document d'origine
+        output: Document produit (pages recopiées ou reconstituées)
+        apply: Fonction de remplacement (ex: CompiledMatcher.apply)
+        anonymisation: False pour une dé-anonymisation, qui recopie tels quels les
+            fichiers joints non textuels au lieu de les retirer
+
+    Returns:
+        Compteurs des éléments traités par catégorie
+    """
+    stats = {"metadata": 0, "signets": 0, "annotations": 0, "champs": 0, "fichiers": 0}
+
+    # Métadonnées du dictionnaire Info
+    metadata = source.metadata or {}
+    scrubbed = {key: apply(metadata[key]) for key in _METADATA_KEYS if metadata.get(key)}
+    if scrubbed:
+        output.set_metadata(scrubbed)
+        stats["metadata"] = len(scrubbed)
+
+    # Métadonnées XMP : remplacement dans le XML brut (les balises ne contiennent pas de données)
+    try:
+        xmp = source.get_xml_metadata()
+        if xmp:
+            output.set_xml_metadata(apply(xmp))
+            stats["metadata"] += 1
+    except Exception as e:
+        logger.warning(f"⚠️ Métadonnées XMP non reportées: {str(e)}")
+
+    # Signets (titres du sommaire)
+    toc = source.get_toc(simple=True)
+    if toc:
+        output.set_toc([[level, apply(title), page] for level, title, page, *_ in toc])
+        stats["signets"] = len(toc)
+
+    # Annotations et champs de formulaire, page par page
+    for page in output:
+        broken = []
+        for annot in page.annots() or ():
+            try:
+                info = annot.info
+                changes = {key: apply(info[key]) for key in _ANNOT_INFO_KEYS if info.get(key)}
+                if any(changes[key] != info[key] for key in changes):
+                    annot.set_info(**changes)
+                    # Régénère l'apparence (texte visible des FreeText)
+                    annot.update()
+                stats["annotations"] += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Annotation non nettoyée, supprimée (page {page.number + 1}): {str(e)}")
+                broken.append(annot.xref)
+        for xref in broken:
+            page.delete_annot(page.load_annot(xref))
+        for widget in page.widgets() or ():
+            try:
+                value = widget.field_value
+                if isinstance(value, str) and value:
+                    replaced = apply(value)
+                    if replaced != value:
+                        widget.field_value = replaced
+                        widget.update()
+                stats["champs"] += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Champ de formulaire non nettoyé (page {page.number + 1}): {str(e)}")
+
+    # Fichiers joints : seuls les fichiers texte peuvent être anonymisés, les autres sont
+    # retirés à l'anonymisation et recopiés tels quels à la dé-anonymisation
+    for index in range(source.embfile_count()):
+        info = source.embfile_info(index)
+        content = source.embfile_get(index)
+        try:
+            content = apply(content.decode("utf-8")).encode("utf-8")
+        except UnicodeDecodeError:
+            if anonymisation:
+                logger.warning(f"⚠️ Fichier joint non textuel retiré: {info['name']}")
+                continue
+        output.embfile_add(
+            apply(info["name"]),
+            content,
+            filename=apply(info.get("filename") or info["name"]),
+            desc=apply(info.get("description") or ""),
+        )
+        stats["fichiers"] += 1
+
+    return stats
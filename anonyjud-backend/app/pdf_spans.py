@@ -0,0 +1,110 @@
+"""
+Spans de texte d'une page PDF rangés en colonnes
+Un span est une ligne de chaque colonne (tableaux compacts de nombres, polices internées)
+plutôt qu'un dictionnaire : quelques dizaines d'octets par span au lieu de plusieurs centaines
+"""
+import sys
+from array import array
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+class SpanStore:
+    """
+    Spans d'une page : texte, cadre (x0, y0, x1, y1), origine de la ligne de base,
+    taille, drapeaux et couleur de police, chacun dans sa colonne.
+    """
+    __slots__ = ("textes", "x0", "y0", "x1", "y1", "ox", "oy", "tailles", "drapeaux", "couleurs",
+                 "polices", "noms_polices", "_index_polices")
+
+    def __init__(self):
+        self.textes: List[str] = []
+        self.x0 = array("d")
+        self.y0 = array("d")
+        self.x1 = array("d")
+        self.y1 = array("d")
+        self.ox = array("d")
+        self.oy = array("d")
+        self.tailles = array("d")
+        self.drapeaux = array("i")
+        # Couleur sRGB entière de PyMuPDF (0xRRGGBB)
+        self.couleurs = array("I")
+        # Indice dans noms_polices : une page n'utilise que quelques polices
+        self.polices = array("H")
+        self.noms_polices: List[str] = []
+        self._index_polices: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.textes)
+
+    def _police(self, nom: str) -> int:
+        index = self._index_polices.get(nom)
+        if index is None:
+            index = self._index_polices[nom] = len(self.noms_polices)
+            self.noms_polices.append(sys.intern(nom))
+        return index
+
+    def ajouter(self, span: dict) -> None:
+        """
+        Ajoute un span de page.get_text("dict").
+        """
+        x0, y0, x1, y1 = span["bbox"]
+        # Ligne de base d'origine si connue, sinon bas du cadre du span
+        ox, oy = span.get("origin") or (x0, y1)
+        self.textes.append(span["text"])
+        self.x0.append(x0)
+        self.y0.append(y0)
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.ox.append(ox)
+        self.oy.append(oy)
+        self.tailles.append(span["size"])
+        self.drapeaux.append(span["flags"])
+        self.couleurs.append(span.get("color") or 0)
+        self.polices.append(self._police(span["font"]))
+
+    def remplacer(self, apply: Callable[[str], str]) -> int:
+        """
+        Applique `apply` à toute la colonne de texte ; un texte répété (en-tête, pied de
+        page, ponctuation) n'est traité qu'une fois.
+
+        Returns:
+            Nombre de spans modifiés
+        """
+        remplacements: Dict[str, str] = {}
+        textes = self.textes
+        modifies = 0
+        for index, texte in enumerate(textes):
+            remplace = remplacements.get(texte)
+            if remplace is None:
+                remplace = remplacements[texte] = apply(texte)
+            if remplace != texte:
+                textes[index] = remplace
+                modifies += 1
+        return modifies
+
+    def visibles(self) -> "np.ndarray":
+        """
+        Indices des spans qui ne sont pas que des blancs.
+        """
+        return np.fromiter((index for index, texte in enumerate(self.textes) if texte.strip()), dtype=np.intp)
+
+    def deplacements(self, hauteur: float, indices: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Déplacements (dx, dy) en coordonnées reportlab (origine en bas) d'une ligne de base
+        à la suivante pour les spans `indices`, depuis l'origine de la page : toute la page
+        en une opération sur les colonnes.
+        """
+        # Vues sur les colonnes, sans copie
+        x = np.frombuffer(self.ox, dtype=np.float64)[indices]
+        y = hauteur - np.frombuffer(self.oy, dtype=np.float64)[indices]
+        return np.diff(x, prepend=0.0), np.diff(y, prepend=0.0)
+
+    def lignes(self, indices: "np.ndarray") -> Iterator[Tuple[str, str, float, int, int]]:
+        """
+        Spans `indices` dans l'ordre : (texte, police, taille, drapeaux, couleur).
+        """
+        noms = self.noms_polices
+        for index in indices.tolist():
+            yield (self.textes[index], noms[self.polices[index]], self.tailles[index],
+                   self.drapeaux[index], self.couleurs[index])
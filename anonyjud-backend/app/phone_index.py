@@ -0,0 +1,86 @@
+"""
+Index des numéros de téléphone des tiers
+Numéros normalisés (chiffres seuls, indicatif +33/0033 ramené au 0 national) dans une table de hachage,
+reconnus en un seul balayage des suites de chiffres du texte, quel que soit leur format
+"""
+import re
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+# Suite de chiffres avec séparateurs optionnels, préfixe international éventuel (+33, 0033, +33 (0))
+PHONE_RUN_PATTERN = r'(?<![\d+])(?:(?:\+|00)\d{2}[ .\-]?(?:\(0\)[ .\-]?)?)?\d(?:[ .\-]?\d){5,}(?!\d)'
+
+PHONE_RUN_SEPARATORS = " .-"
+
+# Longueur minimale d'un numéro normalisé indexé
+MIN_PHONE_DIGITS = 6
+
+_NON_DIGITS = re.compile(r'\D')
+
+def normalize_phone(value: str) -> str:
+    """
+    Normalise un numéro au format national : chiffres seuls, indicatif +33/0033 remplacé par 0.
+
+    "06 12 34 56 78", "+33 6 12 34 56 78", "0033612345678" et "+33 (0)6.12.34.56.78"
+    donnent tous "0612345678".
+    """
+    value = value.strip().replace("(0)", "")
+    digits = _NON_DIGITS.sub("", value)
+    if value.startswith("+"):
+        return "0" + digits[2:] if digits.startswith("33") else "00" + digits
+    if digits.startswith("0033"):
+        return "0" + digits[4:]
+    return digits
+
+class PhoneIndex:
+    """
+    Table des numéros normalisés de tous les tiers -> balise.
+    """
+    def __init__(self):
+        self._numbers: Dict[str, str] = {}
+        self._lengths: Set[int] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self._numbers)
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    def add(self, value: str, tag: str) -> None:
+        """
+        Indexe un numéro ; le premier tiers déclarant un numéro garde sa balise.
+        """
+        key = normalize_phone(value)
+        if len(key) >= MIN_PHONE_DIGITS:
+            self._numbers.setdefault(key, tag)
+            self._lengths.add(len(key))
+
+    def lookup(self, run: str) -> Optional[str]:
+        """
+        Balise du numéro si la suite de chiffres complète est un numéro connu.
+        """
+        return self._numbers.get(normalize_phone(run))
+
+    def iter_embedded(self, run: str) -> Iterator[Tuple[int, int, str]]:
+        """
+        Cherche les numéros connus à l'intérieur d'une suite plus longue
+        (ex: deux numéros accolés "06 12 34 56 78 01 23 45 67 89").
+        Les numéros ne commencent et ne finissent qu'aux frontières de groupes de chiffres.
+
+        Yields:
+            Tuples (début, fin, balise) relatifs à la suite
+        """
+        n = len(run)
+        starts = [i for i in range(n) if run[i] not in PHONE_RUN_SEPARATORS and (i == 0 or run[i - 1] in PHONE_RUN_SEPARATORS)]
+        ends = [j for j in range(1, n + 1) if run[j - 1].isdigit() and (j == n or run[j] in PHONE_RUN_SEPARATORS)]
+        position = 0
+        for start in starts:
+            if start < position:
+                continue
+            for end in reversed(ends):
+                if end <= start:
+                    break
+                key = normalize_phone(run[start:end])
+                if len(key) in self._lengths and key in self._numbers:
+                    yield start, end, self._numbers[key]
+                    position = end
+                    break
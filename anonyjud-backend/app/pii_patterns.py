@@ -0,0 +1,124 @@
+"""
+Détection basique des données personnelles (sans tiers)
+Toutes les familles de motifs sont réunies dans une seule regex compilée,
+appliquée en un passage avec un dictionnaire inverse valeur -> balise
+"""
+import re
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .phone_index import normalize_phone
+
+_SPACES = re.compile(r'[\s.\-]')
+
+# Lettres autorisées sur les plaques SIV (ni I, ni O, ni U)
+_SIV_LETTERS = r'[A-HJ-NP-TV-Z]'
+
+_MOIS = r'janvier|f[ée]vrier|mars|avril|mai|juin|juillet|ao[uû]t|septembre|octobre|novembre|d[ée]cembre'
+
+# Ordre des familles = priorité en cas de chevauchement (les plus longues d'abord)
+PII_PATTERN = re.compile(
+    r'(?P<EMAIL>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b)'
+    r'|(?P<IBAN>\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,4})?\b)'
+    r'|(?P<NIR>(?<!\d)[12][ .]?\d{2}[ .]?(?:0[1-9]|1[0-2]|[2-9]\d)[ .]?(?:\d{2}|2[ABab])[ .]?\d{3}[ .]?\d{3}(?:[ .]?\d{2})?(?!\d))'
+    r'|(?P<SIRET>(?<!\d)\d{3} ?\d{3} ?\d{3} ?\d{5}(?!\d))'
+    r'|(?P<TEL>(?<!\d)(?:0|\+33 ?|0033 ?)[1-9](?:[ .-]?[0-9]{2}){4}(?!\d))'
+    r'|(?P<CONTEXTE_NAISSANCE>(?i:\bn[ée]e?\s+le|\bdate\s+de\s+naissance\s*:?)\s*)'
+    r'(?P<DATENAISSANCE>\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{1,2}(?:er)?\s+(?i:' + _MOIS + r')\s+\d{4})'
+    r'|(?P<PLAQUE>\b' + _SIV_LETTERS + r'{2}[- ]?\d{3}[- ]?' + _SIV_LETTERS + r'{2}\b)'
+)
+
+def _normalize_identifier(value: str) -> str:
+    return _SPACES.sub('', value).upper()
+
+# Clé de déduplication par famille : un même numéro écrit différemment garde sa balise
+_KEYS: Dict[str, Callable[[str], str]] = {
+    "TEL": normalize_phone,
+    "IBAN": _normalize_identifier,
+    "NIR": _normalize_identifier,
+    "SIRET": _normalize_identifier,
+    "PLAQUE": _normalize_identifier,
+    "EMAIL": str.lower,
+}
+
+# Familles balisées (le contexte des dates de naissance n'est pas une valeur)
+_FAMILIES = frozenset(PII_PATTERN.groupindex) - {"CONTEXTE_NAISSANCE"}
+_TAG = re.compile(r'([A-Z]+)(\d+)')
+
+class PiiTagger:
+    """
+    Attribution des balises de la détection basique : une même valeur (à l'écriture près)
+    garde sa balise d'un bout à l'autre du texte, même traité en plusieurs fois.
+    Avec `known` (ex: le mapping d'un projet), la numérotation reprend après les balises
+    déjà attribuées et une valeur déjà connue retrouve sa balise.
+    """
+    def __init__(self, known: Optional[Dict[str, str]] = None):
+        self.mapping: Dict[str, str] = {}
+        self._reverse: Dict[Tuple[str, str], str] = {}
+        self._counters: Dict[str, int] = {}
+        self._known: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        for tag, value in (known or {}).items():
+            found = _TAG.fullmatch(tag)
+            if found is None or found.group(1) not in _FAMILIES:
+                continue
+            family, number = found.group(1), int(found.group(2))
+            self._counters[family] = max(self._counters.get(family, 0), number)
+            self._known.setdefault((family, _KEYS.get(family, str)(value)), (tag, value))
+
+    def tag(self, match: "re.Match") -> str:
+        family = match.lastgroup
+        value = match.group(family)
+        key = (family, _KEYS.get(family, str)(value))
+        tag = self._reverse.get(key)
+        if tag is None:
+            # Une valeur déjà connue garde sa balise et l'écriture mémorisée avec elle
+            tag, value = self._known.get(key, (None, value))
+            if tag is None:
+                self._counters[family] = self._counters.get(family, 0) + 1
+                tag = f"{family}{self._counters[family]}"
+            self._reverse[key] = tag
+            self.mapping[tag] = value
+        return tag
+
+    def replace(self, match: "re.Match") -> str:
+        tag = self.tag(match)
+        if match.lastgroup == "DATENAISSANCE":
+            # Le contexte ("né le", "date de naissance :") est conservé
+            return match.group("CONTEXTE_NAISSANCE") + tag
+        return tag
+
+    def apply(self, text: str) -> str:
+        return PII_PATTERN.sub(self.replace, text)
+
+    def has_match(self, text: str) -> bool:
+        """
+        Indique si le texte contient au moins une donnée reconnaissable (sans attribuer de balise).
+        """
+        return bool(text) and PII_PATTERN.search(text) is not None
+
+    def finditer(self, text: str, limit: Optional[int] = None) -> Iterator[Tuple[int, int, str]]:
+        """
+        Positions des données reconnues commençant avant `limit` ; les balises ne sont
+        attribuées qu'aux valeurs retournées.
+
+        Yields:
+            Tuples (début, fin, remplacement), le contexte des dates de naissance compris
+        """
+        for match in PII_PATTERN.finditer(text):
+            if limit is not None and match.start() >= limit:
+                return
+            yield match.start(), match.end(), self.replace(match)
+
+def detect_basic_pii(text: str, known: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Anonymise les données personnelles reconnaissables sans tiers : téléphones, emails,
+    IBAN, numéros de sécurité sociale (NIR), SIRET, dates de naissance et plaques d'immatriculation.
+
+    Args:
+        text: Le texte à anonymiser
+        known: Balises déjà attribuées, dont la numérotation est poursuivie (optionnel)
+
+    Returns:
+        Tuple contenant (texte_anonymisé, mapping_des_remplacements)
+    """
+    tagger = PiiTagger(known)
+    return tagger.apply(text), tagger.mapping
@@ -0,0 +1,247 @@
+"""
+Stockage persistant des projets d'expertise
+SQLite embarqué + cache en mémoire des projets actifs (tiers, mapping, historique)
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .models import HISTORIQUE_MAX, Projet
+
+logger = logging.getLogger(__name__)
+
+# Durée pendant laquelle un mot de passe vérifié n'est pas redérivé (PBKDF2), en secondes
+ACCES_TTL = float(os.getenv("ANONYJUD_PROJET_ACCES_TTL", "300"))
+
+class ProjetIntrouvable(KeyError):
+    """Le projet demandé n'existe pas."""
+
+class AccesProjetRefuse(PermissionError):
+    """Le mot de passe fourni ne correspond pas au projet."""
+
+class ConflitBalises(ValueError):
+    """Des balises de l'opération désignent déjà d'autres valeurs dans le projet."""
+    def __init__(self, conflits: Dict[str, Tuple[str, str]]):
+        self.conflits = conflits
+        details = ", ".join(f"{tag} ({ancienne!r} / {nouvelle!r})" for tag, (ancienne, nouvelle) in conflits.items())
+        super().__init__(f"Balises déjà attribuées à d'autres valeurs dans le projet: {details}")
+
+class ProjetStore:
+    """
+    Magasin de projets adossé à SQLite avec un cache LRU en mémoire.
+
+    Les projets récemment utilisés restent en mémoire pour éviter de
+    relire et re-parser leurs tiers et leur mapping à chaque requête.
+    """
+    def __init__(self, db_path: str, cache_size: int = 128):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cache: "OrderedDict[str, Projet]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Accès déjà vérifiés : (projet, empreinte HMAC du mot de passe) -> échéance.
+        # La clé HMAC, propre au processus, évite de garder en mémoire un hachage rapide du mot de passe
+        self._acces: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cle_acces = os.urandom(32)
+
+    def _connexion(self) -> sqlite3.Connection:
+        # Ouverture paresseuse : aucun fichier n'est créé tant qu'aucun projet n'est utilisé
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS projets (
+                    id TEXT PRIMARY KEY,
+                    nom TEXT NOT NULL,
+                    mot_de_passe_json TEXT NOT NULL,
+                    tiers_json TEXT NOT NULL DEFAULT '[]',
+                    mapping_json TEXT NOT NULL DEFAULT '{}',
+                    historique_json TEXT NOT NULL DEFAULT '[]'
+                )
+                """
+            )
+            self._conn.commit()
+            logger.info(f"🗄️ Base de projets ouverte: {self.db_path}")
+        return self._conn
+
+    def _mettre_en_cache(self, projet: Projet) -> None:
+        self._cache[projet.id] = projet
+        self._cache.move_to_end(projet.id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _enregistrer(self, projet: Projet) -> None:
+        conn = self._connexion()
+        conn.execute(
+            """
+            INSERT INTO projets (id, nom, mot_de_passe_json, tiers_json, mapping_json, historique_json)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                nom = excluded.nom,
+                tiers_json = excluded.tiers_json,
+                mapping_json = excluded.mapping_json,
+                historique_json = excluded.historique_json
+            """,
+            (
+                projet.id,
+                projet.nom,
+                json.dumps(projet.mot_de_passe),
+                json.dumps(projet.tiers, ensure_ascii=False),
+                json.dumps(projet.mapping, ensure_ascii=False),
+                json.dumps(projet.historique[-HISTORIQUE_MAX:], ensure_ascii=False),
+            ),
+        )
+        conn.commit()
+
+    def creer(self, nom: str, mot_de_passe: str, tiers: Optional[List[Dict[str, Any]]] = None) -> Projet:
+        """
+        Crée et persiste un nouveau projet.
+        """
+        projet = Projet(nom, mot_de_passe, tiers=tiers)
+        projet.ajouter_historique("creation", tiers=len(projet.tiers))
+        with self._lock:
+            self._enregistrer(projet)
+            self._mettre_en_cache(projet)
+        logger.info(f"✅ Projet créé: {projet.id} ({nom})")
+        return projet
+
+    def obtenir(self, projet_id: str) -> Projet:
+        """
+        Retourne le projet depuis le cache, ou depuis SQLite à défaut.
+
+        Raises:
+            ProjetIntrouvable: si aucun projet ne correspond
+        """
+        with self._lock:
+            projet = self._cache.get(projet_id)
+            if projet is not None:
+                self._cache.move_to_end(projet_id)
+                return projet
+
+            row = self._connexion().execute(
+                "SELECT nom, mot_de_passe_json, tiers_json, mapping_json, historique_json FROM projets WHERE id = ?",
+                (projet_id,),
+            ).fetchone()
+            if row is None:
+                raise ProjetIntrouvable(projet_id)
+
+            nom, mot_de_passe_json, tiers_json, mapping_json, historique_json = row
+            projet = Projet(
+                nom,
+                json.loads(mot_de_passe_json),
+                projet_id=projet_id,
+                tiers=json.loads(tiers_json),
+                mapping=json.loads(mapping_json),
+                historique=json.loads(historique_json),
+            )
+            self._mettre_en_cache(projet)
+            return projet
+
+    def ouvrir(self, projet_id: str, mot_de_passe: Optional[str]) -> Projet:
+        """
+        Retourne le projet après vérification du mot de passe.
+
+        Raises:
+            ProjetIntrouvable: si aucun projet ne correspond
+            AccesProjetRefuse: si le mot de passe est incorrect
+        """
+        projet = self.obtenir(projet_id)
+        if not mot_de_passe:
+            raise AccesProjetRefuse(projet_id)
+        # La dérivation PBKDF2 (volontairement coûteuse) n'est faite qu'une fois par ACCES_TTL
+        cle = (projet_id, hmac.new(self._cle_acces, mot_de_passe.encode("utf-8"), hashlib.sha256).hexdigest())
+        maintenant = time.monotonic()
+        with self._lock:
+            echeance = self._acces.get(cle)
+            if echeance is not None and echeance > maintenant:
+                self._acces.move_to_end(cle)
+                return projet
+        if not projet.verifier_mot_de_passe(mot_de_passe):
+            raise AccesProjetRefuse(projet_id)
+        with self._lock:
+            self._acces[cle] = maintenant + ACCES_TTL
+            self._acces.move_to_end(cle)
+            while len(self._acces) > self.cache_size:
+                self._acces.popitem(last=False)
+        return projet
+
+    def mettre_a_jour_tiers(self, projet: Projet, tiers: List[Dict[str, Any]]) -> None:
+        """
+        Remplace les tiers du projet. Les balises des tiers dont la valeur a été modifiée
+        prennent la nouvelle valeur dans le mapping, et sont notées dans l'historique.
+        """
+        with self._lock:
+            projet.tiers = tiers
+            modifiees = sorted(tag for tag, valeur in projet.matcher.mapping.items()
+                               if projet.mapping.get(tag, valeur) != valeur)
+            for tag in modifiees:
+                projet.mapping[tag] = projet.matcher.mapping[tag]
+            details = {"balises_modifiees": modifiees} if modifiees else {}
+            projet.ajouter_historique("mise_a_jour_tiers", tiers=len(tiers), **details)
+            self._enregistrer(projet)
+
+    def balises(self, projet: Projet) -> Dict[str, str]:
+        """
+        Copie du mapping du projet, à passer à l'anonymisation suivante : la détection
+        basique poursuit sa numérotation (TEL3 après TEL1 et TEL2) au lieu de l'écraser.
+        """
+        with self._lock:
+            return dict(projet.mapping)
+
+    def encodage_source(self, projet: Projet, nom_de_base: str) -> Optional[str]:
+        """
+        Encodage du fichier source mémorisé à la dernière anonymisation du fichier
+        `nom_de_base` (nom sans extension), pour le réécrire à l'identique au retour.
+        """
+        with self._lock:
+            for entree in reversed(projet.historique):
+                if (entree.get("operation") == "anonymisation_fichier" and entree.get("encodage")
+                        and os.path.splitext(entree.get("fichier") or "")[0] == nom_de_base):
+                    return entree["encodage"]
+        return None
+
+    def enregistrer_operation(self, projet: Projet, operation: str, mapping: Optional[Dict[str, str]] = None, **details: Any) -> None:
+        """
+        Fusionne le mapping produit par une opération et l'ajoute à l'historique.
+
+        Raises:
+            ConflitBalises: une balise désigne déjà une autre valeur dans le projet ; le
+                mapping n'est pas modifié (les fichiers produits avant resteraient sinon
+                dé-anonymisés avec la mauvaise valeur)
+        """
+        with self._lock:
+            if mapping:
+                conflits = {tag: (projet.mapping[tag], valeur) for tag, valeur in mapping.items()
+                            if projet.mapping.get(tag, valeur) != valeur}
+                if conflits:
+                    logger.warning(f"⚠️ Projet {projet.id}: {len(conflits)} balise(s) en conflit, opération refusée")
+                    raise ConflitBalises(conflits)
+                projet.mapping.update(mapping)
+            projet.ajouter_historique(operation, balises=len(mapping or {}), **details)
+            self._enregistrer(projet)
+
+    def supprimer(self, projet: Projet) -> None:
+        """
+        Supprime définitivement le projet.
+        """
+        with self._lock:
+            self._connexion().execute("DELETE FROM projets WHERE id = ?", (projet.id,))
+            self._connexion().commit()
+            self._cache.pop(projet.id, None)
+            for cle in [cle for cle in self._acces if cle[0] == projet.id]:
+                del self._acces[cle]
+        logger.info(f"🗑️ Projet supprimé: {projet.id}")
+
+# Magasin partagé par les endpoints
+projet_store = ProjetStore(
+    os.getenv("ANONYJUD_DB_PATH", "anonyjud_projets.db"),
+    cache_size=int(os.getenv("ANONYJUD_PROJET_CACHE_SIZE", "128")),
+)
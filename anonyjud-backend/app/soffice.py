@@ -0,0 +1,329 @@
+"""
+Conversion de documents par LibreOffice en mode headless
+Les processus soffice sont lancés une fois puis réutilisés (pool) : seule la première
+conversion paie le démarrage de LibreOffice. Les conversions sont mises en cache par
+empreinte du contenu, un même fichier envoyé pour l'aperçu puis le téléchargement
+n'est converti qu'une fois
+
+Le pilotage des processus passe par le pont UNO (module `uno` fourni avec LibreOffice) :
+dans l'application si son interpréteur le fournit, sinon par un processus compagnon lancé
+avec l'interpréteur Python de LibreOffice (soffice_pont). Sans pont UNO, la conversion
+est déclarée indisponible plutôt que de relancer LibreOffice à chaque fichier
+"""
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from . import soffice_pont
+
+logger = logging.getLogger(__name__)
+
+# Exécutable LibreOffice (recherché dans le PATH à défaut)
+SOFFICE_BINARY = os.getenv("ANONYJUD_SOFFICE", "") or shutil.which("soffice") or shutil.which("libreoffice") or ""
+# Module `uno` importable par l'application : pilotage des processus sans intermédiaire
+UNO_LOCAL = importlib.util.find_spec("uno") is not None
+# Interpréteur Python qui fournit `uno` (défaut : celui de LibreOffice, puis /usr/bin/python3)
+SOFFICE_PYTHON = os.getenv("ANONYJUD_SOFFICE_PYTHON", "")
+# Nombre de processus soffice gardés en vie
+SOFFICE_POOL_SIZE = int(os.getenv("ANONYJUD_SOFFICE_POOL", "1"))
+# Durée maximale d'une conversion, démarrage compris (secondes)
+SOFFICE_TIMEOUT = float(os.getenv("ANONYJUD_SOFFICE_TIMEOUT", "120"))
+# Nombre de conversions gardées en mémoire
+CONVERSION_CACHE_SIZE = int(os.getenv("ANONYJUD_CONVERSION_CACHE_SIZE", "32"))
+
+# Filtres d'export LibreOffice par extension produite
+FILTRES = {
+    "docx": "MS Word 2007 XML",
+    "doc": "MS Word 97",
+}
+
+SOFFICE_INTROUVABLE = ("Conversion des fichiers Word 97-2003 (.doc) indisponible : LibreOffice (soffice) "
+                       "n'est pas installé sur le serveur. Enregistrez le document au format .docx.")
+SANS_PONT_UNO = ("Conversion des fichiers Word 97-2003 (.doc) indisponible : le pont UNO de LibreOffice "
+                 "(paquet python3-uno) n'est pas installé sur le serveur. Enregistrez le document au format .docx.")
+
+class ConversionIndisponible(Exception):
+    """LibreOffice n'est pas installé"""
+
+class ErreurConversion(Exception):
+    """La conversion a échoué ou dépassé le délai"""
+
+@lru_cache(maxsize=1)
+def interpreteur_uno() -> Optional[str]:
+    """
+    "" si l'application importe `uno` elle-même, sinon l'interpréteur Python qui le fournit,
+    None si aucun (la conversion est alors indisponible).
+    """
+    if UNO_LOCAL:
+        return ""
+    if SOFFICE_PYTHON:
+        candidats = [SOFFICE_PYTHON]
+    else:
+        programme = os.path.dirname(os.path.realpath(SOFFICE_BINARY)) if SOFFICE_BINARY else ""
+        candidats = [os.path.join(programme, "python") if programme else "", "/usr/bin/python3"]
+    for candidat in candidats:
+        if not candidat or not os.path.exists(candidat):
+            continue
+        try:
+            subprocess.run([candidat, "-c", "import uno"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           timeout=30, check=True)
+            return candidat
+        except (subprocess.SubprocessError, OSError):
+            continue
+    logger.error(f"❌ LibreOffice sans pont UNO (interpréteurs essayés: {[c for c in candidats if c]}) : "
+                 "conversion des fichiers .doc désactivée, installez python3-uno")
+    return None
+
+def disponible() -> bool:
+    return raison_indisponible() is None
+
+def raison_indisponible() -> Optional[str]:
+    if not SOFFICE_BINARY:
+        return SOFFICE_INTROUVABLE
+    if interpreteur_uno() is None:
+        return SANS_PONT_UNO
+    return None
+
+def _port_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class _Instance:
+    """
+    Un processus soffice et son profil utilisateur, utilisés par une conversion à la fois,
+    piloté directement ou par son processus compagnon (pont).
+    """
+    def __init__(self, numero: int):
+        self.numero = numero
+        self.profil = tempfile.mkdtemp(prefix=f"anonyjud-soffice-{numero}-")
+        self.process: Optional[subprocess.Popen] = None
+        self.pont: Optional[subprocess.Popen] = None
+        self.port = 0
+        self._desktop = None
+
+    def _profil_url(self) -> str:
+        return f"-env:UserInstallation=file://{self.profil}"
+
+    def _demarrer(self) -> None:
+        self.port = _port_libre()
+        debut = time.perf_counter()
+        self.process = subprocess.Popen(
+            [SOFFICE_BINARY, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+             "--nolockcheck", self._profil_url(),
+             f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        interpreteur = interpreteur_uno()
+        try:
+            if interpreteur:
+                self._lancer_pont(interpreteur)
+            else:
+                self._desktop = soffice_pont.connecter(self.port, SOFFICE_TIMEOUT, lambda: self.process.poll() is not None)
+        except Exception as e:
+            self.arreter()
+            raise ErreurConversion(f"LibreOffice n'a pas pu être démarré: {str(e)}")
+        logger.info(f"🚀 LibreOffice #{self.numero} démarré en {round((time.perf_counter() - debut) * 1000)} ms"
+                    f"{' (pont ' + interpreteur + ')' if interpreteur else ''}")
+
+    def _lancer_pont(self, interpreteur: str) -> None:
+        self.pont = subprocess.Popen(
+            [interpreteur, soffice_pont.__file__, str(self.port), str(SOFFICE_TIMEOUT)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+        )
+        reponse = self._lire_pont()
+        if not reponse.get("pret"):
+            raise ErreurConversion(reponse.get("erreur", "pont UNO arrêté"))
+
+    def _lire_pont(self) -> Dict[str, object]:
+        ligne = self.pont.stdout.readline()
+        # Fin de flux : pont arrêté (délai dépassé ou processus mort)
+        return json.loads(ligne) if ligne else {"erreur": "pont UNO arrêté"}
+
+    def vivant(self) -> bool:
+        processus = [self.process] + ([self.pont] if self.pont is not None else [])
+        return self.process is not None and all(p.poll() is None for p in processus)
+
+    def convertir(self, entree: str, sortie: str, filtre: str) -> None:
+        if not self.vivant():
+            self.arreter()
+            self._demarrer()
+        # Une conversion bloquée ne peut pas être interrompue par UNO : les processus sont tués
+        surveillance = threading.Timer(SOFFICE_TIMEOUT, self.arreter)
+        surveillance.start()
+        try:
+            if self.pont is not None:
+                self.pont.stdin.write(json.dumps({"entree": entree, "sortie": sortie, "filtre": filtre}) + "\n")
+                self.pont.stdin.flush()
+                reponse = self._lire_pont()
+                if not reponse.get("ok"):
+                    raise ErreurConversion(reponse.get("erreur", "réponse du pont UNO invalide"))
+            else:
+                soffice_pont.convertir(self._desktop, entree, sortie, filtre)
+        except Exception as e:
+            self.arreter()
+            raise ErreurConversion(f"Conversion LibreOffice impossible: {str(e)}")
+        finally:
+            surveillance.cancel()
+
+    def arreter(self) -> None:
+        self._desktop = None
+        for processus in (self.pont, self.process):
+            if processus is not None and processus.poll() is None:
+                processus.kill()
+                processus.wait()
+        if self.pont is not None:
+            for flux in (self.pont.stdin, self.pont.stdout):
+                try:
+                    flux.close()
+                except (OSError, ValueError):
+                    pass
+        self.pont = None
+        self.process = None
+
+    def supprimer(self) -> None:
+        self.arreter()
+        shutil.rmtree(self.profil, ignore_errors=True)
+
+class _Pool:
+    """
+    Instances créées à la demande jusqu'à la taille du pool, puis partagées.
+    """
+    def __init__(self, taille: int):
+        self._taille = max(1, taille)
+        self._libres: "queue.Queue[_Instance]" = queue.Queue()
+        self._instances: List[_Instance] = []
+        self._lock = threading.Lock()
+
+    def _prendre(self) -> _Instance:
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._instances) < self._taille:
+                instance = _Instance(len(self._instances) + 1)
+                self._instances.append(instance)
+                return instance
+        try:
+            return self._libres.get(timeout=SOFFICE_TIMEOUT)
+        except queue.Empty:
+            raise ErreurConversion("LibreOffice est occupé, réessayez plus tard")
+
+    def _rendre(self, instance: _Instance) -> None:
+        with self._lock:
+            if instance in self._instances:
+                self._libres.put(instance)
+                return
+        # Pool arrêté pendant la conversion : l'instance est arrêtée à son retour
+        instance.supprimer()
+
+    def convertir(self, entree: str, sortie: str, filtre: str) -> None:
+        instance = self._prendre()
+        try:
+            instance.convertir(entree, sortie, filtre)
+        finally:
+            self._rendre(instance)
+
+    def demarrer(self) -> None:
+        instance = self._prendre()
+        try:
+            if not instance.vivant():
+                instance._demarrer()
+        finally:
+            self._rendre(instance)
+
+    def arreter(self) -> None:
+        """
+        Arrête les instances libres ; celles en cours de conversion le sont à leur retour.
+        """
+        with self._lock:
+            libres = []
+            while True:
+                try:
+                    libres.append(self._libres.get_nowait())
+                except queue.Empty:
+                    break
+            occupees = len(self._instances) - len(libres)
+            self._instances.clear()
+        for instance in libres:
+            instance.supprimer()
+        if occupees:
+            logger.info(f"⏳ {occupees} instance(s) LibreOffice arrêtée(s) à la fin de leur conversion")
+
+_pool = _Pool(SOFFICE_POOL_SIZE)
+
+_cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+statistiques: Dict[str, int] = {"conversions": 0, "cache": 0}
+
+def convertir(content: bytes, source: str, cible: str, cache: bool = True) -> bytes:
+    """
+    Convertit un document avec LibreOffice.
+
+    Args:
+        content: Document source
+        source: Extension du document source ("doc")
+        cible: Extension du document produit ("docx"), voir FILTRES
+        cache: Mémoriser le résultat par empreinte du contenu
+
+    Returns:
+        Le document converti
+    """
+    raison = raison_indisponible()
+    if raison:
+        raise ConversionIndisponible(raison)
+    cle = (hashlib.sha256(content).hexdigest(), cible)
+    if cache:
+        with _cache_lock:
+            resultat = _cache.get(cle)
+            if resultat is not None:
+                _cache.move_to_end(cle)
+                statistiques["cache"] += 1
+                return resultat
+
+    debut = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="anonyjud-conversion-") as dossier:
+        entree = os.path.join(dossier, f"source.{source}")
+        sortie = os.path.join(dossier, f"resultat.{cible}")
+        with open(entree, "wb") as f:
+            f.write(content)
+        _pool.convertir(entree, sortie, FILTRES[cible])
+        if not os.path.exists(sortie):
+            raise ErreurConversion(f"LibreOffice n'a pas produit de fichier .{cible}")
+        with open(sortie, "rb") as f:
+            resultat = f.read()
+    statistiques["conversions"] += 1
+    logger.info(f"🔁 Conversion .{source} -> .{cible} en {round((time.perf_counter() - debut) * 1000)} ms")
+
+    if cache:
+        with _cache_lock:
+            _cache[cle] = resultat
+            while len(_cache) > CONVERSION_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return resultat
+
+def demarrer() -> None:
+    """
+    Lance une instance à l'avance (préchauffage).
+    """
+    if disponible():
+        _pool.demarrer()
+
+def arreter() -> None:
+    """
+    Arrête les processus soffice et supprime leurs profils.
+    """
+    _pool.arreter()
@@ -0,0 +1,67 @@
+"""
+Pilotage d'un processus LibreOffice par le pont UNO
+Importé par l'application quand son interpréteur fournit le module `uno` ; sinon lancé
+comme script par l'interpréteur Python de LibreOffice (celui qui le fournit), à côté du
+processus soffice : une conversion par ligne sur l'entrée standard, en JSON
+{"entree", "sortie", "filtre"}, et une réponse par ligne, {"ok": true} ou {"erreur": "..."}.
+Ce module ne dépend pas du reste de l'application
+"""
+import json
+import sys
+import time
+from typing import Callable
+
+def connecter(port: int, delai: float, abandon: Callable[[], bool] = lambda: False):
+    """
+    Bureau (Desktop) du processus soffice qui écoute sur `port`, attendu au plus `delai` secondes.
+    """
+    import uno
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+    limite = time.monotonic() + delai
+    while True:
+        try:
+            contexte = resolver.resolve(f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext")
+            return contexte.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", contexte)
+        except Exception:
+            if abandon() or time.monotonic() > limite:
+                raise RuntimeError("LibreOffice n'a pas pu être démarré")
+            time.sleep(0.1)
+
+def convertir(desktop, entree: str, sortie: str, filtre: str) -> None:
+    import uno
+
+    def propriete(nom, valeur):
+        valeur_uno = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+        valeur_uno.Name = nom
+        valeur_uno.Value = valeur
+        return valeur_uno
+
+    document = desktop.loadComponentFromURL(uno.systemPathToFileUrl(entree), "_blank", 0,
+                                            (propriete("Hidden", True), propriete("ReadOnly", True)))
+    if document is None:
+        raise RuntimeError("Document illisible par LibreOffice")
+    try:
+        document.storeToURL(uno.systemPathToFileUrl(sortie),
+                            (propriete("FilterName", filtre), propriete("Overwrite", True)))
+    finally:
+        document.close(True)
+
+def servir(port: int, delai: float) -> None:
+    try:
+        desktop = connecter(port, delai)
+    except Exception as e:
+        print(json.dumps({"erreur": str(e)}), flush=True)
+        return
+    print(json.dumps({"pret": True}), flush=True)
+    for ligne in sys.stdin:
+        demande = json.loads(ligne)
+        try:
+            convertir(desktop, demande["entree"], demande["sortie"], demande["filtre"])
+            reponse = {"ok": True}
+        except Exception as e:
+            reponse = {"erreur": str(e)}
+        print(json.dumps(reponse), flush=True)
+
+if __name__ == "__main__":
+    servir(int(sys.argv[1]), float(sys.argv[2]))
@@ -0,0 +1,230 @@
+"""
+Remplacement en flux sur du texte décodé
+Le texte est traité par blocs avec un recouvrement : une valeur à cheval sur deux blocs
+est trouvée entière et la mémoire reste bornée quelle que soit la taille du fichier
+"""
+import codecs
+import os
+import tempfile
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from .deanonymizer import TagReplacer
+from .matcher import compile_tiers
+from .pii_patterns import PiiTagger
+
+# Taille des blocs de texte analysés d'un coup (caractères)
+STREAM_CHUNK_SIZE = int(os.getenv("ANONYJUD_STREAM_CHUNK_SIZE", "65536"))
+# Recouvrement entre deux blocs : doit dépasser la plus longue valeur recherchée
+STREAM_OVERLAP = int(os.getenv("ANONYJUD_STREAM_OVERLAP", "1024"))
+# Taille au-delà de laquelle le fichier produit est écrit sur disque plutôt qu'en mémoire
+STREAM_SPOOL_SIZE = int(os.getenv("ANONYJUD_STREAM_SPOOL_SIZE", str(8 * 1024 * 1024)))
+# Taille des lectures dans le fichier source (octets)
+STREAM_READ_SIZE = 64 * 1024
+
+class Scanner(Protocol):
+    """
+    Recherche commune au matcher des tiers, à la détection basique et aux balises.
+    """
+    mapping: Dict[str, str]
+
+    def finditer(self, text: str, limit: Optional[int] = None) -> Iterator[Tuple[int, int, str]]: ...
+
+def creer_scanner(tiers: Optional[List[Dict[str, Any]]] = None, mapping: Optional[Dict[str, str]] = None) -> Scanner:
+    """
+    Anonymisation (tiers, détection basique sans tiers) ou dé-anonymisation (mapping).
+    Le mapping de la détection basique se complète au fil du traitement ; à l'anonymisation,
+    `mapping` donne les balises déjà attribuées (ex: celles du projet), dont la numérotation est poursuivie.
+    """
+    if tiers is None:
+        return TagReplacer(mapping or {})
+    if tiers:
+        return compile_tiers(tiers)
+    return PiiTagger(mapping)
+
+class StreamReplacer:
+    """
+    Remplacement incrémental : feed() accepte des morceaux de texte de toute taille et
+    retourne la partie définitivement traitée, flush() termine le texte en cours.
+    """
+    def __init__(self, scanner: Scanner, chunk_size: int = STREAM_CHUNK_SIZE, overlap: int = STREAM_OVERLAP):
+        self._scanner = scanner
+        self._chunk_size = chunk_size
+        self._overlap = overlap
+        self._pending: List[str] = []
+        self._pending_length = 0
+
+    def feed(self, text: str) -> str:
+        if not text:
+            return ""
+        self._pending.append(text)
+        self._pending_length += len(text)
+        if self._pending_length < self._chunk_size + self._overlap:
+            return ""
+        return self._process(self._pending_length - self._overlap)
+
+    def flush(self) -> str:
+        """
+        Traite tout le texte en attente ; le texte suivant est considéré comme indépendant.
+        """
+        return self._process(self._pending_length) if self._pending_length else ""
+
+    def _process(self, boundary: int) -> str:
+        """
+        Émet le texte en attente jusqu'à `boundary` au plus ; la suite reste en attente pour
+        le bloc suivant. La coupure se fait sur le dernier blanc extérieur aux valeurs
+        trouvées, pour que le bloc suivant commence à une limite de mot et soit analysé
+        comme il l'aurait été dans le texte entier (limites de mots, lookbehind).
+        """
+        text = "".join(self._pending)
+        final = boundary >= len(text)
+        matches = []
+        stop = boundary
+        for start, end, replacement in self._scanner.finditer(text, boundary):
+            if end > boundary and start > 0 and not final:
+                # À cheval sur la limite : reportée au bloc suivant
+                stop = start
+                break
+            matches.append((start, end, replacement))
+
+        cut = len(text) if final else self._coupure(text, matches, stop)
+        pieces = []
+        position = 0
+        for start, end, replacement in matches:
+            if end > cut:
+                break
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            position = end
+        pieces.append(text[position:cut])
+
+        rest = text[cut:]
+        self._pending = [rest] if rest else []
+        self._pending_length = len(rest)
+        return "".join(pieces)
+
+    @staticmethod
+    def _coupure(text: str, matches: List[Tuple[int, int, str]], stop: int) -> int:
+        """
+        Position du dernier blanc avant `stop` qui n'est pas à l'intérieur d'une valeur.
+        """
+        search_end = stop
+        for start, end, _ in reversed(matches):
+            blank = max(text.rfind(" ", end, search_end), text.rfind("\n", end, search_end))
+            if blank >= 0:
+                return blank
+            search_end = start
+        blank = max(text.rfind(" ", 0, search_end), text.rfind("\n", 0, search_end))
+        if blank > 0:
+            return blank
+        # Aucun blanc (texte sans espace sur tout le bloc) : coupure franche
+        return max(stop, matches[-1][1] if matches else 0)
+
+def replace_chunks(chunks: Iterable[str], scanner: Scanner) -> Iterator[str]:
+    """
+    Applique le scanner à une suite de morceaux d'un même texte.
+    """
+    replacer = StreamReplacer(scanner)
+    for chunk in chunks:
+        output = replacer.feed(chunk)
+        if output:
+            yield output
+    output = replacer.flush()
+    if output:
+        yield output
+
+def split_text(text: str, size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Découpe un texte déjà en mémoire en blocs pour replace_chunks.
+    """
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+def replace_text(text: str, scanner: Scanner) -> str:
+    return "".join(replace_chunks(split_text(text), scanner))
+
+# Encodage des fichiers texte
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+def detecter_encodage(head: bytes, defaut: Optional[str] = None, origine: Optional[str] = None) -> Tuple[str, bytes]:
+    """
+    Encodage d'un fichier texte d'après son début : BOM, sinon UTF-8 s'il est valide,
+    sinon l'encodage par défaut fourni ou Windows-1252.
+    `origine` est l'encodage du fichier source d'un aller-retour : un fichier anonymisé
+    devenu pur ASCII (accents remplacés par des balises) ne dit plus le sien, et serait
+    sinon réécrit en UTF-8 à la dé-anonymisation.
+
+    Returns:
+        Tuple (encodage, BOM à recopier en tête du fichier produit)
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, bom
+    if origine and not origine.startswith("utf-16") and head.isascii():
+        return origine, b""
+    try:
+        # Un caractère coupé en fin d'extrait n'est pas une erreur
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8", b""
+    except UnicodeDecodeError:
+        return defaut or "cp1252", b""
+
+def _errors(encoding: str) -> str:
+    # Les octets invalides d'un encodage compatible ASCII sont recopiés tels quels
+    return "replace" if encoding.startswith("utf-16") else "surrogateescape"
+
+def iter_decoded(source: IO[bytes], encoding: str, skip: int = 0,
+                 progress: Optional[Callable[[int], None]] = None) -> Iterator[str]:
+    """
+    Lit et décode un fichier par blocs.
+
+    Args:
+        source: Fichier binaire positionné au début
+        encoding: Encodage du texte
+        skip: Octets à ignorer en tête (BOM)
+        progress: Appelé avec le nombre d'octets lus après chaque bloc
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(_errors(encoding))
+    if skip:
+        source.read(skip)
+    lus = skip
+    while True:
+        data = source.read(STREAM_READ_SIZE)
+        if not data:
+            break
+        lus += len(data)
+        text = decoder.decode(data)
+        if text:
+            yield text
+        if progress:
+            progress(lus)
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+def suivi_octets(progress, total: int) -> Optional[Callable[[int], None]]:
+    """
+    Adapte une fonction de rappel d'avancement (étape, courant, total) aux octets lus.
+    """
+    if progress is None:
+        return None
+    return lambda lus: progress("lecture", min(lus, total), total)
+
+def encoder(text: str, encoding: str) -> bytes:
+    return text.encode(encoding, _errors(encoding))
+
+def spool() -> IO[bytes]:
+    """
+    Fichier produit : en mémoire jusqu'à STREAM_SPOOL_SIZE, sur disque au-delà.
+    """
+    return tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE)
+
+def lire_spool(output: IO[bytes]) -> bytes:
+    output.seek(0)
+    data = output.read()
+    output.close()
+    return data
@@ -0,0 +1,118 @@
+"""
+Préchauffage au démarrage du worker
+Exerce une fois les bibliothèques lourdes des modules de traitement chargés
+(PyMuPDF, reportlab, python-docx, odfpy, LibreOffice) pour que la première requête après un
+démarrage à froid n'en paie pas le coût
+"""
+import io
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 0 pour désactiver le préchauffage (tests, scripts)
+WARMUP_ENABLED = os.getenv("ANONYJUD_WARMUP", "1") != "0"
+
+# Dernier rapport de démarrage (durées en millisecondes)
+rapport_demarrage: Dict[str, Any] = {}
+
+def _fitz() -> None:
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Préchauffage")
+    page.get_text("dict")
+    page.get_drawings()
+    fitz.open(stream=doc.tobytes(), filetype="pdf").close()
+    doc.close()
+
+def _reportlab() -> None:
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfgen import canvas
+    from .pdf_fonts import BASE14_FONTS
+    for font_name in BASE14_FONTS:
+        pdfmetrics.getFont(font_name)
+    c = canvas.Canvas(io.BytesIO())
+    text = c.beginText(72, 72)
+    text.setFont("Helvetica", 10)
+    text.textOut("Préchauffage")
+    c.drawText(text)
+    c.showPage()
+    c.save()
+
+def _styles_pdf() -> None:
+    from .handlers.pdf import styles_pdf_texte
+    styles_pdf_texte()
+
+def _docx() -> None:
+    from docx import Document
+    Document().save(io.BytesIO())
+
+def _odt() -> None:
+    from odf.opendocument import OpenDocumentText
+    from odf import text as odf_text
+    doc = OpenDocumentText()
+    doc.text.addElement(odf_text.P(text="Préchauffage"))
+    doc.write(io.BytesIO())
+
+def _soffice() -> None:
+    from . import soffice
+    soffice.demarrer()
+
+def _matcher() -> None:
+    from .matcher import compile_tiers
+    compile_tiers([{"nom": "Préchauffage", "telephone": "0600000000"}]).apply("Préchauffage 06 00 00 00 00")
+
+# Étapes toujours exécutées
+ETAPES: Dict[str, Callable[[], None]] = {
+    "matcher": _matcher,
+}
+
+# Étapes propres à chaque module de traitement, exécutées seulement s'il est chargé
+ETAPES_HANDLERS: Dict[str, Dict[str, Callable[[], None]]] = {
+    "pdf": {"fitz": _fitz, "reportlab": _reportlab, "styles_pdf": _styles_pdf},
+    "word": {"docx": _docx},
+    "doc": {"docx": _docx, "soffice": _soffice},
+    "odt": {"odt": _odt},
+}
+
+def rechauffer(imports_ms: Optional[float] = None, handlers: Iterable[str] = (),
+               handlers_ms: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Exécute les étapes de préchauffage et mémorise leur durée.
+
+    Args:
+        imports_ms: Durée des imports du module principal, reportée telle quelle
+        handlers: Modules de traitement chargés au démarrage
+        handlers_ms: Durée d'import de chaque module de traitement, reportée telle quelle
+
+    Returns:
+        Rapport {"imports_ms", "handlers_ms", "etapes_ms", "total_ms", "erreurs"}
+    """
+    etapes = dict(ETAPES)
+    for nom in handlers:
+        etapes.update(ETAPES_HANDLERS.get(nom, {}))
+
+    rapport_demarrage.clear()
+    rapport_demarrage.update({"imports_ms": imports_ms, "handlers_ms": dict(handlers_ms or {}),
+                              "etapes_ms": {}, "erreurs": {}})
+    if not WARMUP_ENABLED:
+        rapport_demarrage["desactive"] = True
+        return rapport_demarrage
+
+    debut_total = time.perf_counter()
+    for nom, etape in etapes.items():
+        debut = time.perf_counter()
+        try:
+            etape()
+        except Exception as e:
+            # Un préchauffage raté ne doit jamais empêcher le démarrage
+            rapport_demarrage["erreurs"][nom] = str(e)
+            logger.warning(f"⚠️ Préchauffage '{nom}' impossible: {str(e)}")
+        rapport_demarrage["etapes_ms"][nom] = round((time.perf_counter() - debut) * 1000, 1)
+    rapport_demarrage["total_ms"] = round((time.perf_counter() - debut_total) * 1000, 1)
+
+    logger.info(f"🔥 Préchauffage terminé en {rapport_demarrage['total_ms']} ms (imports: {imports_ms} ms)")
+    return rapport_demarrage
@@ -0,0 +1,184 @@
+"""
+Réécriture des paquets zip (XLSX, ODS...)
+Seules les parties modifiées sont recompressées : les autres sont recopiées octet pour
+octet, sans décompression, avec leurs dates et attributs
+"""
+import io
+import re
+import struct
+import zipfile
+import zlib
+from html import unescape
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+from xml.sax.saxutils import escape
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+_END_OF_CENTRAL_DIRECTORY = struct.Struct("<4sHHHHIIH")
+# Drapeaux : données suivies d'un descripteur, nom en UTF-8
+_DATA_DESCRIPTOR = 0x08
+_UTF8 = 0x800
+# Au-delà, le format zip64 serait nécessaire
+_ZIP32_MAX = 0xFFFFFFFF
+_ZIP64_EXTRA = 0x0001
+
+def _dos_date_time(date_time: Tuple[int, ...]) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((max(year, 1980) - 1980) << 9) | (month << 5) | day
+
+def _extra_sans_zip64(extra: bytes) -> bytes:
+    # Les tailles sont réécrites en 32 bits : un champ zip64 recopié serait faux
+    pieces = []
+    position = 0
+    while position + 4 <= len(extra):
+        identifiant, taille = struct.unpack_from("<HH", extra, position)
+        if identifiant != _ZIP64_EXTRA:
+            pieces.append(extra[position:position + 4 + taille])
+        position += 4 + taille
+    return b"".join(pieces)
+
+def _donnees_brutes(content: bytes, info: zipfile.ZipInfo) -> bytes:
+    """
+    Données compressées d'une entrée, telles qu'elles figurent dans l'archive source.
+    """
+    fields = _LOCAL_HEADER.unpack_from(content, info.header_offset)
+    debut = info.header_offset + _LOCAL_HEADER.size + fields[9] + fields[10]
+    return content[debut:debut + info.compress_size]
+
+def reecrire(content: bytes, traiter: Callable[[str, bytes], Optional[bytes]],
+             selection: Callable[[str], bool] = lambda nom: True,
+             progress: Optional[Callable[[int, int], None]] = None) -> bytes:
+    """
+    Réécrit une archive zip en appliquant `traiter` à chaque partie.
+
+    Args:
+        content: Archive source
+        traiter: Reçoit (nom, contenu décompressé) et retourne le nouveau contenu,
+                 ou None pour recopier la partie telle quelle
+        selection: Parties à examiner ; les autres sont recopiées sans être décompressées
+        progress: Appelé avec (parties traitées, total)
+
+    Returns:
+        La nouvelle archive, parties dans l'ordre d'origine
+    """
+    sortie: List[bytes] = []
+    annuaire: List[bytes] = []
+    position = 0
+
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        infos = archive.infolist()
+        if any(info.file_size > _ZIP32_MAX or info.compress_size > _ZIP32_MAX for info in infos):
+            raise ValueError("Archive trop volumineuse (zip64 non pris en charge)")
+        for index, info in enumerate(infos):
+            nouveau = None
+            if not info.is_dir() and selection(info.filename):
+                nouveau = traiter(info.filename, archive.read(info))
+
+            if nouveau is None:
+                methode = info.compress_type
+                crc, taille = info.CRC, info.file_size
+                brutes = _donnees_brutes(content, info)
+            else:
+                crc, taille = zlib.crc32(nouveau), len(nouveau)
+                if info.compress_type == zipfile.ZIP_STORED:
+                    # Partie stockée sans compression (mimetype ODF) : elle le reste
+                    methode, brutes = zipfile.ZIP_STORED, nouveau
+                else:
+                    compresseur = zlib.compressobj(6, zlib.DEFLATED, -15)
+                    methode, brutes = zipfile.ZIP_DEFLATED, compresseur.compress(nouveau) + compresseur.flush()
+
+            nom = info.filename.encode("utf-8" if info.flag_bits & _UTF8 else "cp437")
+            drapeaux = info.flag_bits & ~_DATA_DESCRIPTOR
+            heure, date = _dos_date_time(info.date_time)
+            sortie.append(_LOCAL_HEADER.pack(b"PK\x03\x04", info.extract_version, drapeaux, methode,
+                                             heure, date, crc, len(brutes), taille, len(nom), 0))
+            sortie.append(nom)
+            sortie.append(brutes)
+
+            extra = _extra_sans_zip64(info.extra)
+            commentaire = info.comment
+            annuaire.append(_CENTRAL_HEADER.pack(b"PK\x01\x02", (info.create_system << 8) | info.create_version,
+                                                 info.extract_version, drapeaux, methode, heure, date, crc,
+                                                 len(brutes), taille, len(nom), len(extra), len(commentaire),
+                                                 0, info.internal_attr, info.external_attr, position))
+            annuaire.append(nom + extra + commentaire)
+            position += _LOCAL_HEADER.size + len(nom) + len(brutes)
+            if position > _ZIP32_MAX:
+                raise ValueError("Archive trop volumineuse (zip64 non pris en charge)")
+            if progress:
+                progress(index + 1, len(infos))
+        commentaire_archive = archive.comment
+
+    repertoire = b"".join(annuaire)
+    fin = _END_OF_CENTRAL_DIRECTORY.pack(b"PK\x05\x06", 0, 0, len(infos), len(infos), len(repertoire),
+                                         position, len(commentaire_archive))
+    return b"".join(sortie) + repertoire + fin + commentaire_archive
+
+def lire_parties(content: bytes, selection: Callable[[str], bool]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Parties retenues par `selection`, décompressées, dans l'ordre de l'archive.
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and selection(info.filename):
+                yield info.filename, archive.read(info)
+
+# Texte dans les parties XML
+
+class RemplacementsMemo:
+    """
+    Remplacement mémorisé par chaîne : une valeur répétée dans mille cellules n'est
+    analysée qu'une fois.
+    """
+    def __init__(self, remplacer: Callable[[str], str]):
+        self._remplacer = remplacer
+        self._cache: Dict[str, str] = {}
+        self.analyses = 0
+
+    def __call__(self, texte: str) -> str:
+        if not texte or texte.isspace():
+            return texte
+        resultat = self._cache.get(texte)
+        if resultat is None:
+            self.analyses += 1
+            resultat = self._cache[texte] = self._remplacer(texte)
+        return resultat
+
+def remplacer_noeuds(xml: bytes, motif: "re.Pattern", remplacer: Callable[[str], str]) -> Optional[bytes]:
+    """
+    Remplace le texte capturé par le groupe 2 de `motif` (groupes 1 et 3 : balises
+    autour), échappé XML. Retourne None si rien n'a changé.
+    """
+    modifie = False
+
+    def noeud(match: "re.Match") -> bytes:
+        nonlocal modifie
+        original = match.group(2).decode("utf-8")
+        texte = unescape(original)
+        remplace = remplacer(texte)
+        if remplace == texte:
+            return match.group(0)
+        modifie = True
+        return match.group(1) + escape(remplace, {'"': "&quot;"}).encode("utf-8") + match.group(3)
+
+    resultat = motif.sub(noeud, xml)
+    return resultat if modifie else None
+
+def nom_unique(nom: str, pris: Set[str], longueur_max: Optional[int] = None, suffixe: str = " ({})") -> str:
+    """
+    `nom`, suffixé d'un numéro s'il est déjà dans `pris` (comparaison sans casse), et
+    tronqué à `longueur_max` suffixe compris. Le nom retenu est ajouté à `pris`.
+    """
+    candidat, numero = nom[:longueur_max], 2
+    while candidat.lower() in pris:
+        fin = suffixe.format(numero)
+        candidat = nom[:longueur_max - len(fin) if longueur_max else None] + fin
+        numero += 1
+    pris.add(candidat.lower())
+    return candidat
+
+def iter_noeuds(xml: bytes, motif: "re.Pattern") -> Iterator[str]:
+    for match in motif.finditer(xml):
+        texte = unescape(match.group(2).decode("utf-8"))
+        if texte.strip():
+            yield texte
@@ -0,0 +1,40 @@
+import json
+
+from app.handlers import html
+
+TIERS = [{"nom": "Dupont", "prenom": "Jean"}]
+
+PAGE = (
+    '<html><head><style>.Dupont { color: red }</style>'
+    '<script type="application/ld+json">{"@type": "Person", "name": "Jean Dupont", "email": "j\\u0040x.fr"}</script>'
+    "<script>var client = 'Jean Dupont'; // dossier Dupont\n"
+    'if (a < b) { alert("M. Dupont"); }</script>'
+    '</head><body><p>Jean Dupont</p></body></html>'
+)
+
+
+def traiter(page, **kwargs):
+    document, mapping = html.apply_replacements(page.encode("utf-8"), **kwargs)
+    return html.write(document).decode("utf-8"), mapping
+
+
+def test_chaines_des_scripts_anonymisees():
+    sortie, mapping = traiter(PAGE, tiers=TIERS)
+
+    assert "Dupont" not in sortie.replace(".Dupont {", "")
+    # Les feuilles de style sont recopiées telles quelles
+    assert "<style>.Dupont { color: red }</style>" in sortie
+    donnees = json.loads(sortie.split('json">')[1].split("</script>")[0])
+    assert donnees["name"] == "PRENOM1 NOM1"
+    assert donnees["email"] == "j@x.fr"
+    assert "var client = 'PRENOM1 NOM1'; // dossier NOM1" in sortie
+    assert 'if (a < b) { alert("M. NOM1"); }' in sortie
+
+    restitue, _ = traiter(sortie, mapping=mapping)
+    assert "var client = 'Jean Dupont'; // dossier Dupont" in restitue
+    assert json.loads(restitue.split('json">')[1].split("</script>")[0])["name"] == "Jean Dupont"
+
+
+def test_valeur_restituee_echappee_dans_le_script():
+    sortie, _ = traiter("<script>var n = 'NOM1';</script>", mapping={"NOM1": "D'Artagnan </script>"})
+    assert sortie == "<script>var n = 'D\\'Artagnan <\\/script>';</script>"
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main
+
+client = TestClient(main.app)
+
+
+def attendre(job_id):
+    for _ in range(200):
+        etat = client.get(f"/jobs/{job_id}").json()
+        if etat["statut"] in ("termine", "erreur"):
+            return etat
+        time.sleep(0.05)
+    raise AssertionError("tâche non terminée")
+
+
+def test_preparation_hors_de_la_boucle(monkeypatch):
+    boucles = []
+    reconnaitre = main.format_du_fichier
+
+    def format_du_fichier(content):
+        try:
+            boucles.append(asyncio.get_running_loop())
+        except RuntimeError:
+            boucles.append(None)
+        return reconnaitre(content)
+
+    monkeypatch.setattr(main, "format_du_fichier", format_du_fichier)
+    reponse = client.post("/jobs/anonymize/file", data={"tiers_json": '[{"nom": "Dupont"}]'},
+                          files={"file": ("note.txt", "M. Dupont".encode(), "text/plain")})
+    assert reponse.status_code == 200
+    assert boucles[0] is None
+
+    etat = attendre(reponse.json()["job_id"])
+    assert etat["mapping"] == {"NOM1": "Dupont"}
+    assert client.get(f"/jobs/{etat['job_id']}/result").content == b"M. NOM1"
+
+
+def test_format_inconnu_refuse_immediatement():
+    reponse = client.post("/jobs/anonymize/file", files={"file": ("x.bin", bytes(range(256)) * 4, "application/octet-stream")})
+    assert reponse.status_code == 400
+
+
+def test_statistiques_du_cache_de_motifs_exposees():
+    statistiques = client.get("/demarrage").json()["pattern_cache"]
+    assert {"motifs", "capacite", "succes", "defauts", "evictions"} <= set(statistiques)
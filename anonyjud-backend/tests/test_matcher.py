@@ -0,0 +1,33 @@
+from app.anonymizer import anonymize_text
+from app.deanonymizer import deanonymize_text
+
+
+def anonymiser(texte, **tiers):
+    return anonymize_text(texte, [tiers])[0]
+
+
+def test_nom_colle_ne_trouve_pas_les_mots_separes():
+    assert anonymiser("Il a ouvert la porte, M. Laporte", nom="Laporte") == "Il a ouvert la porte, M. NOM1"
+    assert anonymiser("au coin de la rue", nom="Delarue") == "au coin de la rue"
+    assert anonymiser("sous le pont, du pont", nom="Dupont") == "sous le pont, du pont"
+    assert anonymiser("des moulins", nom="Desmoulins") == "des moulins"
+
+
+def test_blancs_de_la_valeur_toleres():
+    assert anonymiser("Mme Le  Fèvre, MME LE\nFEVRE", nom="Le Fèvre") == "Mme NOM1, MME NOM1"
+
+
+def test_mots_entiers_seulement():
+    assert anonymiser("Jeanne et Jean", prenom="Jean") == "Jeanne et PRENOM1"
+    assert anonymiser("en 2012 au 12 rue", adresse_numero="12") == "en 2012 au NUMERO1 rue"
+
+
+def test_desanonymisation_du_texte_par_balise_entiere():
+    mapping = {"NOM1": "Dupont", "PRENOM1": "Jean", "NOM10": "Durand", "ADRESSE1": r"\1 rue"}
+    texte = "PRENOM1 NOM1, NOM10 et NOM1X ; ADRESSE1"
+    assert deanonymize_text(texte, mapping) == r"Jean Dupont, Durand et NOM1X ; \1 rue"
+
+
+def test_email_reconnu_quelle_que_soit_la_casse():
+    tiers = {"nom": "Dupont", "email": "jean.dupont@exemple.fr"}
+    assert anonymiser("Écrire à JEAN.DUPONT@EXEMPLE.FR ou Jean.Dupont@Exemple.fr", **tiers) == "Écrire à EMAIL1 ou EMAIL1"
@@ -0,0 +1,42 @@
+import fitz
+import pytest
+
+from app import memoire, pdf_rebuild
+from app.handlers import pdf
+
+MO = 1024 * 1024
+
+
+def test_budget_compte_la_memoire_prise_par_le_traitement(monkeypatch):
+    mesures = iter([900 * MO, 950 * MO, 1100 * MO, 1100 * MO, 1100 * MO, 1100 * MO])
+    monkeypatch.setattr(memoire, "rss", lambda: next(mesures))
+    monkeypatch.setattr(memoire, "liberer", lambda: None)
+    budget = memoire.BudgetMemoire(8, budget_mb=100)
+
+    # 900 Mo déjà pris par le processus ne comptent pas : 50 Mo pris par le traitement
+    assert budget.verifier() == 8
+    # 200 Mo pris : le lot est réduit
+    assert budget.verifier() == 4
+    assert budget.pic == 200 * MO
+    budget.lot = 1
+    with pytest.raises(memoire.MemoireInsuffisante):
+        budget.verifier()
+
+
+def test_pages_reconstituees_par_lots_sur_disque(monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf, "PDF_WINDOW_PAGES", 1)
+    monkeypatch.setattr(pdf_rebuild, "PDF_SPOOL_DIR", str(tmp_path))
+    doc = fitz.open()
+    for texte in ("Maître Dupont", "Sans donnée", "Dossier Dupont"):
+        doc.new_page().insert_text((72, 72), texte)
+    content = doc.tobytes()
+
+    document, mapping = pdf.apply_replacements(content, tiers=[{"nom": "Dupont"}])
+    with fitz.open(stream=pdf.write(document), filetype="pdf") as sortie:
+        textes = [page.get_text() for page in sortie]
+
+    assert mapping == {"NOM1": "Dupont"}
+    assert "NOM1" in textes[0] and "Sans donnée" in textes[1] and "NOM1" in textes[2]
+    assert not any("Dupont" in texte for texte in textes)
+    # Les lots ont été supprimés après l'assemblage
+    assert list(tmp_path.iterdir()) == []
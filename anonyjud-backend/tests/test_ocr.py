@@ -0,0 +1,24 @@
+import os
+
+from app import ocr
+
+
+def test_pool_cree_au_demarrage_et_arrete(monkeypatch):
+    monkeypatch.setattr(ocr, "tessdata", lambda: "/tessdata")
+    monkeypatch.setattr(ocr, "OCR_WORKERS", 1)
+    ocr.demarrer()
+    try:
+        pool = ocr._pool
+        assert pool is not None
+        assert ocr._get_pool() is pool
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+        assert pool.submit(os.getpid).result(timeout=60) != os.getpid()
+    finally:
+        ocr.arreter()
+    assert ocr._pool is None
+
+
+def test_pas_de_pool_sans_ocr(monkeypatch):
+    monkeypatch.setattr(ocr, "tessdata", lambda: None)
+    ocr.demarrer()
+    assert ocr._pool is None
@@ -0,0 +1,57 @@
+import io
+import zipfile
+
+from app.handlers import ods
+
+TIERS = [{"nom": "Dupont", "prenom": "Jean"}]
+
+PARTIES = {
+    "mimetype": "application/vnd.oasis.opendocument.spreadsheet",
+    "content.xml":
+        '<office:document-content><office:body><office:spreadsheet>'
+        '<table:named-expressions><table:named-range table:name="Dupont" '
+        'table:base-cell-address="$\'Dupont Jean\'.$A$1" table:cell-range-address="$\'Dupont Jean\'.$A$1"/>'
+        '</table:named-expressions>'
+        '<table:table table:name="Dupont Jean" table:print-ranges="\'Dupont Jean\'.A1:\'Dupont Jean\'.B2">'
+        '<table:table-row><table:table-cell office:value-type="string"><text:p>Jean Dupont</text:p></table:table-cell>'
+        '</table:table-row></table:table>'
+        '<table:table table:name="Synthèse"><table:table-row>'
+        '<table:table-cell table:formula="of:=[$\'Dupont Jean\'.A1]&amp;&quot;Dupont&quot;&amp;SUM(Dupont)" '
+        'office:value-type="string" office:string-value="x"/></table:table-row></table:table>'
+        '</office:spreadsheet></office:body></office:document-content>',
+    "settings.xml":
+        '<office:document-settings><config:config-item-map-named config:name="Tables">'
+        '<config:config-item-map-entry config:name="Dupont Jean"/></config:config-item-map-named>'
+        '<config:config-item config:name="ActiveTable" config:type="string">Dupont Jean</config:config-item>'
+        '</office:document-settings>',
+}
+
+
+def classeur():
+    sortie = io.BytesIO()
+    with zipfile.ZipFile(sortie, "w") as archive:
+        for nom, xml in PARTIES.items():
+            archive.writestr(nom, xml)
+    return sortie.getvalue()
+
+
+def test_feuilles_et_plages_renommees():
+    document, _ = ods.apply_replacements(classeur(), tiers=TIERS)
+    with zipfile.ZipFile(io.BytesIO(ods.write(document))) as archive:
+        parties = {nom: archive.read(nom).decode() for nom in archive.namelist()}
+
+    for nom, xml in parties.items():
+        assert "Dupont" not in xml and "Jean" not in xml, nom
+    contenu = parties["content.xml"]
+    assert '<table:table table:name="NOM1 PRENOM1" table:print-ranges="\'NOM1 PRENOM1\'.A1:\'NOM1 PRENOM1\'.B2">' in contenu
+    assert '<table:table table:name="Synthèse">' in contenu
+    # NOM1 se lirait comme une cellule : la plage nommée est préfixée
+    assert ('<table:named-range table:name="_NOM1" table:base-cell-address="$\'NOM1 PRENOM1\'.$A$1"'
+            in contenu)
+    assert 'table:formula="of:=[$\'NOM1 PRENOM1\'.A1]&amp;&quot;NOM1&quot;&amp;SUM(_NOM1)"' in contenu
+    assert '<config:config-item-map-entry config:name="NOM1 PRENOM1"/>' in parties["settings.xml"]
+    assert ">NOM1 PRENOM1</config:config-item>" in parties["settings.xml"]
+
+
+def test_noms_des_feuilles_extraits():
+    assert ("feuille", "Dupont Jean") in list(ods.iter_text_units(classeur()))
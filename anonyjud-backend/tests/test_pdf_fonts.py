@@ -0,0 +1,40 @@
+import os
+
+import reportlab
+from reportlab.pdfbase import pdfmetrics
+
+from app import pdf_fonts
+
+VERA = [os.path.join(os.path.dirname(reportlab.__file__), "fonts", nom)
+        for nom in ("Vera.ttf", "VeraBd.ttf", "VeraIt.ttf")]
+
+
+def test_famille_prioritaire_sur_l_indicateur_serif():
+    assert pdf_fonts.fallback_font("ABCDEF+Arial", pdf_fonts.FLAG_SERIF) == "Helvetica"
+    assert pdf_fonts.fallback_font("Arial-BoldMT", pdf_fonts.FLAG_SERIF) == "Helvetica-Bold"
+    assert pdf_fonts.fallback_font("Georgia", pdf_fonts.FLAG_SERIF) == "Times-Roman"
+    assert pdf_fonts.fallback_font("TimesNewRomanPSMT", 0) == "Times-Roman"
+
+
+def test_cache_plein_borne_les_polices_enregistrees(monkeypatch):
+    monkeypatch.setattr(pdf_fonts, "FONT_CACHE_SIZE", 2)
+    monkeypatch.setattr(pdf_fonts, "_registered", {})
+    programmes = []
+    for chemin in VERA:
+        with open(chemin, "rb") as f:
+            programmes.append(f.read())
+
+    premiere = pdf_fonts._register_font_program(programmes[0])
+    deuxieme = pdf_fonts._register_font_program(programmes[1])
+
+    assert premiere.fontName != deuxieme.fontName
+    assert pdfmetrics.getFont(premiere.fontName) is premiere
+    # Un programme déjà vu garde son nom et sa police
+    assert pdf_fonts._register_font_program(programmes[0]) is premiere
+
+    # Cache plein : la police suivante n'est pas enregistrée, les précédentes restent utilisables
+    avant = set(pdfmetrics.getRegisteredFontNames())
+    assert pdf_fonts._register_font_program(programmes[2]) is None
+    assert set(pdfmetrics.getRegisteredFontNames()) == avant
+    assert pdfmetrics.getFont(premiere.fontName) is premiere
+    assert len(pdf_fonts._registered) == 2
@@ -0,0 +1,55 @@
+import fitz
+
+from app.handlers import pdf
+
+TIERS = [{"nom": "Dupont"}]
+
+BINAIRE = bytes(range(256))
+
+
+def document_source():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Dossier de M. Dupont")
+    page.add_text_annot((72, 120), "Appeler Dupont")
+    page.add_freetext_annot(fitz.Rect(72, 200, 300, 240), "Note Dupont")
+    doc.set_metadata({"author": "Dupont", "title": "Affaire Dupont"})
+    doc.set_toc([[1, "Audition Dupont", 1]])
+    doc.embfile_add("scan.bin", BINAIRE)
+    contenu = doc.tobytes()
+    doc.close()
+    return contenu
+
+
+def textes_hors_pages(doc):
+    textes = list(doc.metadata.values()) + [titre for _, titre, *_ in doc.get_toc()]
+    for page in doc:
+        for annotation in page.annots():
+            textes += [annotation.info["content"], annotation.info["title"], annotation.info["subject"]]
+    return [texte for texte in textes if texte]
+
+
+def test_metadonnees_signets_et_annotations_anonymises():
+    document, mapping = pdf.apply_replacements(document_source(), tiers=TIERS)
+    doc = fitz.open(stream=pdf.write(document), filetype="pdf")
+
+    assert mapping == {"NOM1": "Dupont"}
+    assert not any("Dupont" in texte for texte in textes_hors_pages(doc))
+    # La page reconstituée garde ses annotations, nettoyées
+    contenus = sorted(annotation.info["content"] for annotation in doc[0].annots())
+    assert contenus == ["Appeler NOM1", "Note NOM1"]
+    assert doc.metadata["author"] == "NOM1"
+    assert doc.get_toc()[0][1] == "Audition NOM1"
+    # Fichier joint non textuel retiré à l'anonymisation
+    assert doc.embfile_count() == 0
+
+
+def test_desanonymisation_garde_les_fichiers_joints_binaires():
+    source = fitz.open(stream=document_source(), filetype="pdf")
+    source.set_metadata({"author": "NOM1"})
+    document = pdf.apply_replacements(source.tobytes(), mapping={"NOM1": "Dupont"})[0]
+    doc = fitz.open(stream=pdf.write(document), filetype="pdf")
+
+    assert doc.metadata["author"] == "Dupont"
+    assert doc.embfile_count() == 1
+    assert doc.embfile_get(0) == BINAIRE
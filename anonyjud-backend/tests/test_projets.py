@@ -0,0 +1,100 @@
+import pytest
+
+from app.anonymizer import anonymize_text
+from app.handlers import txt
+from app.models import HISTORIQUE_MAX
+from app.projets import AccesProjetRefuse, ConflitBalises, ProjetStore
+
+
+def anonymiser(store, projet, texte):
+    anonymise, mapping = anonymize_text(texte, [], known=store.balises(projet))
+    store.enregistrer_operation(projet, "anonymisation_texte", mapping)
+    return anonymise
+
+
+def test_numerotation_poursuivie_d_un_document_a_l_autre(tmp_path):
+    store = ProjetStore(str(tmp_path / "projets.db"))
+    projet = store.creer("Expertise", "secret")
+
+    assert anonymiser(store, projet, "Tél. 06 12 34 56 78, jean@exemple.fr") == "Tél. TEL1, EMAIL1"
+    assert anonymiser(store, projet, "Tél. 07 00 00 00 01 ou 06.12.34.56.78, Jean@Exemple.fr") == "Tél. TEL2 ou TEL1, EMAIL1"
+
+    assert projet.mapping == {"TEL1": "06 12 34 56 78", "TEL2": "07 00 00 00 01", "EMAIL1": "jean@exemple.fr"}
+
+
+def test_fichier_poursuit_les_balises_du_projet():
+    document, mapping = txt.apply_replacements("Appeler le 07 00 00 00 01".encode(), tiers=[],
+                                               mapping={"TEL1": "06 12 34 56 78", "NOM1": "Dupont"})
+    assert txt.write(document).decode() == "Appeler le TEL2"
+    assert mapping == {"TEL2": "07 00 00 00 01"}
+
+
+def test_encodage_source_memorise_par_fichier(tmp_path):
+    store = ProjetStore(str(tmp_path / "projets.db"))
+    projet = store.creer("Expertise", "secret")
+    store.enregistrer_operation(projet, "anonymisation_fichier", {}, fichier="notes.txt", encodage="cp1252")
+    store.enregistrer_operation(projet, "anonymisation_fichier", {}, fichier="rapport.pdf")
+
+    assert store.encodage_source(projet, "notes") == "cp1252"
+    assert store.encodage_source(projet, "rapport") is None
+
+
+def test_mot_de_passe_verifie_une_fois(tmp_path, monkeypatch):
+    store = ProjetStore(str(tmp_path / "projets.db"))
+    projet = store.creer("Expertise", "secret")
+    derivations = []
+    verifier = type(projet).verifier_mot_de_passe
+    monkeypatch.setattr(type(projet), "verifier_mot_de_passe",
+                        lambda self, mot_de_passe: derivations.append(1) or verifier(self, mot_de_passe))
+
+    assert store.ouvrir(projet.id, "secret") is projet
+    assert store.ouvrir(projet.id, "secret") is projet
+    assert len(derivations) == 1
+
+    with pytest.raises(AccesProjetRefuse):
+        store.ouvrir(projet.id, "autre")
+    with pytest.raises(AccesProjetRefuse):
+        store.ouvrir(projet.id, None)
+
+
+def test_balise_deja_attribuee_refusee(tmp_path):
+    store = ProjetStore(str(tmp_path / "projets.db"))
+    projet = store.creer("Expertise", "secret")
+    store.enregistrer_operation(projet, "anonymisation_texte", {"TEL1": "06 12 34 56 78"})
+
+    with pytest.raises(ConflitBalises):
+        store.enregistrer_operation(projet, "anonymisation_texte", {"TEL1": "07 00 00 00 01", "TEL2": "01 02 03 04 05"})
+    assert projet.mapping == {"TEL1": "06 12 34 56 78"}
+
+
+def test_modification_d_un_tiers_notee(tmp_path):
+    store = ProjetStore(str(tmp_path / "projets.db"))
+    projet = store.creer("Expertise", "secret", tiers=[{"nom": "Dupond"}])
+    store.enregistrer_operation(projet, "anonymisation_texte", dict(projet.matcher.mapping))
+
+    store.mettre_a_jour_tiers(projet, [{"nom": "Dupont"}])
+    assert projet.mapping == {"NOM1": "Dupont"}
+    assert projet.historique[-1]["balises_modifiees"] == ["NOM1"]
+    store.enregistrer_operation(projet, "anonymisation_texte", dict(projet.matcher.mapping))
+
+
+def test_historique_borne_en_memoire(tmp_path):
+    store = ProjetStore(str(tmp_path / "projets.db"))
+    projet = store.creer("Expertise", "secret")
+    for _ in range(HISTORIQUE_MAX + 10):
+        projet.ajouter_historique("desanonymisation_texte")
+    assert len(projet.historique) == HISTORIQUE_MAX
+
+
+def test_pdf_poursuit_les_balises_du_projet():
+    fitz = pytest.importorskip("fitz")
+    from app.handlers import pdf
+
+    source = fitz.open()
+    source.new_page().insert_text((72, 72), "Appeler le 07 00 00 00 01 ou le 06 12 34 56 78")
+    document, mapping = pdf.apply_replacements(source.tobytes(), tiers=[], mapping={"TEL1": "06 12 34 56 78"})
+    texte = fitz.open(stream=pdf.write(document), filetype="pdf")[0].get_text()
+
+    assert "TEL2" in texte and "TEL1" in texte
+    assert "07 00 00 00 01" not in texte and "06 12 34 56 78" not in texte
+    assert mapping == {"TEL2": "07 00 00 00 01", "TEL1": "06 12 34 56 78"}
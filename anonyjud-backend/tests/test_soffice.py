@@ -0,0 +1,90 @@
+import subprocess
+import sys
+
+import pytest
+
+from app import soffice
+
+# Pont factice : recopie le fichier d'entrée, refuse les fichiers .bad
+PONT = """
+import json, shutil, sys
+print(json.dumps({"pret": True}), flush=True)
+for ligne in sys.stdin:
+    demande = json.loads(ligne)
+    if demande["entree"].endswith(".bad"):
+        print(json.dumps({"erreur": "Document illisible"}), flush=True)
+        continue
+    shutil.copy(demande["entree"], demande["sortie"])
+    print(json.dumps({"ok": True}), flush=True)
+"""
+
+
+class Instance:
+    def __init__(self, numero):
+        self.numero = numero
+        self.supprimee = False
+
+    def convertir(self, entree, sortie, filtre):
+        pass
+
+    def supprimer(self):
+        self.supprimee = True
+
+
+def test_arret_pendant_une_conversion(monkeypatch):
+    monkeypatch.setattr(soffice, "_Instance", Instance)
+    pool = soffice._Pool(2)
+    occupee = pool._prendre()
+    libre = pool._prendre()
+    pool._rendre(libre)
+
+    pool.arreter()
+    assert libre.supprimee and not occupee.supprimee
+
+    # L'instance occupée est arrêtée à son retour au lieu de rejoindre les instances libres
+    pool._rendre(occupee)
+    assert occupee.supprimee
+    assert pool._libres.empty()
+
+    # Le pool reste utilisable : une nouvelle instance est créée à la demande
+    nouvelle = pool._prendre()
+    assert nouvelle not in (libre, occupee)
+
+
+def test_conversions_par_le_pont_persistant(monkeypatch, tmp_path):
+    pont = tmp_path / "pont.py"
+    pont.write_text(PONT)
+    monkeypatch.setattr(soffice.soffice_pont, "__file__", str(pont))
+    instance = soffice._Instance(1)
+    # Processus soffice factice, gardé en vie
+    instance.process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        instance._lancer_pont(sys.executable)
+        processus = instance.pont.pid
+        for numero in range(2):
+            entree = tmp_path / f"source{numero}.doc"
+            entree.write_bytes(b"contenu %d" % numero)
+            instance.convertir(str(entree), str(tmp_path / f"resultat{numero}.docx"), "MS Word 2007 XML")
+            assert (tmp_path / f"resultat{numero}.docx").read_bytes() == b"contenu %d" % numero
+        # Le même pont a servi les deux conversions
+        assert instance.pont.pid == processus
+
+        (tmp_path / "source.bad").write_bytes(b"")
+        with pytest.raises(soffice.ErreurConversion, match="Document illisible"):
+            instance.convertir(str(tmp_path / "source.bad"), str(tmp_path / "resultat.docx"), "MS Word 2007 XML")
+        assert not instance.vivant()
+    finally:
+        instance.supprimer()
+
+
+def test_sans_pont_uno_la_conversion_est_indisponible(monkeypatch):
+    monkeypatch.setattr(soffice, "SOFFICE_BINARY", "/usr/bin/soffice")
+    monkeypatch.setattr(soffice, "UNO_LOCAL", False)
+    monkeypatch.setattr(soffice, "SOFFICE_PYTHON", "/chemin/absent/python")
+    soffice.interpreteur_uno.cache_clear()
+    try:
+        assert soffice.raison_indisponible() == soffice.SANS_PONT_UNO
+        with pytest.raises(soffice.ConversionIndisponible):
+            soffice.convertir(b"", "doc", "docx")
+    finally:
+        soffice.interpreteur_uno.cache_clear()
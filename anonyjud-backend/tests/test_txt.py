@@ -0,0 +1,33 @@
+from app import handlers
+from app.handlers import txt
+
+TIERS = [{"nom": "Lefèvre", "ville": "Besançon"}]
+
+
+def aller_retour(source, encodage):
+    handler = handlers.detecter(source)
+    document, mapping = handler.apply_replacements(source, tiers=TIERS)
+    anonymise = handler.write(document)
+    document, _ = handler.apply_replacements(anonymise, mapping=mapping, encodage=encodage)
+    return anonymise, handler.write(document)
+
+
+def test_encodage_source_repris_au_retour():
+    source = "Mme Lefèvre demeure à Besançon.\r\n".replace("à ", "au 12 rue de ").encode("cp1252")
+    assert txt.encodage_source(source) == "cp1252"
+
+    anonymise, retour = aller_retour(source, txt.encodage_source(source))
+    # Le fichier anonymisé n'a plus d'accents : seul l'encodage mémorisé dit le sien
+    assert anonymise.isascii()
+    assert retour == source
+
+
+def test_sans_encodage_source_le_retour_est_en_utf8():
+    source = "Mme Lefèvre, Besançon".encode("cp1252")
+    _, retour = aller_retour(source, None)
+    assert retour == "Mme Lefèvre, Besançon".encode("utf-8")
+
+
+def test_utf8_inchange():
+    source = "Mme Lefèvre, Besançon".encode("utf-8")
+    assert aller_retour(source, txt.encodage_source(source))[1] == source
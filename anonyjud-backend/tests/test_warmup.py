@@ -0,0 +1,24 @@
+from app import handlers, warmup
+
+
+def test_modules_precharges_selon_la_configuration():
+    assert handlers.a_precharger("none") == ()
+    assert handlers.a_precharger("pdf, word,inconnu") == ("pdf", "word")
+
+
+def test_prechauffage_limite_aux_modules_charges(monkeypatch):
+    appels = []
+    monkeypatch.setattr(warmup, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(warmup, "ETAPES", {"matcher": lambda: appels.append("matcher")})
+    monkeypatch.setattr(warmup, "ETAPES_HANDLERS", {
+        "pdf": {"fitz": lambda: appels.append("fitz")},
+        "word": {"docx": lambda: appels.append("docx")},
+    })
+
+    rapport = warmup.rechauffer(handlers=())
+    assert appels == ["matcher"]
+    assert list(rapport["etapes_ms"]) == ["matcher"]
+
+    appels.clear()
+    warmup.rechauffer(handlers=("word",))
+    assert appels == ["matcher", "docx"]
@@ -0,0 +1,54 @@
+import io
+
+from docx import Document
+
+from app.anonymizer import anonymize_text
+from app.handlers import word
+
+TIERS = [{"nom": "Lefèvre", "portable": "0612345678", "ville": "Saint-Étienne"}]
+
+
+def docx(*paragraphes):
+    doc = Document()
+    for runs in paragraphes:
+        para = doc.add_paragraph()
+        for texte in runs:
+            para.add_run(texte)
+    sortie = io.BytesIO()
+    doc.save(sortie)
+    return sortie.getvalue()
+
+
+def textes(content):
+    return [texte for _, texte in word.iter_text_units(content)]
+
+
+def test_variantes_anonymisees_comme_l_apercu():
+    paragraphes = [
+        ["Mme LEFEVRE, tél. 06.12.34.56.78, demeurant à Saint-Etienne."],
+        ["M. lefevre et M. Lefèvre ont appelé le +33 6 12 34 56 78."],
+    ]
+    doc, mapping = word.apply_replacements(docx(*paragraphes), tiers=TIERS)
+    obtenus = textes(word.write(doc))
+
+    assert obtenus == [anonymize_text("".join(runs), TIERS)[0] for runs in paragraphes]
+    for texte in obtenus:
+        for valeur in ("LEFEVRE", "lefevre", "Lefèvre", "06.12.34.56.78", "+33 6 12 34 56 78", "Saint-Etienne"):
+            assert valeur not in texte
+    assert mapping["NOM1"] == "Lefèvre"
+
+
+def test_valeur_repartie_sur_plusieurs_runs():
+    doc, _ = word.apply_replacements(docx(["Mme LEF", "È", "VRE habite Saint-", "Etienne"]), tiers=TIERS)
+    para = doc.paragraphs[0]
+    assert para.text == "Mme NOM1 habite VILLE1"
+    assert [run.text for run in para.runs] == ["Mme NOM1", "", " habite VILLE1", ""]
+
+
+def test_desanonymisation_en_un_passage():
+    mapping = {"NOM1": "Lefèvre", "PRENOM1": "Anne", "VILLE1": "C:\\Saint-Étienne"}
+    content = docx(["Mme PRENOM1 NOM1 et Prenom1 ", "NO", "M1."], ["Domicile : ville1."])
+    doc = word.apply_replacements(content, mapping=mapping)[0]
+
+    # Balise coupée entre deux runs, casse retouchée, valeur contenant une barre oblique inverse
+    assert textes(word.write(doc)) == ["Mme Anne Lefèvre et Anne Lefèvre.", "Domicile : C:\\Saint-Étienne."]
@@ -0,0 +1,113 @@
+import io
+import re
+import zipfile
+
+from app.handlers import xlsx
+
+TIERS = [{"nom": "Dupont", "societe": "Immo Conseil"}]
+
+PARTIES = {
+    "[Content_Types].xml": '<?xml version="1.0"?><Types/>',
+    "xl/sharedStrings.xml": '<sst><si><t>Dupont</t></si><si><t>Montant</t></si></sst>',
+    "xl/pivotCache/pivotCacheDefinition1.xml":
+        '<pivotCacheDefinition><cacheFields count="1"><cacheField name="Dupont" numFmtId="0">'
+        '<sharedItems><s v="Dupont"/><s v="Martin"/></sharedItems></cacheField></cacheFields></pivotCacheDefinition>',
+    "xl/pivotCache/pivotCacheRecords1.xml": '<pivotCacheRecords><r><s v="DUPONT"/><n v="12"/></r></pivotCacheRecords>',
+    "xl/charts/chart1.xml":
+        '<c:chartSpace><c:title><c:tx><c:rich><a:p><a:r><a:t>Frais Dupont</a:t></a:r></a:p></c:rich></c:tx></c:title>'
+        '<c:ser><c:tx><c:strRef><c:strCache><c:pt idx="0"><c:v>Dupont</c:v></c:pt></c:strCache></c:strRef></c:tx>'
+        '<c:val><c:numCache><c:pt idx="0"><c:v>12</c:v></c:pt></c:numCache></c:val></c:ser></c:chartSpace>',
+    "xl/tables/table1.xml":
+        '<table name="Tableau1" ref="A1:B2"><tableColumns count="2">'
+        '<tableColumn id="1" name="Dupont"/><tableColumn id="2" name="Montant"/></tableColumns></table>',
+    "docProps/app.xml": '<Properties><Company>Immo Conseil</Company><Manager>M. Dupont</Manager></Properties>',
+}
+
+
+def classeur():
+    sortie = io.BytesIO()
+    with zipfile.ZipFile(sortie, "w") as archive:
+        for nom, xml in PARTIES.items():
+            archive.writestr(nom, xml)
+    return sortie.getvalue()
+
+
+def test_caches_tableaux_et_proprietes_anonymises():
+    document, mapping = xlsx.apply_replacements(classeur(), tiers=TIERS)
+    with zipfile.ZipFile(io.BytesIO(xlsx.write(document))) as archive:
+        parties = {nom: archive.read(nom).decode() for nom in archive.namelist()}
+
+    for nom, xml in parties.items():
+        assert "Dupont" not in xml and "DUPONT" not in xml and "Immo Conseil" not in xml, nom
+    assert '<s v="NOM1"/><s v="Martin"/>' in parties["xl/pivotCache/pivotCacheDefinition1.xml"]
+    assert '<cacheField name="NOM1"' in parties["xl/pivotCache/pivotCacheDefinition1.xml"]
+    assert '<tableColumn id="1" name="NOM1"/>' in parties["xl/tables/table1.xml"]
+    assert "<c:v>12</c:v>" in parties["xl/charts/chart1.xml"]
+    assert "<Company>SOCIETE1</Company>" in parties["docProps/app.xml"]
+
+
+def test_textes_des_caches_extraits():
+    textes = [texte for _, texte in xlsx.iter_text_units(classeur())]
+    assert "Frais Dupont" in textes
+    assert "Immo Conseil" in textes
+
+
+CLASSEUR_NOMME = {
+    "xl/workbook.xml":
+        '<workbook><sheets><sheet name="Dupont Jean" sheetId="1" r:id="rId1"/>'
+        '<sheet name="Synthèse" sheetId="2" r:id="rId2"/></sheets>'
+        '<definedNames><definedName name="Dupont">\'Dupont Jean\'!$A$1</definedName>'
+        '<definedName name="_xlnm.Print_Area" localSheetId="0">\'Dupont Jean\'!$A$1:$B$2</definedName>'
+        '</definedNames></workbook>',
+    "xl/worksheets/sheet1.xml": '<worksheet><sheetData><row r="1"><c r="A1"><v>12</v></c></row></sheetData></worksheet>',
+    "xl/worksheets/sheet2.xml":
+        '<worksheet><sheetData><row r="1">'
+        '<c r="A1"><f>\'Dupont Jean\'!A1+Dupont</f><v>24</v></c>'
+        '<c r="B1" t="str"><f>IF(A1&gt;0,"Jean Dupont","")</f><v>Jean Dupont</v></c>'
+        '</row></sheetData>'
+        '<hyperlinks><hyperlink ref="C1" location="\'Dupont Jean\'!A1"/></hyperlinks></worksheet>',
+    "docProps/app.xml":
+        '<Properties><TitlesOfParts><vt:vector size="3" baseType="lpstr"><vt:lpstr>Dupont Jean</vt:lpstr>'
+        '<vt:lpstr>Synthèse</vt:lpstr><vt:lpstr>Dupont</vt:lpstr></vt:vector></TitlesOfParts></Properties>',
+}
+
+
+def test_feuilles_et_noms_definis_renommes():
+    sortie = io.BytesIO()
+    with zipfile.ZipFile(sortie, "w") as archive:
+        for nom, xml in CLASSEUR_NOMME.items():
+            archive.writestr(nom, xml)
+    tiers = [{"nom": "Dupont", "prenom": "Jean"}]
+    document, _ = xlsx.apply_replacements(sortie.getvalue(), tiers=tiers)
+    with zipfile.ZipFile(io.BytesIO(xlsx.write(document))) as archive:
+        parties = {nom: archive.read(nom).decode() for nom in archive.namelist()}
+
+    for nom, xml in parties.items():
+        assert "Dupont" not in xml and "Jean" not in xml, nom
+    classeur = parties["xl/workbook.xml"]
+    assert '<sheet name="NOM1 PRENOM1" sheetId="1"' in classeur
+    assert '<sheet name="Synthèse"' in classeur
+    # NOM1 se lirait comme une cellule : le nom défini est préfixé
+    assert '<definedName name="_NOM1">\'NOM1 PRENOM1\'!$A$1</definedName>' in classeur
+    assert '<definedName name="_xlnm.Print_Area" localSheetId="0">\'NOM1 PRENOM1\'!$A$1:$B$2</definedName>' in classeur
+    feuille = parties["xl/worksheets/sheet2.xml"]
+    assert "<f>'NOM1 PRENOM1'!A1+_NOM1</f>" in feuille
+    assert "<f>IF(A1&gt;0,&quot;PRENOM1 NOM1&quot;,&quot;&quot;)</f>" in feuille
+    assert 'location="\'NOM1 PRENOM1\'!A1"' in feuille
+    assert "<vt:lpstr>NOM1 PRENOM1</vt:lpstr><vt:lpstr>Synthèse</vt:lpstr><vt:lpstr>_NOM1</vt:lpstr>" in parties["docProps/app.xml"]
+
+
+def test_noms_de_feuilles_bornes_et_uniques():
+    longue = " ".join(["Dupont"] * 7)
+    sortie = io.BytesIO()
+    with zipfile.ZipFile(sortie, "w") as archive:
+        archive.writestr("xl/workbook.xml",
+                         '<workbook><sheets><sheet name="Dupont" sheetId="1"/><sheet name="NOM1" sheetId="2"/>'
+                         f'<sheet name="{longue}" sheetId="3"/>'
+                         '</sheets></workbook>')
+    document, _ = xlsx.apply_replacements(sortie.getvalue(), tiers=[{"nom": "Dupont"}])
+    with zipfile.ZipFile(io.BytesIO(document)) as archive:
+        classeur = archive.read("xl/workbook.xml").decode()
+    noms = re.findall(r'name="([^"]*)"', classeur)
+    # La feuille déjà nommée NOM1 garde son nom
+    assert noms == ["NOM1 (2)", "NOM1", " ".join(["NOM1"] * 7)[:xlsx.FEUILLE_LONGUEUR_MAX]]